@@ -0,0 +1,221 @@
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backtest.vectorized import run_backtest, sma_cross_positions
+
+
+class SharedArrays:
+    """
+    Named NumPy arrays placed in shared memory.
+
+    The creating process owns the blocks and must call `close` (or use the
+    object as a context manager) to release them. Other processes attach
+    through the picklable `spec` and get views of the same memory, so the
+    data is never copied or pickled per worker.
+
+    Args:
+        arrays (dict): Name to array, e.g. 'open', 'close', or feature panels.
+    """
+
+    def __init__(self, arrays):
+        self.blocks = {}
+        self.arrays = {}
+        self.spec = {}
+        for name, values in arrays.items():
+            values = np.ascontiguousarray(values)
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            view = np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)
+            view[...] = values
+            self.blocks[name] = block
+            self.arrays[name] = view
+            self.spec[name] = (block.name, values.shape, values.dtype.str)
+
+    @staticmethod
+    def attach(spec):
+        """
+        Map the arrays described by `spec` in another process.
+
+        Returns:
+            tuple: (arrays, blocks). Keep the blocks referenced while the
+            arrays are in use.
+        """
+        blocks = {}
+        arrays = {}
+        for name, (block_name, shape, dtype) in spec.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks[name] = block
+            arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            arrays[name].flags.writeable = False
+        return arrays, blocks
+
+    def close(self):
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parameter_grid(**params):
+    """
+    Every combination of the given parameter values.
+
+    Example:
+        parameter_grid(period=range(10, 31), stake=[50]) gives
+        [{'period': 10, 'stake': 50}, {'period': 11, 'stake': 50}, ...]
+    """
+    names = list(params)
+    return [dict(zip(names, values)) for values in itertools.product(*params.values())]
+
+
+def walk_forward_splits(n_dates, train_size, test_size, step=None, anchored=False):
+    """
+    Consecutive train/test windows over `n_dates` bars.
+
+    Args:
+        n_dates (int): Number of bars.
+        train_size (int): Bars in each training window.
+        test_size (int): Bars in each test window, right after its training window.
+        step (int): Bars between split starts, defaults to test_size.
+        anchored (bool): Keep every training window starting at the first bar.
+
+    Returns:
+        list: (train, test) pairs of slices.
+    """
+    step = step or test_size
+    splits = []
+    start = 0
+    while start + train_size + test_size <= n_dates:
+        train = slice(0 if anchored else start, start + train_size)
+        test = slice(start + train_size, start + train_size + test_size)
+        splits.append((train, test))
+        start += step
+    return splits
+
+
+def sma_cross_strategy(arrays, period=25, stake=50):
+    """
+    The notebook's SMA strategy, as a sweep strategy.
+    """
+    return sma_cross_positions(arrays['close'], period=period, stake=stake)
+
+
+_worker_arrays = None
+_worker_blocks = None
+
+
+def _init_worker(spec):
+    global _worker_arrays, _worker_blocks
+    _worker_arrays, _worker_blocks = SharedArrays.attach(spec)
+
+
+def _evaluate(arrays, strategy, params, window, backtest_kwargs):
+    # Signals see the full history up to the window so indicators are warm,
+    # the account starts flat at the start of the window
+    stop = window.stop if window is not None else None
+    history = {name: values[:stop] for name, values in arrays.items()}
+    positions = strategy(history, **params)
+    window = window or slice(None)
+    result = run_backtest(arrays['open'][window], arrays['close'][window], positions[window],
+                          **backtest_kwargs)
+    return result.stats
+
+
+def _run_task(task):
+    number, strategy, params, window, backtest_kwargs = task
+    return number, params, window, _evaluate(_worker_arrays, strategy, params, window, backtest_kwargs)
+
+
+def run_sweep(strategy, arrays, grid, windows=None, processes=None, chunksize=8, **backtest_kwargs):
+    """
+    Backtest every parameter combination across a process pool.
+
+    The arrays are shared with the workers through shared memory, and the
+    results are yielded as soon as they are ready, in completion order, so
+    memory stays flat however large the grid is.
+
+    Args:
+        strategy (callable): Module-level function `strategy(arrays, **params)`
+            returning target positions shaped like `arrays['close']`.
+        arrays (dict or SharedArrays): Dates x tickers arrays, at least 'open' and 'close'.
+        grid (list): Parameter dicts, e.g. from `parameter_grid`.
+        windows (list): Date slices to evaluate every combination on,
+            the whole history if None.
+        processes (int): Worker processes, all cores if None, 1 to run inline.
+        chunksize (int): Tasks handed to a worker at a time.
+        **backtest_kwargs: Passed to `run_backtest`, e.g. commission.
+
+    Yields:
+        dict: 'task', 'params', 'window' and the backtest 'stats'.
+    """
+    windows = windows or [None]
+    tasks = ((number, strategy, params, window, backtest_kwargs)
+             for number, (params, window) in enumerate(itertools.product(grid, windows)))
+
+    owned = not isinstance(arrays, SharedArrays)
+    shared = SharedArrays(arrays) if owned else arrays
+    try:
+        if processes == 1:
+            results = ((number, params, window, _evaluate(shared.arrays, strategy, params, window, kwargs))
+                       for number, strategy, params, window, kwargs in tasks)
+            for number, params, window, stats in results:
+                yield {'task': number, 'params': params, 'window': window, 'stats': stats}
+            return
+
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(shared.spec,)) as pool:
+            for number, params, window, stats in pool.imap_unordered(_run_task, tasks, chunksize):
+                yield {'task': number, 'params': params, 'window': window, 'stats': stats}
+    finally:
+        if owned:
+            shared.close()
+
+
+def walk_forward(strategy, arrays, grid, splits, metric='sharpe_ratio', processes=None,
+                 chunksize=8, **backtest_kwargs):
+    """
+    Pick the best parameters on every training window and test them out of sample.
+
+    Args:
+        strategy (callable): Strategy function, see `run_sweep`.
+        arrays (dict): Dates x tickers arrays, at least 'open' and 'close'.
+        grid (list): Parameter dicts.
+        splits (list): (train, test) slices, e.g. from `walk_forward_splits`.
+        metric (str): Stat maximized on the training windows.
+        processes (int): Worker processes.
+        **backtest_kwargs: Passed to `run_backtest`.
+
+    Returns:
+        list: One dict per split with 'train', 'test', the chosen 'params',
+        and the 'train_stats' and 'test_stats'.
+    """
+    with SharedArrays(arrays) as shared:
+        train_windows = [train for train, _ in splits]
+        best = {}
+        for record in run_sweep(strategy, shared, grid, train_windows, processes, chunksize,
+                                **backtest_kwargs):
+            key = (record['window'].start, record['window'].stop)
+            score = record['stats'][metric]
+            if np.isnan(score):
+                continue
+            if key not in best or score > best[key]['stats'][metric]:
+                best[key] = record
+
+        results = []
+        for train, test in splits:
+            chosen = best.get((train.start, train.stop))
+            if chosen is None:
+                print(f'No valid {metric} on training window {train.start}:{train.stop}, skipped.')
+                continue
+            stats = _evaluate(shared.arrays, strategy, chosen['params'], test, backtest_kwargs)
+            results.append({'train': train, 'test': test, 'params': chosen['params'],
+                            'train_stats': chosen['stats'], 'test_stats': stats})
+    return results
@@ -0,0 +1,287 @@
+import numpy as np
+import pandas as pd
+
+
+TRADING_DAYS = 252
+
+
+def _as_panel(values):
+    values = np.asarray(values, dtype=np.float64)
+    return values[:, None] if values.ndim == 1 else values
+
+
+def _ffill(values):
+    """
+    Forward fill NaNs down the date axis of a dates x tickers array.
+    """
+    rows = np.where(~np.isnan(values), np.arange(values.shape[0])[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return values[rows, np.arange(values.shape[1])]
+
+
+def _two_product(a, b):
+    """
+    `a * b` as `p + e` exactly, with Dekker's splitting (no FMA in NumPy).
+    """
+    p = a * b
+    split = 134217729.0  # 2 ** 27 + 1
+    t = split * a
+    a_hi = t - (t - a)
+    a_lo = a - a_hi
+    t = split * b
+    b_hi = t - (t - b)
+    b_lo = b - b_hi
+    e = ((a_hi * b_hi - p) + a_hi * b_lo + a_lo * b_hi) + a_lo * b_lo
+    return p, e
+
+
+def _round(values, decimals):
+    """
+    Round prices like the Yahoo feed, which uses Python's `round`.
+
+    `round` rounds the exact binary value, half to even. np.round scales
+    first and can land on the wrong side of a half (0.225 gives 0.22, not
+    0.23), so the scaled value is kept exact as `p + e` and compared to the
+    midpoint between the two candidate integers.
+    """
+    if decimals is None:
+        return values
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10.0 ** decimals
+    with np.errstate(invalid='ignore', over='ignore'):
+        p, e = _two_product(values, scale)
+        lower = np.floor(p)
+        # p is an integer but the exact product is just below it
+        lower -= (p == lower) & (e < 0)
+        # p - (lower + 0.5) is exact close to the midpoint, where the sign matters
+        above = (p - (lower + 0.5)) + e
+        up = above > 0
+        tie = above == 0
+        if tie.any():
+            up |= tie & (np.fmod(lower, 2) != 0)
+        rounded = np.copysign((lower + up) / scale, values)
+    # Values without digits past `decimals`, infinities and NaNs are kept
+    return np.where(np.abs(p) < 2.0 ** 52, rounded, values)
+
+
+def sma_cross_positions(close, period=25, stake=50):
+    """
+    Target positions of the SMA strategy in `tests/backtrader_test.ipynb`.
+
+    Go long `stake` shares when the close is above its SMA and exit when it
+    is below, holding the current position while they are equal or the SMA
+    is still warming up.
+
+    Args:
+        close (ndarray): Close prices, dates x tickers or 1-D, oldest first.
+        period (int): SMA period.
+        stake (int): Shares bought on every entry.
+
+    Returns:
+        ndarray: Shares to hold after each bar's close, same shape as `close`.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    sma = pd.DataFrame(_as_panel(close)).rolling(window=period).mean().to_numpy()
+    close_panel = _as_panel(close)
+
+    signal = np.full(close_panel.shape, np.nan)
+    signal[close_panel > sma] = stake
+    signal[close_panel < sma] = 0
+    signal[0] = np.where(np.isnan(signal[0]), 0, signal[0])
+    positions = _ffill(signal)
+    return positions.reshape(close.shape)
+
+
+class BacktestResult:
+    """
+    Per-bar arrays and summary statistics of a vectorized backtest.
+
+    The arrays are dates x tickers, except `cash` and `equity` which are
+    per date.
+    """
+
+    def __init__(self, index, tickers, positions, trades, fill_prices, commissions,
+                 cash, equity, trade_pnls, start_value):
+        self.index = index
+        self.tickers = tickers
+        self.positions = positions
+        self.trades = trades
+        self.fill_prices = fill_prices
+        self.commissions = commissions
+        self.cash = cash
+        self.equity = equity
+        self.trade_pnls = trade_pnls
+        self.start_value = start_value
+        self.stats = self._compute_stats()
+
+    @property
+    def equity_curve(self):
+        return pd.Series(self.equity, index=self.index, name='equity')
+
+    @property
+    def drawdown(self):
+        """
+        Drawdown from the running peak in percent, like backtrader's DrawDown observer.
+        """
+        peak = np.maximum.accumulate(self.equity)
+        return pd.Series(100 * (peak - self.equity) / peak, index=self.index, name='drawdown')
+
+    def _compute_stats(self):
+        equity = self.equity
+        returns = equity[1:] / equity[:-1] - 1
+        years = len(equity) / TRADING_DAYS
+        start_value = self.start_value
+
+        drawdown = self.drawdown.to_numpy()
+        underwater = drawdown > 0
+        # Length of the current underwater streak at every bar
+        streak_id = np.cumsum(~underwater)
+        durations = np.bincount(streak_id, weights=underwater) if len(equity) else np.zeros(1)
+
+        std = returns.std(ddof=1) if len(returns) > 1 else np.nan
+        wins = self.trade_pnls[self.trade_pnls > 0]
+        return {
+            'start_value': start_value,
+            'final_value': equity[-1] if len(equity) else np.nan,
+            'total_return': equity[-1] / start_value - 1 if len(equity) else np.nan,
+            'annual_return': (equity[-1] / start_value) ** (1 / years) - 1 if years > 0 else np.nan,
+            'annual_volatility': std * np.sqrt(TRADING_DAYS),
+            'sharpe_ratio': returns.mean() / std * np.sqrt(TRADING_DAYS) if std > 0 else np.nan,
+            'max_drawdown': drawdown.max() if len(drawdown) else np.nan,
+            'max_drawdown_duration': int(durations.max()) if len(equity) else 0,
+            'fills': int(np.count_nonzero(self.trades)),
+            'round_trips': len(self.trade_pnls),
+            'win_rate': len(wins) / len(self.trade_pnls) if len(self.trade_pnls) else np.nan,
+            'total_commission': self.commissions.sum(),
+            'exposure': np.mean(np.any(self.positions != 0, axis=1)) if len(equity) else np.nan,
+        }
+
+
+def _round_trip_pnls(positions, flows):
+    """
+    Net profit of every closed round trip, per ticker.
+
+    A round trip starts when a position is opened from flat and ends when
+    it is back to flat. Its profit is the sum of the cash flows of its
+    fills, commissions included, like backtrader's `trade.pnlcomm`.
+    """
+    pnls = []
+    for j in range(positions.shape[1]):
+        held = positions[:, j]
+        previous = np.concatenate([[0.], held[:-1]])
+        opened = (previous == 0) & (held != 0)
+        closed = (previous != 0) & (held == 0)
+        # Flows on the closing bar still belong to the trip being closed
+        trip = np.cumsum(opened)
+        done = np.unique(trip[closed])
+        if len(done) == 0:
+            continue
+        totals = np.bincount(trip, weights=flows[:, j], minlength=trip.max() + 1)
+        pnls.append(totals[done])
+    return np.concatenate(pnls) if pnls else np.array([])
+
+
+def run_backtest(open_prices, close, positions, cash=100000.0, commission=0.001, slippage=0.0,
+                 high=None, low=None, index=None, tickers=None):
+    """
+    Simulate target positions with array operations.
+
+    Positions decided on a bar's close are filled at the next bar's open, as
+    market orders are in backtrader. Commission is a fraction of the traded
+    value. Slippage moves fills against the trade by a fraction of the
+    price, capped to the bar's high/low when they are given. Holdings are
+    marked to the close, the last known one on days without a bar.
+
+    Args:
+        open_prices (ndarray): Open prices, dates x tickers or 1-D, oldest first.
+        close (ndarray): Close prices, same shape.
+        positions (ndarray): Shares to hold after each bar's close, same shape.
+        cash (float): Starting cash.
+        commission (float): Commission as a fraction of the traded value.
+        slippage (float): Slippage as a fraction of the fill price.
+        high (ndarray): Optional high prices, caps slipped buy prices.
+        low (ndarray): Optional low prices, caps slipped sell prices.
+        index (Index): Dates of the rows, defaults to a RangeIndex.
+        tickers (list): Names of the columns.
+
+    Returns:
+        BacktestResult: Fills, positions, cash, equity and statistics.
+    """
+    open_prices = _as_panel(open_prices)
+    close_prices = _as_panel(close)
+    targets = np.nan_to_num(_as_panel(positions))
+    if not open_prices.shape == close_prices.shape == targets.shape:
+        raise ValueError('open, close and positions must have the same shape')
+
+    # The order placed on the close of bar t is filled at the open of bar t + 1
+    held = np.zeros_like(targets)
+    held[1:] = targets[:-1]
+    trades = np.diff(held, axis=0, prepend=0.)
+    traded = trades != 0
+
+    fill_prices = open_prices * (1 + slippage * np.sign(trades))
+    if high is not None:
+        fill_prices = np.minimum(fill_prices, _as_panel(high))
+    if low is not None:
+        fill_prices = np.maximum(fill_prices, _as_panel(low))
+    fill_prices = np.where(traded, fill_prices, np.nan)
+    if np.isnan(fill_prices[traded]).any():
+        raise ValueError('Trades were placed on bars without an open price')
+
+    with np.errstate(invalid='ignore'):
+        traded_value = np.where(traded, trades * fill_prices, 0.)
+        commissions = np.where(traded, np.abs(trades) * fill_prices * commission, 0.)
+    flows = -(traded_value + commissions)
+    cash_balance = cash + np.cumsum(flows.sum(axis=1))
+
+    marks = _ffill(close_prices)
+    holdings = np.where(held != 0, held * marks, 0.).sum(axis=1)
+    equity = cash_balance + holdings
+
+    n_dates, n_tickers = targets.shape
+    index = pd.RangeIndex(n_dates) if index is None else index
+    tickers = list(range(n_tickers)) if tickers is None else list(tickers)
+
+    return BacktestResult(index, tickers, held, trades, fill_prices, commissions,
+                          cash_balance, equity, _round_trip_pnls(held, flows), cash)
+
+
+def backtest_frame(data, positions, price_column='adjusted_close', decimals=2, **kwargs):
+    """
+    Backtest one ticker from a daily or feature frame.
+
+    Accepts the frames of `DailyStockDataLoader.load_daily_stock_data` or
+    `FeatureEngineering.load_commen_features`, in either date order. With
+    'adjusted_close', open/high/low are scaled by adjusted_close / close,
+    as backtrader's Yahoo feed does with `adjclose=True`. Prices are then
+    rounded to `decimals` like the feed's default `round=True, decimals=2`,
+    which is what the backtest matches backtrader against.
+
+    Args:
+        data (DataFrame): Daily bars with open, high, low, close and
+            adjusted_close columns, indexed by date.
+        positions (Series, ndarray or callable): Shares to hold after each
+            bar, aligned with `data` sorted oldest first, or a function of
+            the close prices returning them, e.g. `sma_cross_positions`.
+        price_column (str): Close used for signals and marking, 'close' or
+            'adjusted_close'.
+        decimals (int): Decimals the prices are rounded to, None for full
+            precision like the feed with `round=False`.
+        **kwargs: Passed to `run_backtest`.
+
+    Returns:
+        BacktestResult: The backtest result indexed by date.
+    """
+    data = data.sort_index()
+    factor = data['adjusted_close'] / data['close'] if price_column == 'adjusted_close' else 1.
+    close = _round(data[price_column].to_numpy(dtype=np.float64), decimals)
+
+    if callable(positions):
+        positions = positions(close)
+    elif isinstance(positions, pd.Series):
+        positions = positions.reindex(data.index).to_numpy(dtype=np.float64)
+
+    prices = {column: _round((data[column] * factor).to_numpy(dtype=np.float64), decimals)
+              for column in ('open', 'high', 'low')}
+    return run_backtest(prices['open'], close, positions,
+                        high=prices['high'], low=prices['low'], index=data.index, **kwargs)
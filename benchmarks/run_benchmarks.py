@@ -0,0 +1,328 @@
+"""
+Benchmarks for the loaders and the feature pipeline.
+
+Everything runs against generated data in a temporary directory and the
+local fake Alpha Vantage server from tests/fake_alpha_vantage.py, so no
+API key or network access is needed. Each run is saved as
+`{results_dir}/{commit}.json` so runs can be compared across commits.
+
+Usage:
+    python benchmarks/run_benchmarks.py run
+    python benchmarks/run_benchmarks.py run --sizes 1,100 --only features
+    python benchmarks/run_benchmarks.py compare <base commit> [<head commit>]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+import numpy as np
+import pandas as pd
+
+from fake_alpha_vantage import FakeAlphaVantage, synthetic_daily_prices
+
+
+DEFAULT_RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+GROUPS = ['startup', 'daily', 'fundamentals', 'features']
+
+# Modules a process that only reads stored data should not import
+HEAVY_MODULES = ['requests', 'ta', 'pandas_market_calendars', 'dotenv']
+
+
+def timed(func, repeat, setup=None):
+    """
+    Time `func()` `repeat` times, calling `setup()` untimed before each run.
+
+    Returns:
+        dict: min/median/mean seconds and the number of runs.
+    """
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': statistics.median(times),
+            'mean': statistics.mean(times), 'repeat': repeat}
+
+
+def timed_subprocess(code, repeat):
+    """
+    Run `code` in `repeat` fresh interpreters, timing everything after the
+    interpreter started. The last line printed by `code` is JSON and is
+    returned with the timings.
+    """
+    timer = ('import json, sys, time\n'
+             'start = time.perf_counter()\n'
+             f'{code}\n'
+             'print(json.dumps({"seconds": time.perf_counter() - start, "output": output}))\n')
+    times = []
+    for _ in range(repeat):
+        stdout = subprocess.check_output([sys.executable, '-c', timer], cwd=ROOT, text=True)
+        result = json.loads(stdout.strip().splitlines()[-1])
+        times.append(result['seconds'])
+    return {'min': min(times), 'median': statistics.median(times),
+            'mean': statistics.mean(times), 'repeat': repeat}, result['output']
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                             cwd=ROOT, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, dirty
+
+
+def configure_environment(workdir, url, store, calls_per_minute=None):
+    paths = {
+        'FIN_DATA_COMPRESSED_DAILY_STOCK_PATH': 'daily',
+        'FIN_DATA_PARTITIONED_DAILY_STOCK_PATH': 'daily_partitioned',
+        'FIN_DATA_COMPRESSED_FINANCIAL_REPORTS_PATH': 'reports',
+        'FIN_DATA_COMPRESSED_COMPANY_OVERVIEW_PATH': 'overview',
+        'FIN_DATA_COMPRESSED_COMPANY_EARNINGS_PATH': 'earnings',
+        'PROCESSED_DAILY_STOCK_PATH': 'features',
+    }
+    for variable, name in paths.items():
+        os.environ[variable] = os.path.join(workdir, name)
+        os.makedirs(os.environ[variable], exist_ok=True)
+    os.environ['ALPHA_VANTAGE_URL'] = url
+    os.environ['ALPHA_VANTAGE_KEY'] = 'benchmark'
+    os.environ['FIN_DATA_DAILY_STOCK_STORE'] = store
+    # The client's budget, unthrottled unless the fake API enforces a limit
+    os.environ['FIN_DATA_CALLS_PER_MINUTE'] = str(calls_per_minute or 10 ** 6)
+    # Every API call should reach the fake server
+    os.environ.pop('FIN_DATA_API_CACHE_PATH', None)
+
+
+def bench_startup(args, results):
+    loaded = f'[name for name in {HEAVY_MODULES!r} if name in sys.modules]'
+    cases = {
+        'import_fetch_financial_data': 'import data_extraction.fetch_financial_data',
+        'import_feature_engineering': 'import data_engineering.feature_engineering',
+        'offline_read_features': (
+            'from data_engineering.feature_engineering import FeatureEngineering\n'
+            'FeatureEngineering(offline=True).read_commen_features("BENCH")'),
+    }
+
+    # A stored feature file for the offline read
+    from data_engineering.feature_engineering import FeatureEngineering
+    history = synthetic_daily_prices('BENCH', pd.Timestamp.now() - pd.DateOffset(years=args.feature_years))
+    features = FeatureEngineering().process_commen_features(history.iloc[::-1])
+    features.to_csv(os.path.join(os.environ['PROCESSED_DAILY_STOCK_PATH'], 'features_BENCH.csv'))
+
+    for name, code in cases.items():
+        results[name], heavy = timed_subprocess(f'{code}\noutput = {loaded}', args.repeat)
+        if heavy:
+            print(f'{name} imported {", ".join(heavy)}')
+
+
+def bench_daily(args, results):
+    from data_extraction.fetch_financial_data import DailyStockDataLoader
+    from data_extraction.frame_cache import frame_cache
+
+    ticker = 'BENCH'
+    history = synthetic_daily_prices(ticker, args.start_date)
+    loader = DailyStockDataLoader()
+    loader.store.write(ticker, history)
+    last_date = loader.store.last_date(ticker)
+    begin_date = last_date - pd.DateOffset(years=5)
+
+    def load(target):
+        return lambda: target.load_daily_stock_data(ticker, begin_date=begin_date, end_date=last_date)
+
+    fresh = {}
+
+    def new_loader():
+        # Cold means read from disk, not from the process-wide frame cache
+        frame_cache.invalidate()
+        fresh['loader'] = DailyStockDataLoader()
+
+    results['load_daily_stock_data_cold'] = timed(
+        lambda: load(fresh['loader'])(), args.repeat, setup=new_loader)
+
+    load(loader)()
+    results['load_daily_stock_data_warm'] = timed(load(loader), args.repeat)
+
+    def truncate():
+        # Five sessions behind, so the update fetches and appends new bars
+        loader.store.write(ticker, history.iloc[:-5])
+        loader.client.clear_memory_cache()
+
+    results['update_daily_stock_data'] = timed(
+        lambda: loader.update_daily_stock_data(ticker), args.repeat, setup=truncate)
+
+
+def bench_fundamentals(args, results):
+    from data_extraction.fetch_financial_data import FundamentalDataLoader
+
+    ticker = 'BENCH'
+    loader = FundamentalDataLoader()
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader.load_company_earnings(ticker, 'quarterly', update=True)
+        loader.init_financial_reports(ticker, 'quarterly', 'income_statement')
+
+    results['load_financial_reports'] = timed(
+        lambda: loader.load_financial_reports(ticker, 'quarterly', 'income_statement',
+                                              begin_date='2010-01-01', end_date='2020-01-01'),
+        args.repeat)
+
+    results['init_financial_reports'] = timed(
+        lambda: loader.init_financial_reports(ticker, 'quarterly', 'balance_sheet'),
+        args.repeat, setup=loader.client.clear_memory_cache)
+
+
+def bench_features(args, results):
+    from data_engineering.feature_engineering import FeatureEngineering
+    from data_engineering.panel_features import align_panel
+
+    # A pool of distinct histories is cycled through, which times the same
+    # work as distinct tickers without holding thousands of frames
+    start_date = pd.Timestamp.now() - pd.DateOffset(years=args.feature_years)
+    pool = [synthetic_daily_prices(f'T{i:04d}', start_date).iloc[::-1]
+            for i in range(min(args.pool, max(args.sizes)))]
+    engineering = FeatureEngineering()
+
+    for size in args.sizes:
+        frames = [pool[i % len(pool)] for i in range(size)]
+        # Large universes take long enough for a single run to be stable
+        repeat = args.repeat if size < 1000 else 1
+
+        def per_ticker():
+            for frame in frames:
+                engineering.process_commen_features(frame)
+
+        results[f'process_commen_features[{size}]'] = timed(per_ticker, repeat)
+
+        _, _, arrays = align_panel({i: frame for i, frame in enumerate(frames)}, dtype=np.float32)
+        results[f'process_panel_features[{size}]'] = timed(
+            lambda: engineering.process_panel_features(
+                arrays['adjusted_close'], arrays['high'], arrays['low'], arrays['volume'], float32=True),
+            repeat)
+        del arrays
+
+
+def run(args):
+    commit, dirty = git_commit()
+    workdir = tempfile.mkdtemp(prefix='fin-data-bench-')
+    server = FakeAlphaVantage(calls_per_minute=args.calls_per_minute, start_date=args.start_date)
+    configure_environment(workdir, server.start(), args.store, args.calls_per_minute)
+
+    results = {}
+    benchmarks = {'startup': bench_startup, 'daily': bench_daily, 'fundamentals': bench_fundamentals, 'features': bench_features}
+    try:
+        for group in args.only or GROUPS:
+            print(f'Running {group} benchmarks...')
+            benchmarks[group](args, results)
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': pd.Timestamp.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'packages': {'pandas': pd.__version__, 'numpy': np.__version__},
+        'store': args.store,
+        'sizes': args.sizes,
+        'results': results,
+    }
+
+    for name, result in results.items():
+        print(f"{name:<40} median {result['median'] * 1000:10.2f} ms  (min {result['min'] * 1000:.2f} ms, n={result['repeat']})")
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"{commit[:12]}{'-dirty' if dirty else ''}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results saved to {path}')
+
+
+def load_report(name, results_dir):
+    if os.path.exists(name):
+        path = name
+    else:
+        matches = sorted(file for file in os.listdir(results_dir) if file.startswith(name[:12]))
+        if not matches:
+            raise SystemExit(f'No benchmark results for {name} in {results_dir}')
+        path = os.path.join(results_dir, matches[-1])
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(args):
+    base = load_report(args.base, args.results_dir)
+    head = load_report(args.head or git_commit()[0], args.results_dir)
+    print(f"{'benchmark':<40} {'base ms':>10} {'head ms':>10} {'ratio':>7}")
+
+    regressions = []
+    for name in sorted(set(base['results']) | set(head['results'])):
+        if name not in base['results'] or name not in head['results']:
+            print(f'{name:<40} only in {"head" if name in head["results"] else "base"}')
+            continue
+        base_time = base['results'][name]['median']
+        head_time = head['results'][name]['median']
+        ratio = head_time / base_time if base_time > 0 else np.inf
+        flag = ''
+        if ratio > 1 + args.threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - args.threshold:
+            flag = '  faster'
+        print(f'{name:<40} {base_time * 1000:10.2f} {head_time * 1000:10.2f} {ratio:7.2f}{flag}')
+
+    if regressions and args.fail_on_regression:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the loaders and the feature pipeline.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks and save the results.')
+    run_parser.add_argument('--only', nargs='+', choices=GROUPS, help='Benchmark groups to run.')
+    run_parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')],
+                            default=[1, 100, 3000], help='Universe sizes for the feature benchmarks.')
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--store', default='gzip', choices=['gzip', 'parquet', 'feather'])
+    run_parser.add_argument('--start-date', default='2000-01-03', help='First date of the daily histories.')
+    run_parser.add_argument('--feature-years', type=int, default=10, help='History length for the features.')
+    run_parser.add_argument('--pool', type=int, default=100, help='Distinct histories for the features.')
+    run_parser.add_argument('--calls-per-minute', type=int, default=None,
+                            help='Rate limit enforced by the fake API.')
+    run_parser.add_argument('--results-dir', default=DEFAULT_RESULTS_DIR)
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two saved runs.')
+    compare_parser.add_argument('base', help='Commit (or result file) to compare against.')
+    compare_parser.add_argument('head', nargs='?', help='Commit or result file, defaults to HEAD.')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='Relative change reported as a regression.')
+    compare_parser.add_argument('--fail-on-regression', action='store_true')
+    compare_parser.add_argument('--results-dir', default=DEFAULT_RESULTS_DIR)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        compare(args)
+
+
+if __name__ == '__main__':
+    main()
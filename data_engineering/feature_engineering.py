@@ -1,17 +1,33 @@
-from data_extraction.fetch_financial_data import DailyStockDataLoader, FundamentalDataLoader
+from data_extraction.env import getenv
+from data_extraction.fetch_financial_data import DailyStockDataLoader, FundamentalDataLoader, is_offline
+from data_extraction.frame_cache import file_version, frame_cache, view
+from data_engineering.feature_registry import commen_feature_registry
+from data_engineering.incremental_features import IncrementalFeatureEngine
+from data_engineering.panel_features import compute_panel_features
 import pandas as pd
 import numpy as np
+import json
 import os
-import ta as ta
 
 
 class FeatureEngineering:
-    def __init__(self):
-        self.loader = DailyStockDataLoader()
-        self.processed_daily_stock_path = os.getenv(
+    def __init__(self, offline=None):
+        # offline: only read stored features and prices, see DataLoader
+        self.offline = is_offline() if offline is None else offline
+        self._loader = None
+        # Also looked up in .env, the lazily created loader would load it too late
+        self.processed_daily_stock_path = getenv(
             "PROCESSED_DAILY_STOCK_PATH")
         self.now = pd.Timestamp.now()
         self.csv_file_path = None
+        self.state_file_path = None
+
+    @property
+    def loader(self):
+        # Created on first use, reading stored features needs no loader
+        if self._loader is None:
+            self._loader = DailyStockDataLoader(offline=self.offline)
+        return self._loader
 
     def load_commen_features(self, ticker, last_n_years=5):
         """
@@ -34,15 +50,67 @@ class FeatureEngineering:
             ticker (str): The stock ticker
             last_n_days (int): The number of days to load
         """
+        # Offline reads serve the stored features as they are
+        self.refresh_commen_features(ticker, update=not self.offline)
+
+        csv_file_path = self.csv_file_path
+
+        def read_features():
+            data = pd.read_csv(csv_file_path, index_col='date', parse_dates=True)
+            # Updates append the newest rows at the end of the file
+            data = data[~data.index.duplicated(keep='last')]
+            return data.sort_index(ascending=False)
+
+        # Parsed once per version of the file, callers get read-only views
+        data = frame_cache.get_or_load(
+            ('commen_features', csv_file_path), file_version(csv_file_path), read_features)
+        return view(data)
+
+    def refresh_commen_features(self, ticker, update=True):
+        """
+        Create the feature file of a ticker, or append its new bars
+
+        Args:
+            ticker (str): The stock ticker
+            update (bool): Append the bars stored since the last run to an
+                existing file
+        """
         self.csv_file_path = os.path.join(
             self.processed_daily_stock_path, f"features_{ticker}.csv")
+        self.state_file_path = os.path.join(
+            self.processed_daily_stock_path, f"features_{ticker}.state.json")
 
         if not os.path.exists(self.csv_file_path):
             self.init_commen_features(ticker)
-        else:
+        elif update:
             self.update_commen_features(ticker)
 
-        return pd.read_csv(self.csv_file_path, index_col='date', parse_dates=True)
+    def stale_tickers(self, tickers):
+        """
+        Tickers whose feature file is missing or behind their stored prices
+
+        Args:
+            tickers (list): Stock tickers
+
+        Returns:
+            list: The tickers whose features need a refresh
+        """
+        stale = []
+        for ticker in tickers:
+            csv_file_path = os.path.join(
+                self.processed_daily_stock_path, f"features_{ticker}.csv")
+            state_file_path = os.path.join(
+                self.processed_daily_stock_path, f"features_{ticker}.state.json")
+            if not os.path.exists(csv_file_path) or not os.path.exists(state_file_path):
+                stale.append(ticker)
+                continue
+            if not self.loader.store.exists(ticker):
+                continue
+            with open(state_file_path) as f:
+                last_date = json.load(f)['last_date']
+            if last_date is None or pd.Timestamp(last_date) < self.loader.store.last_date(ticker):
+                stale.append(ticker)
+        return stale
 
     def init_commen_features(self, ticker):
         """
@@ -51,106 +119,92 @@ class FeatureEngineering:
         Args:
             ticker (str): The stock ticker
         """
-        data = self.loader.load_daily_row_stock_data(ticker, last_n_years=10)
+        data = self.loader.load_daily_stock_data(
+            ticker, begin_date=self.now - pd.DateOffset(years=10), end_date=self.now)
 
-        data = self.process_commen_features(data)
+        # Same values as process_commen_features, and leaves the rolling state
+        # ready for incremental updates
+        engine = IncrementalFeatureEngine()
+        data = engine.update_frame(data)
 
         data.to_csv(self.csv_file_path, index=True)
+        engine.save(self.state_file_path)
 
         print(f"Data saved to {self.csv_file_path}")
 
-    def process_commen_features(self, data):
-
-        data = data[::-1].copy()
-
-        data.loc[:, 'log_return'] = np.log(
-            data['adjusted_close'] / data['adjusted_close'].shift(1))
-
-        data.loc[:, 'volatility'] = data["log_return"].rolling(
-            window=252).std() * np.sqrt(252)
-
-        data.loc[:, 'volatility_change'] = data['volatility'].diff()
-
-        data.loc[:, 'log_volume'] = np.log(data['volume'])
-
-        data.loc[:, 'daily_returns'] = data['adjusted_close'].diff()
+    def process_commen_features(self, data, features=None):
+        """
+        Compute common features on daily stock data
 
-        data.loc[:, 'MA-5'] = data['adjusted_close'].rolling(window=5).mean()
+        Features are computed through the feature registry, so shared rolling
+        intermediates are computed once and only the requested features (and
+        the features they depend on) are evaluated.
 
-        data.loc[:, 'MA-30'] = data['adjusted_close'].rolling(window=30).mean()
+        Args:
+            data (DataFrame): Daily stock data, newest row first
+            features (list): Feature names to compute, all common features if None
 
-        RSI = ta.momentum.RSIIndicator(data['adjusted_close'], window=14)
-        data.loc[:, 'RSI'] = RSI.rsi()
+        Returns:
+            DataFrame: The input columns followed by the requested features
+        """
+        data = data[::-1].copy()
 
-        data.loc[:,
-                 '5-day_variance'] = data['adjusted_close'].rolling(window=5).var()
+        computed = commen_feature_registry.compute(data, features)
+        for name in computed.columns:
+            data.loc[:, name] = computed[name]
 
-        WILLR = ta.momentum.WilliamsRIndicator(high=data['high'],
-                                               low=data['low'],
-                                               close=data['adjusted_close'],
-                                               lbp=14)
-        data.loc[:, 'Williams_%R'] = WILLR.williams_r()
+        data = data.iloc[::-1]
 
-        data.loc[:, 'z_score'] = (data['adjusted_close'] - data['adjusted_close'].rolling(window=10).mean()
-                                  ) / data['adjusted_close'].rolling(window=10).std()
+        return data
 
-        data.loc[:, 'SMA10'] = data['adjusted_close'].rolling(window=10).mean()
+    def process_panel_features(self, close, high, low, volume, float32=False):
+        """
+        Compute the common features for a whole universe at once
 
-        data.loc[:, 'EMA12'] = data['adjusted_close'].ewm(
-            span=12, adjust=False).mean()
+        Args:
+            close (ndarray): Adjusted close prices, dates x tickers, oldest first
+            high (ndarray): High prices, same shape
+            low (ndarray): Low prices, same shape
+            volume (ndarray): Volumes, same shape
+            float32 (bool): Return float32 arrays to halve memory
+
+        Returns:
+            dict: Feature name to dates x tickers array
+        """
+        return compute_panel_features(
+            close, high, low, volume, dtype=np.float32 if float32 else np.float64)
 
-        MACD = ta.trend.MACD(
-            close=data['adjusted_close'], window_fast=12, window_slow=26)
-        data.loc[:, 'MACD'] = MACD.macd()
+    def update_commen_features(self, ticker):
+        """
+        Append features for the bars added since the last run
 
-        RoC = ta.momentum.ROCIndicator(close=data['adjusted_close'], window=1)
-        data.loc[:, 'RoC'] = RoC.roc()
+        Only the new bars are processed, starting from the indicator state
+        saved next to the feature file.
 
-        low_min = data['low'].rolling(window=15).min()
-        high_max = data['high'].rolling(window=15).max()
-        data.loc[:, 'K15'] = ((data['adjusted_close'] - low_min) /
-                              (high_max - low_min)) * 100
+        Args:
+            ticker (str): The stock ticker
+        """
+        if not os.path.exists(self.state_file_path):
+            # Feature files written before the state was persisted
+            self.init_commen_features(ticker)
+            return
 
-        data.loc[:, 'Bollinger_M'] = data['adjusted_close'].rolling(
-            window=20).mean()
-        data.loc[:, 'Bollinger_U'] = data['Bollinger_M'] + \
-            2 * data['adjusted_close'].rolling(window=20).std()
-        data.loc[:, 'Bollinger_L'] = data['Bollinger_M'] - \
-            2 * data['adjusted_close'].rolling(window=20).std()
+        engine = IncrementalFeatureEngine.load(self.state_file_path)
 
-        data.loc[:, 'MOM12'] = data['adjusted_close'] - \
-            data['adjusted_close'].shift(12)
+        new_data = self.loader.load_daily_stock_data(
+            ticker, begin_date=engine.last_date + pd.Timedelta(days=1), end_date=self.now)
+        new_data = new_data[new_data.index > engine.last_date]
 
-        data = data.iloc[::-1]
+        if new_data.empty:
+            print(f"No new data available for {ticker}.")
+            return
 
-        return data
+        new_features = engine.update_frame(new_data)
 
-    def update_commen_features(self, ticker):
-        df = pd.read_csv(self.csv_file_path,
-                         index_col='date', parse_dates=True)
-
-        # Get the latest date in the existing data
-        last_date = df.index.max()
-
-        # Fetch new data from the API
-        new_data = self.loader.load_daily_row_stock_data(
-            ticker, last_n_years=2)
-        new_data.index = pd.to_datetime(new_data.index)
-
-        new_data = self.process_commen_features(new_data)
-
-        # Get the latest date in the new data
-        latest_new_date = new_data.index.max()
-
-        # If the latest date in new data is more recent than the last date in the existing data, append the new data
-        if latest_new_date > last_date:
-            # Filter new data to include only the rows that are more recent than the last date in the existing data
-            new_data_to_add = new_data.loc[:last_date + pd.Timedelta(days=1)]
-            # Concatenate the new data with the existing data
-            df = pd.concat([new_data_to_add, df])
-            # Save the updated dataframe back to the CSV file
-            df.to_csv(self.csv_file_path)
-            print(f"Data for {ticker} has been updated.")
-        else:
-            print(f"No new data available for {ticker}.")
+        header = pd.read_csv(self.csv_file_path, index_col='date', nrows=0).columns
+        new_features[header].iloc[::-1].to_csv(self.csv_file_path, mode='a', header=False)
+        engine.save(self.state_file_path)
 
+        print(f"Data for {ticker} has been updated.")
+        print(
+            f"Updated Data Date Range: {new_features.index.min()} to {new_features.index.max()}")
@@ -0,0 +1,281 @@
+import numpy as np
+import pandas as pd
+
+
+class Feature:
+    """
+    A registered feature.
+
+    Args:
+        name (str): Output column name.
+        func (callable): `func(ctx)` returning the feature as a Series.
+        inputs (list): Raw columns or other feature names the feature reads.
+    """
+
+    def __init__(self, name, func, inputs=()):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+
+    def __repr__(self):
+        return f'Feature({self.name!r}, inputs={self.inputs})'
+
+
+class FeatureContext:
+    """
+    Computation state for one ascending frame.
+
+    Features read raw columns and earlier features through `ctx[name]`, and
+    rolling/EWM statistics through the helpers below. The helpers cache every
+    intermediate by (column, window, statistic), so features sharing a window
+    share one pass over the data.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.features = {}
+        self.cache = {}
+
+    def __getitem__(self, name):
+        if name in self.features:
+            return self.features[name]
+        return self.data[name]
+
+    def _cached(self, key, compute):
+        if key not in self.cache:
+            self.cache[key] = compute()
+        return self.cache[key]
+
+    def rolling(self, column, window, stat):
+        """
+        `ctx[column].rolling(window).<stat>()`, computed once per frame.
+
+        `std` is derived from the cached `var`, as pandas itself does.
+        """
+        if stat == 'std':
+            def compute():
+                var = self.rolling(column, window, 'var')
+                return np.sqrt(var).where(~(var < 0), 0.0)
+            return self._cached(('rolling', column, window, 'std'), compute)
+        return self._cached(('rolling', column, window, stat),
+                            lambda: getattr(self[column].rolling(window=window), stat)())
+
+    def ewm(self, column, span=None, alpha=None, min_periods=0):
+        """
+        `ctx[column].ewm(span or alpha, min_periods, adjust=False).mean()`.
+
+        The recursion is shared between calls that only differ in
+        min_periods, which just masks the leading values.
+        """
+        base = self._cached(('ewm', column, span, alpha),
+                            lambda: self[column].ewm(span=span, alpha=alpha, adjust=False).mean())
+        if min_periods <= 1:
+            return base
+        count = self._cached(('count', column), lambda: self[column].notna().cumsum())
+        return base.where(count >= min_periods)
+
+    def shift(self, column, periods):
+        return self._cached(('shift', column, periods), lambda: self[column].shift(periods))
+
+
+class FeatureRegistry:
+    """
+    Named features with their dependencies.
+
+    `compute` plans the requested features together with the features they
+    depend on, computes each once in dependency order and returns only the
+    requested ones.
+    """
+
+    def __init__(self):
+        self.features = {}
+
+    def register(self, name, inputs=()):
+        """
+        Decorator registering `func(ctx)` as the feature `name`.
+
+        Args:
+            name (str): Output column name.
+            inputs (list): Raw columns or feature names the feature reads.
+        """
+        def decorator(func):
+            if name in self.features:
+                raise ValueError(f"Feature '{name}' is already registered")
+            self.features[name] = Feature(name, func, inputs)
+            return func
+        return decorator
+
+    def names(self):
+        return list(self.features)
+
+    def plan(self, names=None):
+        """
+        Order the features needed to compute `names`.
+
+        Args:
+            names (list): Requested features, all registered features if None.
+
+        Returns:
+            list: Feature objects, each after the features it depends on.
+        """
+        names = self.names() if names is None else list(names)
+        for name in names:
+            if name not in self.features:
+                raise ValueError(f"Unknown feature '{name}'")
+
+        ordered = []
+        state = {}
+
+        def visit(name, path):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f"Circular feature dependency: {' -> '.join(path + [name])}")
+            state[name] = 'visiting'
+            for dependency in self.features[name].inputs:
+                if dependency in self.features:
+                    visit(dependency, path + [name])
+            state[name] = 'done'
+            ordered.append(self.features[name])
+
+        # Visit in registration order so the output keeps a stable column order
+        requested = set(names)
+        for name in self.features:
+            if name in requested:
+                visit(name, [])
+        return ordered
+
+    def compute(self, data, names=None):
+        """
+        Compute features on an ascending frame.
+
+        Args:
+            data (DataFrame): Raw daily data, oldest row first.
+            names (list): Features to compute, all registered features if None.
+
+        Returns:
+            DataFrame: The requested features, in registration order.
+        """
+        requested = self.names() if names is None else list(names)
+        ctx = FeatureContext(data)
+        for feature in self.plan(requested):
+            ctx.features[feature.name] = feature.func(ctx)
+        ordered = [name for name in self.features if name in set(requested)]
+        return pd.DataFrame({name: ctx.features[name] for name in ordered}, index=data.index)
+
+
+commen_feature_registry = FeatureRegistry()
+register_feature = commen_feature_registry.register
+
+
+@register_feature('log_return', inputs=['adjusted_close'])
+def log_return(ctx):
+    return np.log(ctx['adjusted_close'] / ctx.shift('adjusted_close', 1))
+
+
+@register_feature('volatility', inputs=['log_return'])
+def volatility(ctx):
+    return ctx.rolling('log_return', 252, 'std') * np.sqrt(252)
+
+
+@register_feature('volatility_change', inputs=['volatility'])
+def volatility_change(ctx):
+    return ctx['volatility'].diff()
+
+
+@register_feature('log_volume', inputs=['volume'])
+def log_volume(ctx):
+    return np.log(ctx['volume'])
+
+
+@register_feature('daily_returns', inputs=['adjusted_close'])
+def daily_returns(ctx):
+    return ctx['adjusted_close'] - ctx.shift('adjusted_close', 1)
+
+
+@register_feature('MA-5', inputs=['adjusted_close'])
+def ma_5(ctx):
+    return ctx.rolling('adjusted_close', 5, 'mean')
+
+
+@register_feature('MA-30', inputs=['adjusted_close'])
+def ma_30(ctx):
+    return ctx.rolling('adjusted_close', 30, 'mean')
+
+
+@register_feature('RSI', inputs=['adjusted_close'])
+def rsi(ctx):
+    # Imported on first use, ta is slow to import
+    import ta
+
+    return ta.momentum.RSIIndicator(ctx['adjusted_close'], window=14).rsi()
+
+
+@register_feature('5-day_variance', inputs=['adjusted_close'])
+def variance_5(ctx):
+    return ctx.rolling('adjusted_close', 5, 'var')
+
+
+@register_feature('Williams_%R', inputs=['high', 'low', 'adjusted_close'])
+def williams_r(ctx):
+    # Same computation as ta.momentum.WilliamsRIndicator(lbp=14)
+    highest_high = ctx.rolling('high', 14, 'max')
+    lowest_low = ctx.rolling('low', 14, 'min')
+    return -100 * (highest_high - ctx['adjusted_close']) / (highest_high - lowest_low)
+
+
+@register_feature('z_score', inputs=['adjusted_close'])
+def z_score(ctx):
+    return (ctx['adjusted_close'] - ctx.rolling('adjusted_close', 10, 'mean')
+            ) / ctx.rolling('adjusted_close', 10, 'std')
+
+
+@register_feature('SMA10', inputs=['adjusted_close'])
+def sma_10(ctx):
+    return ctx.rolling('adjusted_close', 10, 'mean')
+
+
+@register_feature('EMA12', inputs=['adjusted_close'])
+def ema_12(ctx):
+    return ctx.ewm('adjusted_close', span=12)
+
+
+@register_feature('MACD', inputs=['adjusted_close'])
+def macd(ctx):
+    # Same computation as ta.trend.MACD(window_fast=12, window_slow=26).macd()
+    return ctx.ewm('adjusted_close', span=12, min_periods=12) - \
+        ctx.ewm('adjusted_close', span=26, min_periods=26)
+
+
+@register_feature('RoC', inputs=['adjusted_close'])
+def roc(ctx):
+    # Same computation as ta.momentum.ROCIndicator(window=1)
+    previous = ctx.shift('adjusted_close', 1)
+    return ((ctx['adjusted_close'] - previous) / previous) * 100
+
+
+@register_feature('K15', inputs=['high', 'low', 'adjusted_close'])
+def k_15(ctx):
+    low_min = ctx.rolling('low', 15, 'min')
+    high_max = ctx.rolling('high', 15, 'max')
+    return ((ctx['adjusted_close'] - low_min) / (high_max - low_min)) * 100
+
+
+@register_feature('Bollinger_M', inputs=['adjusted_close'])
+def bollinger_m(ctx):
+    return ctx.rolling('adjusted_close', 20, 'mean')
+
+
+@register_feature('Bollinger_U', inputs=['Bollinger_M', 'adjusted_close'])
+def bollinger_u(ctx):
+    return ctx['Bollinger_M'] + 2 * ctx.rolling('adjusted_close', 20, 'std')
+
+
+@register_feature('Bollinger_L', inputs=['Bollinger_M', 'adjusted_close'])
+def bollinger_l(ctx):
+    return ctx['Bollinger_M'] - 2 * ctx.rolling('adjusted_close', 20, 'std')
+
+
+@register_feature('MOM12', inputs=['adjusted_close'])
+def mom_12(ctx):
+    return ctx['adjusted_close'] - ctx.shift('adjusted_close', 12)
@@ -0,0 +1,452 @@
+import json
+import math
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+NaN = float('nan')
+# pandas 1.5 returns the repeated value (mean) or 0 (variance) over a window
+# of equal values instead of the rounding residue of its sums (GH#42064)
+SAME_VALUE_RUNS = tuple(int(part) for part in pd.__version__.split('.')[:2]) >= (1, 5)
+
+
+def _clean(value):
+    """Cast to float and treat +/-inf as missing, like pandas window functions do."""
+    value = float(value)
+    return NaN if math.isinf(value) else value
+
+
+class RollingMean:
+    """
+    Streaming equivalent of `Series.rolling(window).mean()`.
+
+    Keeps the same Kahan-compensated running sum as pandas' `roll_mean`
+    (separate compensation terms for added and removed values) and the same
+    count of trailing equal values, so feeding a series one value at a time
+    reproduces the batch result bit for bit.
+    """
+
+    def __init__(self, window, min_periods=None):
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self.values = deque()
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.num_consecutive_same_value = 0
+        self.prev_value = NaN
+
+    def _add(self, val):
+        if val == val:
+            self.nobs += 1
+            y = val - self.compensation_add
+            t = self.sum_x + y
+            self.compensation_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct += 1
+            if val == self.prev_value:
+                self.num_consecutive_same_value += 1
+            else:
+                self.num_consecutive_same_value = 1
+            self.prev_value = val
+
+    def _remove(self, val):
+        if val == val:
+            self.nobs -= 1
+            y = - val - self.compensation_remove
+            t = self.sum_x + y
+            self.compensation_remove = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct -= 1
+
+    def update(self, value):
+        value = _clean(value)
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self._add(value)
+        self.values.append(value)
+
+        if self.nobs >= self.min_periods and self.nobs > 0:
+            result = self.sum_x / float(self.nobs)
+            if SAME_VALUE_RUNS and self.num_consecutive_same_value >= self.nobs:
+                result = self.prev_value
+            elif self.neg_ct == 0 and result < 0:
+                result = 0.0
+            elif self.neg_ct == self.nobs and result > 0:
+                result = 0.0
+            return result
+        return NaN
+
+    def state_dict(self):
+        return {'values': list(self.values), 'nobs': self.nobs, 'neg_ct': self.neg_ct,
+                'sum_x': self.sum_x, 'compensation_add': self.compensation_add,
+                'compensation_remove': self.compensation_remove,
+                'num_consecutive_same_value': self.num_consecutive_same_value,
+                'prev_value': self.prev_value}
+
+    def load_state_dict(self, state):
+        self.values = deque(state['values'])
+        for key in ('nobs', 'neg_ct', 'sum_x', 'compensation_add', 'compensation_remove',
+                    'num_consecutive_same_value', 'prev_value'):
+            setattr(self, key, state[key])
+
+
+class RollingVar:
+    """
+    Streaming equivalent of `Series.rolling(window).var(ddof)`.
+
+    Mirrors pandas' `roll_var`: Welford's online update with Kahan
+    compensation, applied as remove-then-add for every new value.
+    """
+
+    def __init__(self, window, min_periods=None, ddof=1):
+        self.window = window
+        self.min_periods = max(window if min_periods is None else min_periods, 1)
+        self.ddof = ddof
+        self.values = deque()
+        self.nobs = 0.0
+        self.mean_x = 0.0
+        self.ssqdm_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.num_consecutive_same_value = 0
+        self.prev_value = NaN
+
+    def _add(self, val):
+        if val != val:
+            return
+        self.nobs = self.nobs + 1
+        if val == self.prev_value:
+            self.num_consecutive_same_value += 1
+        else:
+            self.num_consecutive_same_value = 1
+        self.prev_value = val
+        prev_mean = self.mean_x - self.compensation_add
+        y = val - self.compensation_add
+        t = y - self.mean_x
+        self.compensation_add = t + self.mean_x - y
+        delta = t
+        if self.nobs:
+            self.mean_x = self.mean_x + delta / self.nobs
+        else:
+            self.mean_x = 0.0
+        self.ssqdm_x = self.ssqdm_x + (val - prev_mean) * (val - self.mean_x)
+
+    def _remove(self, val):
+        if val == val:
+            self.nobs = self.nobs - 1
+            if self.nobs:
+                prev_mean = self.mean_x - self.compensation_remove
+                y = val - self.compensation_remove
+                t = y - self.mean_x
+                self.compensation_remove = t + self.mean_x - y
+                delta = t
+                self.mean_x = self.mean_x - delta / self.nobs
+                self.ssqdm_x = self.ssqdm_x - (val - prev_mean) * (val - self.mean_x)
+            else:
+                self.mean_x = 0.0
+                self.ssqdm_x = 0.0
+
+    def update(self, value):
+        value = _clean(value)
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self._add(value)
+        self.values.append(value)
+
+        if self.nobs >= self.min_periods and self.nobs > self.ddof:
+            if self.nobs == 1 or (SAME_VALUE_RUNS and self.num_consecutive_same_value >= self.nobs):
+                return 0.0
+            return self.ssqdm_x / (self.nobs - float(self.ddof))
+        return NaN
+
+    def state_dict(self):
+        return {'values': list(self.values), 'nobs': self.nobs, 'mean_x': self.mean_x,
+                'ssqdm_x': self.ssqdm_x, 'compensation_add': self.compensation_add,
+                'compensation_remove': self.compensation_remove,
+                'num_consecutive_same_value': self.num_consecutive_same_value,
+                'prev_value': self.prev_value}
+
+    def load_state_dict(self, state):
+        self.values = deque(state['values'])
+        for key in ('nobs', 'mean_x', 'ssqdm_x', 'compensation_add', 'compensation_remove',
+                    'num_consecutive_same_value', 'prev_value'):
+            setattr(self, key, state[key])
+
+
+class RollingExtreme:
+    """
+    Streaming equivalent of `Series.rolling(window).max()` or `.min()`.
+    """
+
+    def __init__(self, window, kind='max', min_periods=None):
+        if kind not in ('max', 'min'):
+            raise ValueError(f"Invalid kind '{kind}', expected 'max' or 'min'")
+        self.window = window
+        self.kind = kind
+        self.min_periods = window if min_periods is None else min_periods
+        self.values = deque(maxlen=window)
+
+    def update(self, value):
+        self.values.append(_clean(value))
+        observed = [val for val in self.values if val == val]
+        if len(observed) >= self.min_periods and observed:
+            return max(observed) if self.kind == 'max' else min(observed)
+        return NaN
+
+    def state_dict(self):
+        return {'values': list(self.values)}
+
+    def load_state_dict(self, state):
+        self.values = deque(state['values'], maxlen=self.window)
+
+
+class EWMMean:
+    """
+    Streaming equivalent of `Series.ewm(..., adjust=False).mean()`.
+
+    Args:
+        com (float): Center of mass, see `com_from_span` and `com_from_alpha`.
+        min_periods (int): Minimum number of observations before emitting a value.
+    """
+
+    def __init__(self, com, min_periods=0):
+        self.alpha = 1. / (1. + com)
+        self.old_wt_factor = 1. - self.alpha
+        self.new_wt = self.alpha
+        self.min_periods = max(int(min_periods), 1)
+        self.count = 0
+        self.nobs = 0
+        self.weighted = NaN
+        self.old_wt = 1.
+
+    def update(self, value):
+        cur = _clean(value)
+        is_observation = cur == cur
+        if self.count == 0:
+            self.weighted = cur
+            self.nobs = int(is_observation)
+        else:
+            self.nobs += is_observation
+            if self.weighted == self.weighted:
+                self.old_wt *= self.old_wt_factor
+                if is_observation:
+                    # pandas skips the update on a constant series to avoid rounding drift
+                    if self.weighted != cur:
+                        self.weighted = self.old_wt * self.weighted + self.new_wt * cur
+                        self.weighted /= (self.old_wt + self.new_wt)
+                    self.old_wt = 1.
+            elif is_observation:
+                self.weighted = cur
+        self.count += 1
+        return self.weighted if self.nobs >= self.min_periods else NaN
+
+    def state_dict(self):
+        return {'count': self.count, 'nobs': self.nobs,
+                'weighted': self.weighted, 'old_wt': self.old_wt}
+
+    def load_state_dict(self, state):
+        for key in ('count', 'nobs', 'weighted', 'old_wt'):
+            setattr(self, key, state[key])
+
+
+class Lag:
+    """
+    Streaming equivalent of `Series.shift(periods)`.
+    """
+
+    def __init__(self, periods):
+        self.periods = periods
+        self.values = deque(maxlen=periods + 1)
+
+    def update(self, value):
+        self.values.append(float(value))
+        return self.values[0] if len(self.values) > self.periods else NaN
+
+    def state_dict(self):
+        return {'values': list(self.values)}
+
+    def load_state_dict(self, state):
+        self.values = deque(state['values'], maxlen=self.periods + 1)
+
+
+def com_from_span(span):
+    return float((span - 1) / 2)
+
+
+def com_from_alpha(alpha):
+    return float((1 - alpha) / alpha)
+
+
+class IncrementalFeatureEngine:
+    """
+    Stateful, bar-by-bar version of `FeatureEngineering.process_commen_features`.
+
+    Every indicator keeps only its rolling state (window buffers, EMA
+    accumulators, RSI average gains/losses), so appending a bar costs the
+    same however long the history is. Fed the same bars in date order, the
+    engine produces exactly the values of the batch pipeline.
+    """
+
+    FEATURES = ['log_return', 'volatility', 'volatility_change', 'log_volume',
+                'daily_returns', 'MA-5', 'MA-30', 'RSI', '5-day_variance',
+                'Williams_%R', 'z_score', 'SMA10', 'EMA12', 'MACD', 'RoC', 'K15',
+                'Bollinger_M', 'Bollinger_U', 'Bollinger_L', 'MOM12']
+
+    def __init__(self):
+        self.last_date = None
+        self.prev_close = Lag(1)
+        self.prev_volatility = NaN
+        self.kernels = {
+            'volatility_var': RollingVar(252),
+            'ma5': RollingMean(5),
+            'ma30': RollingMean(30),
+            'rsi_up': EWMMean(com_from_alpha(1 / 14), min_periods=14),
+            'rsi_down': EWMMean(com_from_alpha(1 / 14), min_periods=14),
+            'var5': RollingVar(5),
+            'high14': RollingExtreme(14, 'max'),
+            'low14': RollingExtreme(14, 'min'),
+            'mean10': RollingMean(10),
+            'var10': RollingVar(10),
+            'ema12': EWMMean(com_from_span(12)),
+            'macd_fast': EWMMean(com_from_span(12), min_periods=12),
+            'macd_slow': EWMMean(com_from_span(26), min_periods=26),
+            'low15': RollingExtreme(15, 'min'),
+            'high15': RollingExtreme(15, 'max'),
+            'mean20': RollingMean(20),
+            'var20': RollingVar(20),
+            'close_lag12': Lag(12),
+        }
+
+    def update(self, date, bar):
+        """
+        Add one bar and compute its features.
+
+        Args:
+            date (Timestamp): Date of the bar, must be after the last one.
+            bar (Series): Raw daily columns, at least adjusted_close, high,
+                low and volume.
+
+        Returns:
+            Series: The raw columns followed by the feature columns.
+        """
+        features = self._step(date, bar['adjusted_close'], bar['high'], bar['low'], bar['volume'])
+        return pd.concat([bar, pd.Series(features, dtype='float64')])
+
+    def _step(self, date, close, high, low, volume):
+        date = pd.Timestamp(date)
+        if self.last_date is not None and date <= self.last_date:
+            raise ValueError(f'Bar {date} is not after the last processed bar {self.last_date}')
+
+        k = self.kernels
+        close = np.float64(close)
+        high = np.float64(high)
+        low = np.float64(low)
+        volume = np.float64(volume)
+        prev_close = np.float64(self.prev_close.update(close))
+
+        features = {}
+        with np.errstate(all='ignore'):
+            features['log_return'] = np.log(close / prev_close)
+            features['volatility'] = _zsqrt(
+                k['volatility_var'].update(features['log_return'])) * np.sqrt(252)
+            features['volatility_change'] = features['volatility'] - self.prev_volatility
+            self.prev_volatility = features['volatility']
+            features['log_volume'] = np.log(volume)
+
+            diff = close - prev_close
+            features['daily_returns'] = diff
+            features['MA-5'] = np.float64(k['ma5'].update(close))
+            features['MA-30'] = np.float64(k['ma30'].update(close))
+
+            up = diff if diff > 0 else 0.0
+            down = -(diff if diff < 0 else 0.0)
+            emaup = np.float64(k['rsi_up'].update(up))
+            emadn = np.float64(k['rsi_down'].update(down))
+            features['RSI'] = np.float64(100) if emadn == 0 else 100 - (100 / (1 + emaup / emadn))
+
+            features['5-day_variance'] = np.float64(k['var5'].update(close))
+
+            highest_high = np.float64(k['high14'].update(high))
+            lowest_low = np.float64(k['low14'].update(low))
+            features['Williams_%R'] = -100 * (highest_high - close) / (highest_high - lowest_low)
+
+            mean10 = np.float64(k['mean10'].update(close))
+            std10 = _zsqrt(k['var10'].update(close))
+            features['z_score'] = (close - mean10) / std10
+            features['SMA10'] = mean10
+            features['EMA12'] = np.float64(k['ema12'].update(close))
+            features['MACD'] = np.float64(k['macd_fast'].update(close)) - \
+                np.float64(k['macd_slow'].update(close))
+            features['RoC'] = ((close - prev_close) / prev_close) * 100
+
+            low_min = np.float64(k['low15'].update(low))
+            high_max = np.float64(k['high15'].update(high))
+            features['K15'] = ((close - low_min) / (high_max - low_min)) * 100
+
+            mean20 = np.float64(k['mean20'].update(close))
+            std20 = _zsqrt(k['var20'].update(close))
+            features['Bollinger_M'] = mean20
+            features['Bollinger_U'] = mean20 + 2 * std20
+            features['Bollinger_L'] = mean20 - 2 * std20
+            features['MOM12'] = close - np.float64(k['close_lag12'].update(close))
+
+        self.last_date = date
+        return features
+
+    def update_frame(self, data):
+        """
+        Feed every bar of a frame, oldest first.
+
+        Args:
+            data (DataFrame): Raw daily data indexed by date, in any order.
+
+        Returns:
+            DataFrame: Raw columns and features, newest first like the
+            feature files.
+        """
+        data = data.sort_index()
+        rows = [self._step(*bar) for bar in zip(
+            data.index, data['adjusted_close'], data['high'], data['low'], data['volume'])]
+        features = pd.DataFrame(rows, index=data.index, columns=self.FEATURES, dtype='float64')
+        return pd.concat([data, features], axis=1).iloc[::-1]
+
+    def state_dict(self):
+        return {
+            'last_date': None if self.last_date is None else self.last_date.isoformat(),
+            'prev_close': self.prev_close.state_dict(),
+            'prev_volatility': float(self.prev_volatility),
+            'kernels': {name: kernel.state_dict() for name, kernel in self.kernels.items()},
+        }
+
+    def load_state_dict(self, state):
+        self.last_date = None if state['last_date'] is None else pd.Timestamp(state['last_date'])
+        self.prev_close.load_state_dict(state['prev_close'])
+        self.prev_volatility = state['prev_volatility']
+        for name, kernel in self.kernels.items():
+            kernel.load_state_dict(state['kernels'][name])
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        engine = cls()
+        with open(path) as f:
+            engine.load_state_dict(json.load(f))
+        return engine
+
+
+def _zsqrt(value):
+    value = np.float64(value)
+    return np.float64(0.0) if value < 0 else np.sqrt(value)
@@ -0,0 +1,247 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+PANEL_FEATURES = ['log_return', 'volatility', 'volatility_change', 'log_volume',
+                  'daily_returns', 'MA-5', 'MA-30', 'RSI', '5-day_variance',
+                  'Williams_%R', 'z_score', 'SMA10', 'EMA12', 'MACD', 'RoC', 'K15',
+                  'Bollinger_M', 'Bollinger_U', 'Bollinger_L', 'MOM12']
+
+
+def align_panel(frames, fields=('adjusted_close', 'high', 'low', 'volume'), dtype=np.float64):
+    """
+    Align per-ticker daily frames into dates x tickers arrays.
+
+    Args:
+        frames (dict): Ticker to daily DataFrame indexed by date, in any order.
+        fields (tuple): Columns to extract.
+        dtype: Output dtype, np.float64 or np.float32.
+
+    Returns:
+        tuple: (dates, tickers, arrays) where arrays maps each field to a
+        (len(dates), len(tickers)) array, NaN where a ticker has no bar.
+    """
+    tickers = list(frames)
+    dates = pd.DatetimeIndex(sorted(set().union(*(frame.index for frame in frames.values()))))
+    arrays = {field: np.full((len(dates), len(tickers)), np.nan, dtype=dtype) for field in fields}
+    for j, ticker in enumerate(tickers):
+        frame = frames[ticker]
+        frame = frame[~frame.index.duplicated(keep='first')]
+        rows = dates.get_indexer(frame.index)
+        for field in fields:
+            arrays[field][rows, j] = frame[field].to_numpy(dtype=dtype)
+    return dates, tickers, arrays
+
+
+def _shift(x, periods):
+    out = np.full_like(x, np.nan)
+    out[periods:] = x[:-periods]
+    return out
+
+
+def _diff(x, periods=1):
+    return x - _shift(x, periods)
+
+
+def _windowed(csum, window):
+    out = csum.copy()
+    out[window:] -= csum[:-window]
+    return out
+
+
+def _rolling_moments(x, window):
+    """
+    Rolling mean and sample variance along the date axis.
+
+    Windows containing a NaN (missing listing or gap) give NaN, as with
+    `rolling(window)` and its default min_periods. Short windows use an
+    exact two-pass sum over shifted slices. Long windows use cumulative
+    sums around each column's mean, which is accurate for series that stay
+    near a level, like returns.
+    """
+    if window <= 64:
+        return _rolling_moments_direct(x, window)
+
+    valid = ~np.isnan(x)
+    with np.errstate(all='ignore'):
+        ref = np.where(valid.any(axis=0), np.nanmean(np.where(valid, x, np.nan), axis=0), 0.0)
+    centered = np.where(valid, x - ref, 0.0).astype(np.float64)
+
+    count = _windowed(np.cumsum(valid, axis=0, dtype=np.int64), window)
+    s1 = _windowed(np.cumsum(centered, axis=0), window)
+    s2 = _windowed(np.cumsum(centered * centered, axis=0), window)
+
+    full = count == window
+    with np.errstate(all='ignore'):
+        mean = np.where(full, ref + s1 / window, np.nan)
+        var = np.where(full, np.maximum((s2 - s1 * s1 / window) / (window - 1), 0.0), np.nan)
+    return mean, var
+
+
+def _rolling_moments_direct(x, window):
+    n = x.shape[0]
+    mean = np.full(x.shape, np.nan, dtype=np.float64)
+    var = np.full(x.shape, np.nan, dtype=np.float64)
+    if n < window:
+        return mean, var
+
+    # Row t of the window views is the window ending at date t + window - 1
+    total = np.zeros((n - window + 1,) + x.shape[1:], dtype=np.float64)
+    for k in range(window):
+        total += x[k:n - window + 1 + k]
+    mean[window - 1:] = total / window
+
+    squares = np.zeros_like(total)
+    for k in range(window):
+        deviation = x[k:n - window + 1 + k] - mean[window - 1:]
+        squares += deviation * deviation
+    var[window - 1:] = squares / (window - 1)
+    return mean, var
+
+
+def _rolling_extreme(x, window, kind):
+    out = np.full(x.shape, np.nan, dtype=np.float64)
+    if x.shape[0] >= window:
+        view = sliding_window_view(x, window, axis=0)
+        # NaN propagates, matching min_periods=window
+        out[window - 1:] = view.max(axis=-1) if kind == 'max' else view.min(axis=-1)
+    return out
+
+
+def _ewm_mean(x, com, min_periods=0):
+    """
+    `ewm(com=com, adjust=False, min_periods=min_periods).mean()` on every column.
+
+    The recursion runs over dates with each step vectorized across tickers.
+    Leading NaNs (not yet listed) are skipped, so every column starts at its
+    first observation.
+    """
+    alpha = 1. / (1. + com)
+    old_wt_factor = 1. - alpha
+    min_periods = max(int(min_periods), 1)
+
+    out = np.empty(x.shape, dtype=np.float64)
+    weighted = x[0].astype(np.float64)
+    nobs = (~np.isnan(weighted)).astype(np.int64)
+    old_wt = np.ones(x.shape[1])
+    out[0] = np.where(nobs >= min_periods, weighted, np.nan)
+
+    for i in range(1, x.shape[0]):
+        cur = x[i].astype(np.float64)
+        observed = ~np.isnan(cur)
+        nobs += observed
+        started = ~np.isnan(weighted)
+
+        old_wt = np.where(started, old_wt * old_wt_factor, old_wt)
+        update = started & observed & (weighted != cur)
+        blended = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+        weighted = np.where(update, blended, weighted)
+        old_wt = np.where(started & observed, 1., old_wt)
+        weighted = np.where(~started & observed, cur, weighted)
+
+        out[i] = np.where(nobs >= min_periods, weighted, np.nan)
+    return out
+
+
+def compute_panel_features(close, high, low, volume, dtype=np.float64, block_size=256):
+    """
+    Compute the common feature set for every ticker of a panel at once.
+
+    The arrays are aligned dates x tickers, oldest date first, with NaN
+    where a ticker has no bar. Each feature matches what
+    `FeatureEngineering.process_commen_features` gives for that ticker, up
+    to floating point rounding.
+
+    Tickers are processed `block_size` columns at a time: the kernels run in
+    float64 on one block and write into the output arrays, so the working
+    arrays never hold more than a block and float32 outputs halve the peak
+    memory.
+
+    Args:
+        close (ndarray): Adjusted close prices.
+        high (ndarray): High prices.
+        low (ndarray): Low prices.
+        volume (ndarray): Volumes.
+        dtype: np.float64, or np.float32 to halve the memory of the outputs.
+        block_size (int): Number of tickers computed together.
+
+    Returns:
+        dict: Feature name to (dates, tickers) array of the given dtype.
+    """
+    close, high, low, volume = (np.asarray(array) for array in (close, high, low, volume))
+    if not close.shape == high.shape == low.shape == volume.shape or close.ndim != 2:
+        raise ValueError('close, high, low and volume must be 2-D arrays of the same shape')
+
+    features = {name: np.empty(close.shape, dtype=dtype) for name in PANEL_FEATURES}
+    for start in range(0, close.shape[1], block_size):
+        block = slice(start, start + block_size)
+        computed = _block_features(*(np.asarray(array[:, block], dtype=np.float64)
+                                     for array in (close, high, low, volume)))
+        for name, values in computed.items():
+            features[name][:, block] = values
+    return features
+
+
+def _block_features(close, high, low, volume):
+    features = {}
+    listed = ~np.isnan(close)
+
+    def store(name, values):
+        # No features on dates without a bar, e.g. after a delisting
+        features[name] = np.where(listed, values, np.nan)
+
+    with np.errstate(all='ignore'):
+        prev_close = _shift(close, 1)
+        log_return = np.log(close / prev_close)
+        store('log_return', log_return)
+
+        _, var252 = _rolling_moments(log_return, 252)
+        volatility = np.sqrt(var252) * np.sqrt(252)
+        store('volatility', volatility)
+        store('volatility_change', _diff(volatility))
+        store('log_volume', np.log(volume))
+
+        daily_returns = close - prev_close
+        store('daily_returns', daily_returns)
+
+        mean5, var5 = _rolling_moments(close, 5)
+        store('MA-5', mean5)
+        store('MA-30', _rolling_moments(close, 30)[0])
+
+        up = np.where(daily_returns > 0, daily_returns, 0.0)
+        down = -np.where(daily_returns < 0, daily_returns, 0.0)
+        # Before a listing the inputs are missing rather than zero moves
+        up[~listed] = np.nan
+        down[~listed] = np.nan
+        rsi_com = (1 - 1 / 14) / (1 / 14)
+        emaup = _ewm_mean(up, rsi_com, 14)
+        emadn = _ewm_mean(down, rsi_com, 14)
+        store('RSI', np.where(emadn == 0, 100, 100 - (100 / (1 + emaup / emadn))))
+
+        store('5-day_variance', var5)
+
+        highest_high = _rolling_extreme(high, 14, 'max')
+        lowest_low = _rolling_extreme(low, 14, 'min')
+        store('Williams_%R', -100 * (highest_high - close) / (highest_high - lowest_low))
+
+        mean10, var10 = _rolling_moments(close, 10)
+        store('z_score', (close - mean10) / np.sqrt(var10))
+        store('SMA10', mean10)
+
+        store('EMA12', _ewm_mean(close, (12 - 1) / 2))
+        store('MACD', _ewm_mean(close, (12 - 1) / 2, 12) - _ewm_mean(close, (26 - 1) / 2, 26))
+        store('RoC', ((close - prev_close) / prev_close) * 100)
+
+        low_min = _rolling_extreme(low, 15, 'min')
+        high_max = _rolling_extreme(high, 15, 'max')
+        store('K15', ((close - low_min) / (high_max - low_min)) * 100)
+
+        mean20, var20 = _rolling_moments(close, 20)
+        std20 = np.sqrt(var20)
+        store('Bollinger_M', mean20)
+        store('Bollinger_U', mean20 + 2 * std20)
+        store('Bollinger_L', mean20 - 2 * std20)
+        store('MOM12', close - _shift(close, 12))
+
+    return features
@@ -0,0 +1,306 @@
+import json
+import os
+import time
+
+import pandas as pd
+
+from data_extraction.bulk_loader import BulkLoader
+from data_extraction.env import getenv
+from data_extraction.fetch_financial_data import DailyStockDataLoader, FundamentalDataLoader, is_offline
+from data_engineering.feature_engineering import FeatureEngineering
+
+
+# Refresh order, every stage reads what the previous ones wrote
+STAGES = ['prices', 'earnings', 'income_statement', 'balance_sheet', 'cash_flow', 'features']
+REPORT_STAGES = ['income_statement', 'balance_sheet', 'cash_flow']
+# Stages making one API call per ticker
+API_STAGES = ['prices', 'earnings'] + REPORT_STAGES
+
+
+class RefreshState:
+    """
+    Progress of a refresh run, checkpointed to a JSON file.
+
+    The file holds the plan of the run and the tickers done or failed per
+    stage. A run interrupted before the end is left 'running', and the next
+    run resumes it instead of planning again.
+
+    Args:
+        path (str): JSON file of the state.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.started = None
+        self.status = None
+        self.plan = {}
+        self.deferred = {}
+        self.done = {}
+        self.failed = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.load_state_dict(json.load(f))
+
+    def start(self, plan, deferred):
+        self.started = pd.Timestamp.now().isoformat()
+        self.status = 'running'
+        self.plan = {stage: list(tickers) for stage, tickers in plan.items()}
+        self.deferred = {stage: list(tickers) for stage, tickers in deferred.items()}
+        self.done = {stage: set() for stage in plan}
+        self.failed = {stage: {} for stage in plan}
+        self.save()
+
+    @property
+    def resumable(self):
+        return self.status == 'running'
+
+    def pending(self, stage):
+        return [ticker for ticker in self.plan.get(stage, []) if ticker not in self.done[stage]]
+
+    def mark(self, stage, ticker, error=None):
+        if error is None:
+            self.done[stage].add(ticker)
+            self.failed[stage].pop(ticker, None)
+        else:
+            self.failed[stage][ticker] = str(error)
+
+    def finish(self):
+        unfinished = any(self.failed[stage] for stage in self.plan) or any(self.deferred.values())
+        self.status = 'partial' if unfinished else 'complete'
+        self.save()
+
+    def state_dict(self):
+        return {
+            'started': self.started,
+            'status': self.status,
+            'plan': self.plan,
+            'deferred': self.deferred,
+            'done': {stage: sorted(tickers) for stage, tickers in self.done.items()},
+            'failed': self.failed,
+        }
+
+    def load_state_dict(self, state):
+        self.started = state['started']
+        self.status = state['status']
+        self.plan = state['plan']
+        self.deferred = state['deferred']
+        self.done = {stage: set(tickers) for stage, tickers in state['done'].items()}
+        self.failed = state['failed']
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state_dict(), f)
+        os.replace(tmp_path, self.path)
+
+
+class UniverseRefresh:
+    """
+    Bring prices, earnings, financial reports and features of a universe up to date.
+
+    A run plans every stage from what is stored: fresh tickers are left out
+    (see the loaders' `stale_*` methods) and the reports and features of
+    tickers whose earnings or prices are refreshed are planned too. Tickers
+    are then admitted in priority order until the API budget is used up;
+    the others are deferred to the next run. Stages run in STAGES order,
+    each one checking staleness again, so reports whose earnings turned out
+    unchanged cost no call.
+
+    Progress is checkpointed to `state_path` as tickers finish. A run that
+    was interrupted is resumed by the next one, which skips the tickers
+    already done.
+
+    Example:
+        refresh = UniverseRefresh(tickers, priorities={'AAPL': 10}, max_minutes=60)
+        refresh.run()
+
+    Args:
+        tickers (list): Stock ticker symbols, most important first.
+        priorities (dict): Ticker to priority, higher first. Tickers keep
+            their list order within a priority and default to 0.
+        stages (list): Stages to refresh, all of STAGES if None.
+        state_path (str): Checkpoint file, defaults to FIN_DATA_REFRESH_STATE_PATH
+            or `refresh_state.json`.
+        calls_per_minute (int): API budget of the key, defaults to the
+            FIN_DATA_CALLS_PER_MINUTE environment variable or 75. Calls are
+            limited by the shared client, this converts `max_minutes` and
+            estimates the duration of a run.
+        max_workers (int): Number of worker threads of the API stages.
+        max_calls (int): API calls allowed per run, None for no limit.
+        max_minutes (float): Duration allowed to the API stages of a run,
+            converted to calls at `calls_per_minute`.
+        time_period (str): Period of the earnings and reports, 'quarterly' or 'annual'.
+        max_age (str): Minimum time between two fetches of the earnings or
+            a report of a ticker that has not published its next period yet.
+        checkpoint_interval (float): Seconds between two writes of the state file.
+        offline (bool): Only refresh the features from stored prices,
+            defaults to the FIN_DATA_OFFLINE environment variable.
+    """
+
+    def __init__(self, tickers, priorities=None, stages=None, state_path=None, calls_per_minute=None,
+                 max_workers=8, max_calls=None, max_minutes=None, time_period='quarterly', max_age='1D',
+                 checkpoint_interval=5.0, offline=None):
+        priorities = priorities or {}
+        # sorted is stable, so list order breaks priority ties
+        self.tickers = sorted(dict.fromkeys(tickers), key=lambda ticker: -priorities.get(ticker, 0))
+        self.offline = is_offline() if offline is None else offline
+        stages = stages or STAGES
+        for stage in stages:
+            if stage not in STAGES:
+                raise ValueError(f"Invalid stage '{stage}', expected one of {STAGES}")
+        self.stages = [stage for stage in STAGES if stage in stages
+                       and not (self.offline and stage in API_STAGES)]
+        self.calls_per_minute = calls_per_minute or int(getenv('FIN_DATA_CALLS_PER_MINUTE', 75))
+        self.max_workers = max_workers
+        self.max_calls = max_calls
+        if max_minutes is not None:
+            minute_calls = int(max_minutes * self.calls_per_minute)
+            self.max_calls = minute_calls if max_calls is None else min(max_calls, minute_calls)
+        self.time_period = time_period
+        self.max_age = max_age
+        self.checkpoint_interval = checkpoint_interval
+        self.state = RefreshState(
+            state_path or getenv('FIN_DATA_REFRESH_STATE_PATH') or 'refresh_state.json')
+        self._saved = 0.0
+
+        self.daily_loader = DailyStockDataLoader(offline=self.offline)
+        self.fundamental_loader = FundamentalDataLoader(offline=self.offline)
+        self.feature_engineering = FeatureEngineering(offline=self.offline)
+
+    def stale(self, stage, tickers):
+        """
+        Tickers of `tickers` whose data of a stage needs a refresh, in the same order.
+        """
+        if stage == 'prices':
+            return self.daily_loader.stale_tickers(tickers)
+        if stage == 'earnings':
+            return self.fundamental_loader.stale_earnings(tickers, self.time_period, self.max_age)
+        if stage in REPORT_STAGES:
+            return self.fundamental_loader.stale_reports(tickers, stage, self.time_period, self.max_age)
+        return self.feature_engineering.stale_tickers(tickers)
+
+    def plan(self):
+        """
+        Plan a run: the stale tickers of every stage, within the API budget.
+
+        Returns:
+            tuple: (plan, deferred) dictionaries of stage to tickers, in
+            priority order. Deferred tickers are left for the next run.
+        """
+        stale = {}
+        for stage in self.stages:
+            found = set(self.stale(stage, self.tickers))
+            # New earnings or prices are followed by their reports or features
+            if stage in REPORT_STAGES:
+                found |= stale.get('earnings', set())
+            elif stage == 'features':
+                found |= stale.get('prices', set())
+            stale[stage] = found
+
+        plan = {stage: [] for stage in self.stages}
+        deferred = {stage: [] for stage in self.stages}
+        remaining = self.max_calls
+        for ticker in self.tickers:
+            api_stages = [stage for stage in self.stages if stage in API_STAGES and ticker in stale[stage]]
+            # A ticker is refreshed completely or deferred completely
+            admitted = remaining is None or len(api_stages) <= remaining
+            if admitted and remaining is not None:
+                remaining -= len(api_stages)
+            for stage in self.stages:
+                if ticker in stale[stage]:
+                    # Features wait for the prices they are computed from
+                    if admitted or (stage == 'features' and ticker not in stale.get('prices', ())):
+                        plan[stage].append(ticker)
+                    else:
+                        deferred[stage].append(ticker)
+        return plan, deferred
+
+    def describe(self, plan, deferred):
+        calls = sum(len(plan[stage]) for stage in plan if stage in API_STAGES)
+        counts = ', '.join(f'{stage} {len(tickers)}' for stage, tickers in plan.items())
+        print(f"Refresh plan for {len(self.tickers)} tickers: {counts}.")
+        print(f"At most {calls} API calls, about {calls / self.calls_per_minute:.1f} minutes "
+              f"at {self.calls_per_minute} calls per minute.")
+        n_deferred = len({ticker for tickers in deferred.values() for ticker in tickers})
+        if n_deferred:
+            print(f"{n_deferred} tickers are deferred to the next run by the API budget.")
+
+    def _checkpoint(self, force=False):
+        if force or time.monotonic() - self._saved >= self.checkpoint_interval:
+            self.state.save()
+            self._saved = time.monotonic()
+
+    def run(self, resume=True):
+        """
+        Refresh the universe, resuming an interrupted run if there is one.
+
+        Args:
+            resume (bool): Continue the interrupted run of the state file,
+                False to always plan again.
+
+        Returns:
+            RefreshState: The state of the run, with the tickers done and
+            failed per stage.
+        """
+        if resume and self.state.resumable:
+            print(f"Resuming the refresh started at {self.state.started}.")
+        else:
+            self.state.start(*self.plan())
+        self.describe(self.state.plan, self.state.deferred)
+
+        try:
+            for stage in self.state.plan:
+                self._run_stage(stage)
+                self._checkpoint(force=True)
+        except BaseException:
+            # Left 'running', the next run resumes from the last finished tickers
+            self._checkpoint(force=True)
+            raise
+        self.state.finish()
+
+        failed = sum(len(tickers) for tickers in self.state.failed.values())
+        print(f"Refresh {self.state.status}: {failed} failed tickers.")
+        return self.state
+
+    def _run_stage(self, stage):
+        pending = self.state.pending(stage)
+        if not pending:
+            return
+        # Checked again, earlier stages or runs may have made tickers fresh
+        stale = set(self.stale(stage, pending))
+        for ticker in pending:
+            if ticker not in stale:
+                self.state.mark(stage, ticker)
+        tasks = [ticker for ticker in pending if ticker in stale]
+        print(f"{stage}: {len(tasks)} tickers to refresh, {len(pending) - len(tasks)} already fresh.")
+
+        def done(ticker, result, error):
+            self.state.mark(stage, ticker, error)
+            self._checkpoint()
+
+        if stage == 'features':
+            # CPU bound, run in this thread
+            for ticker in tasks:
+                error = None
+                try:
+                    if not self.daily_loader.store.exists(ticker):
+                        # Prices failed, features would fetch them outside the budget
+                        raise ValueError(f"No stored prices for {ticker}")
+                    self.feature_engineering.refresh_commen_features(ticker)
+                except Exception as e:
+                    error = e
+                    print(f"Failed to refresh_commen_features for {ticker}: {e}")
+                done(ticker, None, error)
+            return
+
+        if stage == 'prices':
+            loader, method, kwargs = self.daily_loader, 'refresh_daily_stock_data', {}
+        elif stage == 'earnings':
+            loader, method = self.fundamental_loader, 'load_company_earnings'
+            kwargs = {'time_period': self.time_period, 'update': True}
+        else:
+            loader, method = self.fundamental_loader, 'init_financial_reports'
+            kwargs = {'time_period': self.time_period, 'report_type': stage}
+        bulk_loader = BulkLoader(loader, max_workers=self.max_workers)
+        bulk_loader.load_many(tasks, method, callback=done, **kwargs)
@@ -0,0 +1,266 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from data_extraction.env import getenv
+from data_extraction.frame_cache import file_version
+
+
+def _normalize(windows, method, eps=1e-8):
+    """
+    Normalize a batch of (samples, lookback, features) windows, each on its own statistics.
+    """
+    if method is None:
+        return windows
+    if method == 'zscore':
+        mean = windows.mean(axis=1, keepdims=True)
+        std = windows.std(axis=1, keepdims=True)
+        return (windows - mean) / (std + eps)
+    if method == 'minmax':
+        low = windows.min(axis=1, keepdims=True)
+        high = windows.max(axis=1, keepdims=True)
+        return (windows - low) / (high - low + eps)
+    if method == 'last':
+        # Relative to the last bar, e.g. prices as multiples of the current price
+        last = windows[:, -1:, :]
+        return windows / np.where(np.abs(last) < eps, eps, last) - 1
+    raise ValueError(f"Invalid normalization '{method}', expected 'zscore', 'minmax' or 'last'")
+
+
+def _read_text(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+class WindowedDataset:
+    """
+    Sliding lookback windows over many tickers, for model training.
+
+    Every ticker is one (dates, features) array, possibly a memory-mapped
+    file. Windows are strided views of these arrays, so the dataset holds
+    O(data) memory however long the lookback; a window is only copied when
+    it is put in a batch, and batches are normalized as they are built.
+
+    Sample `i` is the window of `lookback` rows ending on row `end`, and its
+    target is the `target` column `horizon` rows after `end`. Windows
+    containing NaN (e.g. indicator warm-up rows) or with a NaN target are
+    left out.
+
+    Args:
+        arrays (dict): Ticker to (dates, features) array, oldest row first.
+        columns (list): Feature names of the array columns.
+        lookback (int): Rows per window.
+        horizon (int): Rows between the window end and its target.
+        target (str): Column giving the targets, None for windows only.
+        features (list): Columns fed to the model, all of them if None.
+        normalize (str): Per-window normalization applied to batches,
+            'zscore', 'minmax', 'last' or None.
+        stride (int): Rows between consecutive window ends.
+        dtype: Dtype of the batches.
+    """
+
+    def __init__(self, arrays, columns, lookback, horizon=1, target=None, features=None,
+                 normalize='zscore', stride=1, dtype=np.float32):
+        self.tickers = list(arrays)
+        self.columns = list(columns)
+        self.lookback = lookback
+        self.horizon = horizon if target is not None else 0
+        self.normalize = normalize
+        self.dtype = dtype
+        self.arrays = [arrays[ticker] for ticker in self.tickers]
+
+        features = features or [col for col in self.columns if col != target]
+        self.features = list(features)
+        self._feature_positions = np.array([self.columns.index(col) for col in self.features])
+        self._target_position = self.columns.index(target) if target is not None else None
+
+        # Strided (windows, lookback, columns) views, nothing is copied
+        self._windows = [sliding_window_view(values, lookback, axis=0).transpose(0, 2, 1)
+                         if len(values) >= lookback else None for values in self.arrays]
+
+        tickers, ends = [], []
+        for number, values in enumerate(self.arrays):
+            valid_ends = self._valid_ends(values, stride)
+            tickers.append(np.full(len(valid_ends), number, dtype=np.int32))
+            ends.append(valid_ends)
+        self._sample_tickers = np.concatenate(tickers) if tickers else np.array([], dtype=np.int32)
+        self._sample_ends = np.concatenate(ends) if ends else np.array([], dtype=np.int64)
+
+    def _valid_ends(self, values, stride):
+        n_rows = len(values)
+        last_end = n_rows - 1 - self.horizon
+        if last_end < self.lookback - 1:
+            return np.array([], dtype=np.int64)
+        ends = np.arange(self.lookback - 1, last_end + 1, stride)
+
+        # Windows without NaN, from a running count of rows containing NaN
+        used = np.union1d(self._feature_positions, [] if self._target_position is None
+                          else [self._target_position]).astype(np.int64)
+        has_nan = np.zeros(n_rows, dtype=np.int64)
+        for start in range(0, n_rows, 65536):
+            block = np.asarray(values[start:start + 65536][:, used])
+            has_nan[start:start + len(block)] = np.isnan(block).any(axis=1)
+        nan_count = np.concatenate([[0], np.cumsum(has_nan)])
+        clean = nan_count[ends + 1] - nan_count[ends + 1 - self.lookback] == 0
+        if self._target_position is not None:
+            targets = np.asarray(values[ends + self.horizon, self._target_position])
+            clean &= ~np.isnan(targets)
+        return ends[clean]
+
+    def __len__(self):
+        return len(self._sample_ends)
+
+    def sample(self, i):
+        """
+        Ticker and end date row of sample `i`.
+        """
+        return self.tickers[self._sample_tickers[i]], int(self._sample_ends[i])
+
+    def window(self, i):
+        """
+        Raw window of sample `i`, a read-only (lookback, features) view.
+        """
+        number, end = self._sample_tickers[i], self._sample_ends[i]
+        return self._windows[number][end - self.lookback + 1][:, self._feature_positions]
+
+    def __getitem__(self, i):
+        x, y = self.batch(np.array([i]))
+        return (x[0], y[0]) if y is not None else x[0]
+
+    def batch(self, indices):
+        """
+        Build the batch of the given samples, normalized.
+
+        Args:
+            indices (ndarray): Sample numbers.
+
+        Returns:
+            tuple: (x, y) with x of shape (len(indices), lookback, features)
+            and y of shape (len(indices),), y is None without a target.
+        """
+        indices = np.asarray(indices)
+        x = np.empty((len(indices), self.lookback, len(self.features)), dtype=self.dtype)
+        y = np.empty(len(indices), dtype=self.dtype) if self._target_position is not None else None
+
+        sample_tickers = self._sample_tickers[indices]
+        # One gather per ticker, reading each ticker's rows in order
+        for number in np.unique(sample_tickers):
+            rows = np.flatnonzero(sample_tickers == number)
+            ends = self._sample_ends[indices[rows]]
+            order = np.argsort(ends, kind='stable')
+            rows, ends = rows[order], ends[order]
+            windows = self._windows[number][ends - self.lookback + 1]
+            x[rows] = windows[:, :, self._feature_positions]
+            if y is not None:
+                y[rows] = self.arrays[number][ends + self.horizon, self._target_position]
+
+        x = _normalize(x, self.normalize).astype(self.dtype, copy=False)
+        return x, y
+
+    def batches(self, batch_size=256, shuffle=True, seed=None, drop_last=False):
+        """
+        Iterate over the samples in batches, shuffled across tickers.
+
+        Only one batch is materialized at a time, the rest stays in the
+        (possibly memory-mapped) arrays.
+
+        Args:
+            batch_size (int): Samples per batch.
+            shuffle (bool): Shuffle the samples of every ticker together.
+            seed (int): Seed of the shuffle.
+            drop_last (bool): Skip the last, smaller batch.
+
+        Yields:
+            tuple: (x, y), see `batch`.
+        """
+        order = np.arange(len(self))
+        if shuffle:
+            np.random.default_rng(seed).shuffle(order)
+        stop = len(order) - len(order) % batch_size if drop_last else len(order)
+        for start in range(0, stop, batch_size):
+            yield self.batch(order[start:start + batch_size])
+
+    @classmethod
+    def from_frames(cls, frames, lookback, columns=None, **kwargs):
+        """
+        Dataset over per-ticker DataFrames, e.g. from FeatureEngineering.
+
+        Args:
+            frames (dict): Ticker to DataFrame indexed by date, in any order.
+            lookback (int): Rows per window.
+            columns (list): Columns to use, every numeric column if None.
+            **kwargs: See WindowedDataset.
+        """
+        arrays = {}
+        for ticker, frame in frames.items():
+            frame = frame.sort_index()
+            if columns is None:
+                columns = list(frame.select_dtypes('number').columns)
+            arrays[ticker] = np.ascontiguousarray(frame[columns].to_numpy(dtype=kwargs.get('dtype', np.float32)))
+        return cls(arrays, columns or [], lookback, **kwargs)
+
+    @classmethod
+    def from_panel(cls, panel, lookback, tickers=None, begin_date=None, end_date=None, **kwargs):
+        """
+        Dataset over a memory-mapped OHLCVPanel, read from disk as batches need it.
+
+        Args:
+            panel (OHLCVPanel): Panel from `OHLCVPanel.open`.
+            lookback (int): Rows per window.
+            tickers (list): Tickers to use, all of them if None.
+            **kwargs: See WindowedDataset, e.g. target='adjusted_close'.
+        """
+        tickers = tickers or list(panel.tickers)
+        dates = panel.date_slice(begin_date, end_date)
+        arrays = {ticker: panel.data[panel.ticker_position(ticker), dates] for ticker in tickers}
+        return cls(arrays, panel.fields, lookback, **kwargs)
+
+    @classmethod
+    def from_feature_files(cls, tickers, lookback, path=None, cache_path=None, **kwargs):
+        """
+        Dataset over the stored feature files, memory-mapped from disk.
+
+        Each `features_{ticker}.csv` is converted once to a float32 `.npy`
+        file of its numeric columns in `cache_path` (again when the CSV
+        changes), which the dataset maps instead of loading.
+
+        Args:
+            tickers (list): Tickers with a feature file.
+            lookback (int): Rows per window.
+            path (str): Feature directory, defaults to PROCESSED_DAILY_STOCK_PATH.
+            cache_path (str): Directory of the `.npy` files, defaults to `{path}/windows`.
+            **kwargs: See WindowedDataset, e.g. features=['RSI', 'MACD'].
+        """
+        path = path or getenv('PROCESSED_DAILY_STOCK_PATH')
+        cache_path = cache_path or os.path.join(path, 'windows')
+        os.makedirs(cache_path, exist_ok=True)
+
+        arrays = {}
+        columns = None
+        for ticker in tickers:
+            csv_path = os.path.join(path, f'features_{ticker}.csv')
+            npy_path = os.path.join(cache_path, f'{ticker}.npy')
+            header = pd.read_csv(csv_path, index_col='date', nrows=0).columns
+            if columns is not None and list(header) != columns:
+                raise ValueError(f'The feature columns of {ticker} differ from those of {tickers[0]}')
+            columns = list(header)
+            # Version of the CSV the array was built from, mtimes alone miss
+            # an append within the same tick
+            version = json.dumps(file_version(csv_path))
+            version_path = npy_path + '.version'
+            if not os.path.exists(npy_path) or _read_text(version_path) != version:
+                frame = pd.read_csv(csv_path, index_col='date', parse_dates=True)
+                frame = frame[~frame.index.duplicated(keep='last')].sort_index()
+                tmp_path = npy_path + '.tmp.npy'
+                np.save(tmp_path, frame.to_numpy(dtype=np.float32))
+                os.replace(tmp_path, npy_path)
+                with open(version_path, 'w') as f:
+                    f.write(version)
+            arrays[ticker] = np.load(npy_path, mmap_mode='r')
+        return cls(arrays, columns or [], lookback, **kwargs)
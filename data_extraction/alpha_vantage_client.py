@@ -0,0 +1,260 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from data_extraction.bulk_loader import TokenBucket, call_with_retry
+from data_extraction.env import getenv
+from data_extraction.metrics import metrics
+
+
+# Seconds a cached response stays valid, per Alpha Vantage function
+DEFAULT_TTLS = {
+    'TIME_SERIES_DAILY_ADJUSTED': 15 * 60,
+    'TIME_SERIES_INTRADAY': 15 * 60,
+    'EARNINGS': 24 * 3600,
+    'INCOME_STATEMENT': 24 * 3600,
+    'BALANCE_SHEET': 24 * 3600,
+    'CASH_FLOW': 24 * 3600,
+    'OVERVIEW': 24 * 3600,
+}
+
+_session = None
+_session_lock = threading.Lock()
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class OfflineError(RuntimeError):
+    """
+    Raised when data is missing locally and the loader may not call the API.
+    """
+
+
+def get_session(pool_size=32):
+    """
+    Process-wide pooled HTTP session, so connections are kept alive and reused.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            # Imported on first network use, it is slow to import
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def get_client(api_key, url, cache_path=None, calls_per_minute=None):
+    """
+    Return the shared client for an API key, endpoint and cache directory.
+
+    Sharing the client means every loader in the process uses the same
+    session, cache, in-flight table and rate limiter.
+
+    Args:
+        calls_per_minute (int): API budget of the key, defaults to the
+            FIN_DATA_CALLS_PER_MINUTE environment variable or 75. Only used
+            when the client is created.
+    """
+    key = (api_key, url, cache_path)
+    with _clients_lock:
+        if key not in _clients:
+            if calls_per_minute is None:
+                calls_per_minute = int(getenv('FIN_DATA_CALLS_PER_MINUTE', 75))
+            _clients[key] = AlphaVantageClient(
+                api_key, url, cache_path=cache_path, calls_per_minute=calls_per_minute)
+        return _clients[key]
+
+
+class AlphaVantageClient:
+    """
+    Alpha Vantage query client with connection pooling and response caching.
+
+    Responses are cached under a key derived from the request parameters
+    (without the API key): in memory for the last `memory_entries` requests
+    and, when `cache_path` is set, on disk as `{function}/{sha256}.json.gz`.
+    Identical requests made while one is in flight wait for its response
+    instead of calling the API again.
+
+    Every call waits on the client's token bucket, so all the threads using
+    the client stay within the key's budget together. Calls are not retried
+    unless the calling thread sets retries with `call_options`.
+
+    Args:
+        api_key (str): Alpha Vantage API key.
+        url (str): Query endpoint.
+        cache_path (str): Directory for the on-disk cache, None to disable it.
+        ttls (dict): Cache lifetime in seconds per function, overriding DEFAULT_TTLS.
+            Functions without a TTL are not cached.
+        memory_entries (int): Number of raw responses kept in memory.
+        calls_per_minute (int): API budget of the key, None for no limit.
+    """
+
+    def __init__(self, api_key, url, cache_path=None, ttls=None, memory_entries=64, calls_per_minute=None):
+        self.api_key = api_key
+        self.url = url
+        self.cache_path = cache_path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.memory_entries = memory_entries
+        self.session = get_session()
+
+        self.rate_limiter = TokenBucket(calls_per_minute) if calls_per_minute else None
+
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._options = threading.local()
+
+    @contextmanager
+    def call_options(self, retries=0, backoff=1.0):
+        """
+        Retry settings of the API calls made by the current thread in the block.
+
+        Example:
+            with client.call_options(retries=3):
+                loader.load_company_earnings('IBM')
+
+        Args:
+            retries (int): Retries per API call on transient errors.
+            backoff (float): Base retry delay in seconds, see call_with_retry.
+        """
+        previous = getattr(self._options, 'retry', None)
+        self._options.retry = (retries, backoff)
+        try:
+            yield
+        finally:
+            self._options.retry = previous
+
+    @staticmethod
+    def cache_key(params):
+        payload = json.dumps(params, sort_keys=True).encode()
+        return hashlib.sha256(payload).hexdigest()
+
+    def _cache_file(self, function, key):
+        return os.path.join(self.cache_path, function, f'{key}.json.gz')
+
+    def _read_cache(self, function, key, ttl):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, body = entry
+                if time.time() - stored_at < ttl:
+                    self._memory.move_to_end(key)
+                    return body
+                del self._memory[key]
+
+        if self.cache_path is None:
+            return None
+        path = self._cache_file(function, key)
+        try:
+            if time.time() - os.path.getmtime(path) >= ttl:
+                return None
+            with gzip.open(path, 'rb') as f:
+                body = f.read()
+        except (FileNotFoundError, OSError, EOFError):
+            return None
+        self._remember(key, body)
+        return body
+
+    def _remember(self, key, body, stored_at=None):
+        with self._lock:
+            self._memory[key] = (stored_at or time.time(), body)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def clear_memory_cache(self):
+        """
+        Drop the responses held in memory, e.g. to time uncached calls.
+        """
+        with self._lock:
+            self._memory.clear()
+
+    def _write_cache(self, function, key, body):
+        self._remember(key, body)
+        if self.cache_path is None:
+            return
+        path = self._cache_file(function, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with gzip.open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    def _fetch(self, params):
+        function = params['function']
+        metrics.inc('api_calls_total', function=function)
+        with metrics.timer('api_fetch_seconds', function=function):
+            response = self.session.get(self.url, params=dict(params, apikey=self.api_key))
+        response.raise_for_status()
+        body = response.content
+        metrics.inc('api_bytes_received_total', len(body), function=function)
+        data = json.loads(body)
+        # Alpha Vantage reports errors and rate limits with HTTP 200
+        for key in ('Error Message', 'Note', 'Information'):
+            if key in data:
+                metrics.inc('api_errors_total', function=function, kind=key)
+                raise ValueError(data[key])
+        return body
+
+    def query(self, function, max_age=None, **params):
+        """
+        Call the query endpoint and return the decoded JSON payload.
+
+        Args:
+            function (str): Alpha Vantage function, e.g. 'EARNINGS'.
+            max_age (float): Age in seconds of the oldest cached response
+                accepted, None for the function's TTL. 0 always calls the
+                API, e.g. to refresh stored data; the response is still cached.
+            **params: Other query parameters, e.g. symbol='IBM'.
+
+        Returns:
+            dict: The decoded response.
+        """
+        params = dict(params, function=function)
+        key = self.cache_key(params)
+        ttl = self.ttls.get(function, 0)
+        read_ttl = ttl if max_age is None else min(ttl, max_age)
+
+        if read_ttl > 0:
+            body = self._read_cache(function, key, read_ttl)
+            if body is not None:
+                metrics.inc('api_cache_hits_total', function=function)
+                return json.loads(body)
+            metrics.inc('api_cache_misses_total', function=function)
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not owner:
+            metrics.inc('api_coalesced_total', function=function)
+            return json.loads(future.result())
+
+        retries, backoff = getattr(self._options, 'retry', None) or (0, 1.0)
+        try:
+            body = call_with_retry(self._fetch, params, retries=retries, backoff=backoff,
+                                   rate_limiter=self.rate_limiter)
+            if ttl > 0:
+                self._write_cache(function, key, body)
+            future.set_result(body)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return json.loads(body)
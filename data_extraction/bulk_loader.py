@@ -0,0 +1,153 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting API calls to a calls-per-minute budget.
+
+    Args:
+        calls_per_minute (int): Sustained number of calls allowed per minute.
+        burst (int): Maximum number of calls that can be made back to back.
+            Defaults to one second worth of calls (at least 1).
+    """
+
+    def __init__(self, calls_per_minute, burst=None):
+        if calls_per_minute <= 0:
+            raise ValueError('calls_per_minute must be positive')
+        self.rate = calls_per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1, int(self.rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """
+        Block until a token is available, then consume it.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_retryable(error):
+    """
+    Whether an API error is transient and worth retrying.
+
+    Network failures are retryable, and so are the rate-limit messages Alpha
+    Vantage returns in place of data (the `alpha_vantage` wrapper raises
+    them as ValueError).
+    """
+    import requests
+
+    if isinstance(error, (requests.RequestException, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, ValueError):
+        message = str(error).lower()
+        return 'call frequency' in message or 'rate limit' in message
+    return False
+
+
+def call_with_retry(func, *args, retries=3, backoff=1.0, rate_limiter=None, **kwargs):
+    """
+    Call an API function, waiting on the rate limiter and retrying transient errors.
+
+    Args:
+        func (callable): Function doing one API call.
+        retries (int): Number of retries after the first attempt.
+        backoff (float): Base delay in seconds, doubled after every failure
+            and jittered by up to 100%.
+        rate_limiter (TokenBucket): Limiter to acquire before every attempt.
+
+    Returns:
+        The return value of `func`.
+    """
+    attempt = 0
+    while True:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            time.sleep(backoff * 2 ** attempt * (1 + random.random()))
+            attempt += 1
+
+
+class BulkLoader:
+    """
+    Run a loader method for many tickers concurrently within an API budget.
+
+    All workers share the token bucket of the loader's API client, so the
+    total call rate stays under the key's budget (FIN_DATA_CALLS_PER_MINUTE)
+    however many threads or bulk loaders are running. A failure for one
+    ticker is recorded and does not stop the others.
+
+    Args:
+        loader (DataLoader): Loader whose method is called for every ticker.
+        max_workers (int): Number of worker threads.
+        retries (int): Retries per API call on transient errors.
+        backoff (float): Base retry delay in seconds.
+    """
+
+    def __init__(self, loader, max_workers=8, retries=3, backoff=1.0):
+        self.loader = loader
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        # Offline loaders only read stored data and have no client
+        self.client = None if getattr(loader, 'offline', False) else loader.client
+
+    def _call(self, func, ticker, kwargs):
+        if self.client is None:
+            return func(ticker, **kwargs)
+        # Set for this worker thread only, the shared client is left as is
+        with self.client.call_options(retries=self.retries, backoff=self.backoff):
+            return func(ticker, **kwargs)
+
+    def load_many(self, tickers, method, callback=None, **kwargs):
+        """
+        Call `loader.<method>(ticker, **kwargs)` for every ticker.
+
+        Tickers are submitted in the given order, so earlier ones are loaded first.
+
+        Args:
+            tickers (list): Stock ticker symbols.
+            method (str): Name of the loader method, e.g. 'load_daily_stock_data'.
+            callback (callable): Called as `callback(ticker, result, error)` in
+                the calling thread as soon as a ticker finishes, e.g. to
+                checkpoint progress.
+
+        Returns:
+            tuple: (results, errors) dictionaries keyed by ticker.
+        """
+        func = getattr(self.loader, method)
+        results = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._call, func, ticker, kwargs): ticker for ticker in tickers}
+            for future in as_completed(futures):
+                ticker = futures[future]
+                try:
+                    results[ticker] = future.result()
+                except Exception as e:
+                    errors[ticker] = e
+                    print(f"Failed to {method} for {ticker}: {e}")
+                if callback is not None:
+                    callback(ticker, results.get(ticker), errors.get(ticker))
+
+        print(f"{method}: {len(results)} succeeded, {len(errors)} failed.")
+        return results, errors
@@ -0,0 +1,37 @@
+import os
+import threading
+
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_env():
+    """
+    Load the `.env` file into the environment, once per process.
+
+    Variables already set in the environment are kept, as with `load_dotenv`.
+    """
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            _loaded = True
+
+
+def getenv(name, default=None):
+    """
+    `os.getenv` that also sees the variables set in the `.env` file.
+
+    The file is only read when the variable is not in the environment, so
+    processes configured through the environment never import dotenv.
+    """
+    value = os.getenv(name)
+    if value is None and not _loaded:
+        load_env()
+        value = os.getenv(name)
+    return default if value is None else value
@@ -1,32 +1,83 @@
-# TODO: Replace alpha_vantage with request url
-from alpha_vantage.timeseries import TimeSeries
-from alpha_vantage.fundamentaldata import FundamentalData
 import pandas as pd
 import os
-from dotenv import load_dotenv
-import pandas_market_calendars as mcal
-import requests
+
+from data_extraction.alpha_vantage_client import OfflineError, get_client
+from data_extraction.bulk_loader import BulkLoader
+from data_extraction.env import getenv, load_env
+from data_extraction.frame_cache import frame_cache
+from data_extraction.intraday import INTRADAY_COLUMNS, IntradayStore, month_range, resample_bars
+from data_extraction.metrics import metrics
+from data_extraction.overview_index import default_index_path, get_overview_index
+from data_extraction.point_in_time import merge_earnings, point_in_time_panel
+from data_extraction.schemas import EARNINGS_SCHEMA, REPORT_SCHEMAS, report_schema
+from data_extraction.storage import GzipCsvStore, get_daily_stock_store, start_env_compactor
+from data_extraction.trading_calendar import get_trading_calendar
+
+
+def is_offline():
+    """
+    Whether loaders default to offline mode, set with FIN_DATA_OFFLINE=1.
+    """
+    return getenv('FIN_DATA_OFFLINE', '').lower() in ('1', 'true', 'yes')
 
 
 class DataLoader:
-    def __init__(self):
-        load_dotenv()
+    """
+    Base of the loaders.
+
+    The API client is created on first network use, so loaders that only
+    read stored data never import the HTTP stack. In offline mode the
+    loaders only read stored data: updates are skipped and data missing
+    locally raises OfflineError instead of calling the API.
+
+    Args:
+        offline (bool): Never call the API, defaults to the FIN_DATA_OFFLINE
+            environment variable.
+    """
+
+    def __init__(self, offline=None):
+        load_env()
+        self.offline = is_offline() if offline is None else offline
         self.premium_api_key = os.getenv("ALPHA_VANTAGE_KEY")
         self.now = pd.Timestamp.now(tz='America/New_York')
-        self.av_url = 'https://www.alphavantage.co/query'
-        
-    def get_earnings(self, ticker):
-        url = (
-            f'{self.av_url}?function=EARNINGS&symbol={ticker}&apikey={self.premium_api_key}')
-        response = requests.get(url)
-        data = response.json()
-        return data
+        self.av_url = os.getenv(
+            "ALPHA_VANTAGE_URL", 'https://www.alphavantage.co/query')
+        self._client = None
+
+    @property
+    def client(self):
+        # Shared pooled, caching client for every Alpha Vantage endpoint
+        if self._client is None:
+            if self.offline:
+                raise OfflineError(
+                    f"{type(self).__name__} is offline and the data is not stored locally.")
+            self._client = get_client(
+                self.premium_api_key, self.av_url, cache_path=os.getenv("FIN_DATA_API_CACHE_PATH"))
+        return self._client
+
+    def load_many(self, tickers, method, max_workers=8, **kwargs):
+        """
+        Call a loader method for many tickers concurrently.
+
+        Args:
+            tickers (list): Stock ticker symbols.
+            method (str): Name of the loader method to call for every ticker.
+            max_workers (int): Number of worker threads, sharing the client's
+                API budget (FIN_DATA_CALLS_PER_MINUTE).
+
+        Returns:
+            tuple: (results, errors) dictionaries keyed by ticker.
+        """
+        bulk_loader = BulkLoader(self, max_workers=max_workers)
+        return bulk_loader.load_many(tickers, method, **kwargs)
+
+    def get_earnings(self, ticker, max_age=None):
+        return self.client.query('EARNINGS', symbol=ticker, max_age=max_age)
 
 
 class FundamentalDataLoader(DataLoader):
-    def __init__(self):
-        super().__init__()
-        self.fd = FundamentalData(self.premium_api_key)
+    def __init__(self, offline=None):
+        super().__init__(offline)
         
         self.compressed_financial_reports_path = os.getenv(
             "FIN_DATA_COMPRESSED_FINANCIAL_REPORTS_PATH")
@@ -38,23 +89,70 @@ class FundamentalDataLoader(DataLoader):
             "FIN_DATA_COMPRESSED_COMPANY_NEWS_PATH")
         
         self.compressed_report_file_path = None
+        # Report files are keyed by '{ticker}_{time_period}_{report_type}'
+        self.report_store = GzipCsvStore(
+            self.compressed_financial_reports_path, index_col='fiscalDateEnding')
+        start_env_compactor(self.report_store)
         
-        # Define a mapping of report types to their corresponding function calls
+        # Define a mapping of report types to their Alpha Vantage function and payload key
         self.report_function_mapping = {
             'income_statement': {
-                'annual': self.fd.get_income_statement_annual,
-                'quarterly': self.fd.get_income_statement_quarterly
+                'annual': ('INCOME_STATEMENT', 'annualReports'),
+                'quarterly': ('INCOME_STATEMENT', 'quarterlyReports')
             },
             'balance_sheet': {
-                'annual': self.fd.get_balance_sheet_annual,
-                'quarterly': self.fd.get_balance_sheet_quarterly
+                'annual': ('BALANCE_SHEET', 'annualReports'),
+                'quarterly': ('BALANCE_SHEET', 'quarterlyReports')
             },
             'cash_flow': {
-                'annual': self.fd.get_cash_flow_annual,
-                'quarterly': self.fd.get_cash_flow_quarterly
+                'annual': ('CASH_FLOW', 'annualReports'),
+                'quarterly': ('CASH_FLOW', 'quarterlyReports')
             }
         }
 
+    def get_financial_report(self, ticker, time_period, report_type, max_age=None):
+        """
+        Fetch one financial report from Alpha Vantage.
+
+        Args:
+            ticker (str): Stock ticker symbol.
+            time_period (str): 'annual' or 'quarterly'.
+            report_type (str): 'income_statement', 'balance_sheet' or 'cash_flow'.
+            max_age (float): Oldest cached response accepted in seconds, 0
+                to bypass the client's cache. See AlphaVantageClient.query.
+
+        Returns:
+            DataFrame: One row per fiscal period, newest first, typed with the
+            report type's schema.
+        """
+        mapping = self.report_function_mapping.get(
+            report_type, {}).get(time_period)
+
+        if mapping is None:
+            raise ValueError(
+                f"Invalid report type '{report_type}' or time period '{time_period}'")
+
+        function, key = mapping
+        data = self.client.query(function, symbol=ticker, max_age=max_age)
+        return REPORT_SCHEMAS[report_type].apply(pd.DataFrame(data[key]))
+
+    @property
+    def overview_index(self):
+        # Consolidated overview table, kept up to date by load_company_overview
+        return get_overview_index(default_index_path(self.compressed_company_overview_path))
+
+    def screen_companies(self, **conditions):
+        """
+        Tickers whose stored overview matches every condition.
+
+        Example:
+            loader.screen_companies(Sector='TECHNOLOGY', MarketCapitalization=(1e10, None))
+
+        See OverviewIndex.screen for the conditions.
+        """
+        return self.overview_index.screen(**conditions)
+
+    @metrics.ticker_timer('load_seconds', dataset='company_overview')
     def load_company_overview(self, ticker, update=False):
         """
         Get the company overview data for the given ticker.
@@ -71,43 +169,132 @@ class FundamentalDataLoader(DataLoader):
             data = pd.read_csv(compressed_company_overview_file_path, index_col=0)
             return data
         else:
-            data, meta_data = self.fd.get_company_overview(symbol=ticker)
+            # An explicit update must not be served a cached response
+            data = self.client.query('OVERVIEW', symbol=ticker, max_age=0 if update else None)
             data_df = pd.DataFrame.from_dict(data, orient='index')
             data_df.to_csv(compressed_company_overview_file_path, index=True, compression='gzip')
+            self.overview_index.update([data])
             return data_df
         
-    def load_company_earnings(self, ticker, time_period='quarterly', update=False):
+    @metrics.ticker_timer('load_seconds', dataset='company_earnings')
+    def load_company_earnings(self, ticker, time_period='quarterly', update=False, float32=False):
+        """
+        Get the earnings of the given ticker, typed with EARNINGS_SCHEMA.
+
+        Args:
+            ticker (str): Stock ticker symbol.
+            time_period (str): 'annual' or 'quarterly'.
+            update (bool): Fetch the earnings again even if they are stored,
+                bypassing the cached API responses.
+            float32 (bool): Read the numeric fields as float32.
+
+        Returns:
+            DataFrame: Earnings indexed by fiscalDateEnding.
+        """
         compressed_company_earnings_file_path = os.path.join(
             self.compressed_company_eaernings_path, f'{ticker}_{time_period}_earnings.gz')
         if not update and os.path.exists(compressed_company_earnings_file_path):
-            data = pd.read_csv(
-                compressed_company_earnings_file_path, index_col='fiscalDateEnding', parse_dates=True)
+            data = EARNINGS_SCHEMA.read_csv(compressed_company_earnings_file_path, float32=float32)
             return data
         else:
-            data = self.get_earnings(ticker)
-            quart_df = pd.DataFrame(data['quarterlyEarnings'])
+            # An explicit update must not be served a cached response
+            data = self.get_earnings(ticker, max_age=0 if update else None)
+            # Numbers and dates are parsed once here, the files store typed
+            # values at full precision and float32 only applies to the result
+            quart_df = EARNINGS_SCHEMA.apply(pd.DataFrame(data['quarterlyEarnings']))
             quart_df.set_index('fiscalDateEnding', inplace=True)
-            quart_df.index = pd.to_datetime(quart_df.index)
             quart_path = os.path.join(
                 self.compressed_company_eaernings_path, f'{ticker}_quarterly_earnings.gz')
             quart_df.to_csv(quart_path, index=True, compression='gzip')
             
-            annual_df = pd.DataFrame(data['annualEarnings'])
+            annual_df = EARNINGS_SCHEMA.apply(pd.DataFrame(data['annualEarnings']))
             annual_df.set_index('fiscalDateEnding', inplace=True)
-            annual_df.index = pd.to_datetime(annual_df.index)
             annual_path = os.path.join(
                 self.compressed_company_eaernings_path, f'{ticker}_annual_earnings.gz')
             annual_df.to_csv(annual_path, index=True, compression='gzip')
             
-            if 'quarterly' in time_period:
-                return quart_df
-            elif 'annual' in time_period:
-                return annual_df
-        
+            data = quart_df if 'quarterly' in time_period else annual_df
+            return EARNINGS_SCHEMA.to_float32(data) if float32 else data
+
+    def _checked_recently(self, path, max_age):
+        # Files written within max_age are not fetched again, even if still behind
+        return self.now.timestamp() - os.path.getmtime(path) < pd.Timedelta(max_age).total_seconds()
+
+    def _last_earnings_date(self, ticker, time_period):
+        path = os.path.join(self.compressed_company_eaernings_path, f'{ticker}_{time_period}_earnings.gz')
+        dates = pd.read_csv(path, usecols=['fiscalDateEnding'], parse_dates=['fiscalDateEnding'])
+        return dates['fiscalDateEnding'].max()
+
+    def stale_earnings(self, tickers, time_period='quarterly', max_age='1D'):
+        """
+        Tickers whose stored earnings may be missing a published period.
+
+        Earnings are stale once the fiscal period after the last stored one
+        has ended. They are fetched at most once per `max_age` while the
+        company has not reported yet. Tickers without stored earnings are
+        included.
+
+        Args:
+            tickers (list): Stock ticker symbols.
+            time_period (str): 'annual' or 'quarterly'.
+            max_age (str): Minimum time between two fetches of a ticker.
+
+        Returns:
+            list: The tickers that need an update.
+        """
+        period_end = pd.offsets.MonthEnd(3 if time_period == 'quarterly' else 12)
+        now = self.now.tz_localize(None)
+        stale = []
+        for ticker in tickers:
+            path = os.path.join(self.compressed_company_eaernings_path, f'{ticker}_{time_period}_earnings.gz')
+            if not os.path.exists(path):
+                stale.append(ticker)
+            elif not self._checked_recently(path, max_age):
+                last_date = self._last_earnings_date(ticker, time_period)
+                if pd.isna(last_date) or now > last_date + period_end:
+                    stale.append(ticker)
+        return stale
+
+    def stale_reports(self, tickers, report_type, time_period='quarterly', max_age='1D'):
+        """
+        Tickers whose stored report is behind their stored earnings.
+
+        A report is stale when the earnings have a later fiscal period than
+        the last report row, so refresh the earnings first. Reports are
+        fetched at most once per `max_age` while Alpha Vantage has not
+        published the period yet. Tickers without a stored report are
+        included.
+
+        Args:
+            tickers (list): Stock ticker symbols.
+            report_type (str): 'income_statement', 'balance_sheet' or 'cash_flow'.
+            time_period (str): 'annual' or 'quarterly'.
+            max_age (str): Minimum time between two fetches of a report.
+
+        Returns:
+            list: The tickers that need an update.
+        """
+        stale = []
+        for ticker in tickers:
+            report_name = f'{ticker}_{time_period}_{report_type}'
+            earnings_path = os.path.join(
+                self.compressed_company_eaernings_path, f'{ticker}_{time_period}_earnings.gz')
+            if not self.report_store.exists(report_name):
+                stale.append(ticker)
+            elif os.path.exists(earnings_path) and not self._checked_recently(
+                    self.report_store.path(report_name), max_age):
+                # Report fiscal dates can be a few days off the earnings month ends
+                last_date = self.report_store.last_date(report_name) + pd.offsets.MonthEnd(0)
+                if self._last_earnings_date(ticker, time_period) > last_date:
+                    stale.append(ticker)
+        return stale
+
     def get_company_news(self, ticker, update=False):
         pass
 
-    def load_financial_reports(self, ticker, time_period, report_type, begin_date='2020-01-01', end_date='2021-01-01'):
+    @metrics.ticker_timer('load_seconds', dataset='financial_reports')
+    def load_financial_reports(self, ticker, time_period, report_type, begin_date='2020-01-01', end_date='2021-01-01',
+                               float32=False):
         """
         Load the financial reports for the given report type and time period.
 
@@ -116,22 +303,31 @@ class FundamentalDataLoader(DataLoader):
             time_period (str): Time period for the financial report.
             begin_date (str): Start date for the financial report data.
             end_date (str): End date for the financial report data.
+            float32 (bool): Read the numeric fields as float32 to halve memory.
 
         Returns:
-            DataFrame: Pandas DataFrame containing the financial report data.
+            DataFrame: The financial report data, typed with the report type's
+            schema and the earnings columns.
         """
+        schema = report_schema(report_type, with_earnings=True)
 
-        self.compressed_report_file_path = os.path.join(
-            self.compressed_financial_reports_path, f'{ticker}_{time_period}_{report_type}.gz')
+        report_name = f'{ticker}_{time_period}_{report_type}'
+        report_file_path = self.report_store.path(report_name)
+        self.compressed_report_file_path = report_file_path
 
-        if not os.path.exists(self.compressed_report_file_path):
+        if not os.path.exists(report_file_path):
             self.init_financial_reports(ticker, time_period, report_type)
 
-        fin_report = pd.read_csv(
-            self.compressed_report_file_path, index_col='fiscalDateEnding', parse_dates=True)
+        def read_report():
+            with metrics.timer('store_decode_seconds', store='financial_reports'):
+                return schema.read_csv(report_file_path, float32=float32).sort_index()
+
+        # Parsed once per file version and shared through the frame cache
+        fin_report = frame_cache.get_or_load(
+            ('financial_reports', report_file_path, float32), self.report_store.version(report_name),
+            read_report)
 
         if time_period == 'quarterly':
-            fin_report['reportedDate'] = pd.to_datetime(fin_report['reportedDate'])
             last_date = fin_report['reportedDate'].max()
         elif time_period == 'annual':
             last_date = fin_report.index.max()
@@ -142,79 +338,89 @@ class FundamentalDataLoader(DataLoader):
             if (time_period == 'annual' and date_diff > 365) or (time_period == 'quarterly' and date_diff > 94):
                 # self.update_financial_reports(ticker, time_period, report_type)
                 # print(f'Updated {ticker} {time_period} {report_type} data.')
-                fin_report = pd.read_csv(
-                    self.compressed_report_file_path, index_col='fiscalDateEnding', parse_dates=True)
+                fin_report = frame_cache.get_or_load(
+                    ('financial_reports', report_file_path, float32),
+                    self.report_store.version(report_name), read_report)
 
-        fin_report = fin_report.sort_index().loc[begin_date:end_date].sort_index(ascending=False)
-        
-        fin_report = fin_report[~fin_report.index.duplicated(keep='first')]
-        fin_report['reportedDate'] = pd.to_datetime(fin_report['reportedDate'])
+        with metrics.timer('sort_slice_seconds', dataset='financial_reports'):
+            fin_report = fin_report.loc[begin_date:end_date].iloc[::-1]
+
+        if fin_report.index.has_duplicates:
+            fin_report = fin_report[~fin_report.index.duplicated(keep='first')]
         return fin_report
 
-    def init_financial_reports(self, ticker, time_period, report_type):
+    @metrics.ticker_timer('init_seconds', dataset='financial_reports')
+    def init_financial_reports(self, ticker, time_period, report_type, tolerance=None):
         """
         Initialize the financial reports CSV file with historical data from Alpha Vantage.
 
         Args:
             ticker (str): Stock ticker symbol.
             report_type (str): Type of financial report to load.
+            tolerance (str): Nearest-date fallback for reports whose fiscal date
+                matches no earnings month end, e.g. '10D'. None to only match
+                month ends.
         """
-        # Fetch the data using the mapping
-        data_function = self.report_function_mapping.get(
-            report_type, {}).get(time_period)
-
-        if data_function:
-            report, _ = data_function(ticker)
-        else:
-            raise ValueError(
-                f"Invalid report type '{report_type}' or time period '{time_period}'")
+        # Always fetched, init also rewrites the reports of stale tickers
+        report = self.get_financial_report(ticker, time_period, report_type, max_age=0)
             
         earnings = self.load_company_earnings(ticker, time_period)
         
         report.set_index('fiscalDateEnding', inplace=True)
         report.index = pd.to_datetime(report.index)
         
-        for col in earnings.columns:
-            if col not in report.columns:
-                report[col] = None
-        
-        for index, row in report.iterrows():
-            rounded_index = index + pd.offsets.MonthEnd(0)
-            if rounded_index in earnings.index:
-                report.loc[index, earnings.columns] = earnings.loc[rounded_index].values
-            else:
-                rounded_index = index + pd.offsets.MonthEnd(-1)
-                if rounded_index in earnings.index:
-                    report.loc[index, earnings.columns] = earnings.loc[rounded_index].values
+        # Earnings of the report's month end, or else of the previous month end
+        report = merge_earnings(report, earnings, tolerance=tolerance)
+
+        report_name = f'{ticker}_{time_period}_{report_type}'
+        # Through the store, under the file's lock and dropping appended segments
+        self.report_store.write(report_name, report)
 
-        report.to_csv(self.compressed_report_file_path, index=True, compression='gzip')
+        print(f'Data saved to {self.report_store.path(report_name)}')
 
-        print(f'Data saved to {self.compressed_report_file_path}')
+    def load_point_in_time_panel(self, tickers, time_period='quarterly', report_types=None, tolerance=None):
+        """
+        Fetch reports and earnings for many tickers and merge them in one pass.
+
+        Args:
+            tickers (list): Stock ticker symbols.
+            time_period (str): 'annual' or 'quarterly'.
+            report_types (list): Report types, all of them if None.
+            tolerance (str): Nearest-date fallback, see init_financial_reports.
 
+        Returns:
+            DataFrame: Indexed by (ticker, report_type, fiscalDateEnding).
+        """
+        report_types = report_types or list(self.report_function_mapping)
+        reports = {}
+        earnings = {}
+        for ticker in tickers:
+            earnings[ticker] = self.load_company_earnings(ticker, time_period)
+            for report_type in report_types:
+                report = self.get_financial_report(ticker, time_period, report_type)
+                report.set_index('fiscalDateEnding', inplace=True)
+                report.index = pd.to_datetime(report.index)
+                reports[(ticker, report_type)] = report
+
+        return point_in_time_panel(reports, earnings, tolerance=tolerance)
+
+    @metrics.ticker_timer('update_seconds', dataset='financial_reports')
     def update_financial_reports(self, ticker, time_period, report_type):
         """
-        Update the financial reports CSV file with the latest data if it is outdated.
+        Append the latest reports to the financial reports file if it is outdated.
 
         Args:
             ticker (str): Stock ticker symbol.
             report_type (str): Type of financial report to load.
         """
         # TODO: Update the function with update of earnings
-        curr_fin_report_df = pd.read_csv(self.compressed_report_file_path,
-                                         index_col='fiscalDateEnding', parse_dates=True)
+        report_name = f'{ticker}_{time_period}_{report_type}'
+        self.compressed_report_file_path = self.report_store.path(report_name)
 
         # Get the latest date in the existing data
-        last_date = curr_fin_report_df.index.max()
+        last_date = self.report_store.last_date(report_name)
 
-        # Fetch the data using the mapping
-        data_function = self.report_function_mapping.get(
-            report_type, {}).get(time_period)
-
-        if data_function:
-            new_data, _ = data_function(ticker)
-        else:
-            raise ValueError(
-                f"Invalid report type '{report_type}' or time period '{time_period}'")
+        new_data = self.get_financial_report(ticker, time_period, report_type, max_age=0)
 
         new_data.set_index('fiscalDateEnding', inplace=True)
         new_data.index = pd.to_datetime(new_data.index)
@@ -225,13 +431,10 @@ class FundamentalDataLoader(DataLoader):
         # If the latest date in new data is more recent than the last date in the existing data, append the new data
         if new_date_last_date > last_date:
             # Filter new data to include only the rows that are more recent than the last date in the existing data
-            new_data_to_add = new_data.loc[last_date:]
-            # Concatenate the new data with the existing data
-            curr_fin_report_df = pd.concat(
-                [new_data_to_add, curr_fin_report_df])
-            # Save the updated dataframe back to the CSV file
-            curr_fin_report_df.to_csv(
-                self.compressed_report_file_path, index=False, compression='gzip')
+            new_data_to_add = new_data[new_data.index > last_date]
+            # Append only the new rows, the existing file is not re-encoded
+            self.report_store.append(report_name, new_data_to_add)
+            metrics.inc('rows_appended_total', len(new_data_to_add), dataset='financial_reports')
             print(f"Data for {ticker} has been updated.")
         else:
             print(
@@ -239,18 +442,71 @@ class FundamentalDataLoader(DataLoader):
 
 
 class StockDataLoader(DataLoader):
-    def __init__(self):
-        super().__init__()
-        self.ts = TimeSeries(key=self.premium_api_key, output_format='pandas')
+    def __init__(self, offline=None):
+        super().__init__(offline)
 
 
 class DailyStockDataLoader(StockDataLoader):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, store=None, offline=None):
+        super().__init__(offline)
         self.compressed_daily_stock_path = os.getenv(
             "FIN_DATA_COMPRESSED_DAILY_STOCK_PATH")
+        self.store = store or get_daily_stock_store()
         self.gz_file_path = None
 
+    @property
+    def calendar(self):
+        # Shared by every loader, the schedule is built once per process
+        return get_trading_calendar('NYSE')
+
+    def stale_tickers(self, tickers):
+        """
+        Tickers whose stored history is missing a published bar.
+
+        The calendar is queried once for the whole universe. Tickers without
+        stored data are included.
+
+        Args:
+            tickers (list): Stock ticker symbols.
+
+        Returns:
+            list: The tickers that need an update.
+        """
+        last_dates = [self.store.last_date(ticker) if self.store.exists(ticker) else pd.NaT
+                      for ticker in tickers]
+        stale = self.calendar.stale_mask(last_dates, self.now)
+        return [ticker for ticker, is_stale in zip(tickers, stale) if is_stale]
+
+    def update_many(self, tickers, max_workers=8):
+        """
+        Update every stale ticker of a universe concurrently.
+
+        Args:
+            tickers (list): Stock ticker symbols.
+            max_workers (int): Number of worker threads.
+
+        Returns:
+            tuple: (results, errors) dictionaries keyed by ticker.
+        """
+        stale = self.stale_tickers(tickers)
+        print(f"{len(stale)} of {len(tickers)} tickers need an update.")
+        return self.load_many(stale, 'refresh_daily_stock_data', max_workers=max_workers)
+
+    def refresh_daily_stock_data(self, ticker):
+        """
+        Fetch the full history of a new ticker, or the latest bars of a stored one.
+
+        Staleness is not checked, see stale_tickers.
+
+        Args:
+            ticker (str): Stock ticker symbol.
+        """
+        if self.store.exists(ticker):
+            self.update_daily_stock_data(ticker, check_stale=False)
+        else:
+            self.init_daily_stock_data(ticker)
+
+    @metrics.ticker_timer('load_seconds', dataset='daily_stock')
     def load_daily_stock_data(self, ticker, begin_date='2020-01-01', end_date='2021-01-01'):
         """
         Fetch historical stock data for the given ticker, limited to the last 'n' years.
@@ -264,28 +520,40 @@ class DailyStockDataLoader(StockDataLoader):
             DataFrame: Pandas DataFrame containing the historical stock data.
         """
         
-        self.gz_file_path = os.path.join(
-            self.compressed_daily_stock_path, f'{ticker}.gz')
+        self.gz_file_path = self.store.path(ticker)
 
-        if not os.path.exists(self.gz_file_path):
+        if not self.store.exists(ticker):
             self.init_daily_stock_data(ticker)
 
-        data = pd.read_csv(
-            self.gz_file_path, index_col='date', parse_dates=True)
-        
-        last_date = data.index.max()
-        if pd.Timestamp(end_date) > last_date:
+        if frame_cache.enabled:
+            last_date = self._cached_history(ticker).index.max()
+        else:
+            last_date = self.store.last_date(ticker)
+        if not self.offline and pd.Timestamp(end_date) > last_date:
             self.update_daily_stock_data(ticker)
-            data = pd.read_csv(
-                self.gz_file_path, index_col='date', parse_dates=True)
-            
-        data = data.sort_index().loc[begin_date:end_date].sort_index(
-            ascending=False)
+
+        if frame_cache.enabled:
+            # A read-only view of the cached history, reloaded if an update changed the files
+            history = self._cached_history(ticker)
+            with metrics.timer('sort_slice_seconds', dataset='daily_stock'):
+                return history.loc[begin_date:end_date].iloc[::-1]
+
+        # The store only reads the partitions covering the requested range
+        data = self.store.read(ticker, begin_date, end_date)
+        with metrics.timer('sort_slice_seconds', dataset='daily_stock'):
+            data = data.sort_index(ascending=False)
         return data
 
+    def _cached_history(self, ticker):
+        # Full ascending history, shared through the process-wide frame cache
+        return frame_cache.get_or_load(
+            ('daily_stock', self.store.path(ticker)), self.store.version(ticker),
+            lambda: self.store.read(ticker))
+
+    @metrics.ticker_timer('init_seconds', dataset='daily_stock')
     def init_daily_stock_data(self, ticker):
         """
-        Initialize the stock data CSV file with historical data from Alpha Vantage.
+        Initialize the stock data store with historical data from Alpha Vantage.
 
         Args:
             ticker (str): Stock ticker symbol.
@@ -293,65 +561,63 @@ class DailyStockDataLoader(StockDataLoader):
         daily_adjusted_data = self.get_daily_renamed_adjusted(
             ticker, outputsize='full')
 
-        daily_adjusted_data.to_csv(self.gz_file_path, index=True, compression='gzip')
+        self.store.write(ticker, daily_adjusted_data)
 
         print("Current time: ", self.now)
-        print(f"Data saved to {self.gz_file_path}")
+        print(f"Data saved to {self.store.path(ticker)}")
         print(
             f"Data Date Range: {daily_adjusted_data.index.min()} to {daily_adjusted_data.index.max()}")
 
-    def update_daily_stock_data(self, ticker):
+    @metrics.ticker_timer('update_seconds', dataset='daily_stock')
+    def update_daily_stock_data(self, ticker, check_stale=True):
         """
-        Update the stock data CSV file with the latest data if it is outdated.
+        Append the latest bars to the stock data store if it is outdated.
 
         Args:
             ticker (str): Stock ticker symbol.
+            check_stale (bool): Skip the update when no new bar is published.
+                False when the caller already checked, e.g. in update_many.
         """
-        df = pd.read_csv(self.gz_file_path,
-                         index_col='date', parse_dates=True)
-
         # Get the latest date in the existing data
-        current_last_date = df.index.max()
-
-        nyse = mcal.get_calendar('NYSE')
-        market_date_gap = nyse.schedule(
-            start_date=current_last_date, end_date=self.now)
+        current_last_date = self.store.last_date(ticker)
 
         print("Current time: ", self.now)
-        if market_date_gap.shape[0] < 2 or (market_date_gap.shape[0] == 2 and self.now.time() < pd.Timestamp('16:30').time()):
+        if check_stale and not self.calendar.is_stale(current_last_date, self.now):
             print(f"No new data available for {ticker}.")
+            metrics.inc('up_to_date_total', dataset='daily_stock')
         else:
             # Fetch new data from the API
-            new_data = self.get_daily_renamed_adjusted(ticker)
+            new_data = self.get_daily_renamed_adjusted(ticker, max_age=0)
             new_data.index = pd.to_datetime(new_data.index)
 
-            # Get the latest date in the new data
-            latest_new_date = new_data.index.max()
-
             # Filter new data to include only the rows that are more recent than the last date in the existing data
-            new_data_to_add = new_data.loc[:current_last_date +
-                                           pd.Timedelta(days=1)]
-            # Concatenate the new data with the existing data
-            df = pd.concat([new_data_to_add, df])
-            # Save the updated dataframe back to the CSV file
-            df.to_csv(self.gz_file_path, index=True, compression='gzip')
+            new_data_to_add = new_data[new_data.index > current_last_date]
+            # Append only the new rows, compaction merges them later
+            self.store.append(ticker, new_data_to_add)
+            metrics.inc('rows_appended_total', len(new_data_to_add), dataset='daily_stock')
 
             print(f"Data for {ticker} has been updated.")
             print(
                 f"Updated Data Date Range: {new_data_to_add.index.min()} to {new_data_to_add.index.max()}")
 
-    def get_daily_renamed_adjusted(self, ticker, outputsize='compact'):
+    def get_daily_renamed_adjusted(self, ticker, outputsize='compact', max_age=None):
         """
         Get the daily adjusted stock data for the given ticker.
 
         Args:
             ticker (str): Stock ticker symbol.
+            max_age (float): Oldest cached response accepted in seconds, 0
+                to bypass the client's cache.
 
         Returns:
             DataFrame: Pandas DataFrame containing the daily adjusted stock data.
         """
-        data, meta_data = self.ts.get_daily_adjusted(
-            symbol=ticker, outputsize=outputsize)
+        payload = self.client.query(
+            'TIME_SERIES_DAILY_ADJUSTED', symbol=ticker, outputsize=outputsize, max_age=max_age)
+        data = pd.DataFrame.from_dict(
+            payload['Time Series (Daily)'], orient='index', dtype='float64')
+        data.index = pd.to_datetime(data.index)
+        data.index.name = 'date'
         data = data.rename(columns={"1. open": "open",
                                     "2. high": "high",
                                     "3. low": "low",
@@ -364,6 +630,139 @@ class DailyStockDataLoader(StockDataLoader):
 
 
 class IntradayStockDataLoader(StockDataLoader):
-    def __init__(self):
-        super().__init__()
+    """
+    Intraday bars, fetched month by month into a month-partitioned store.
+
+    Args:
+        interval (str): Bar interval, '1min', '5min', '15min', '30min' or '60min'.
+        store (IntradayStore): Storage, defaults to RAW_INTRADAY_STOCK_PATH.
+        offline (bool): Never call the API, see DataLoader.
+    """
+
+    def __init__(self, interval='1min', store=None, offline=None):
+        super().__init__(offline)
         self.intraday_stock_path = os.getenv("RAW_INTRADAY_STOCK_PATH")
+        self.interval = interval
+        self.store = store or IntradayStore(self.intraday_stock_path)
+
+    def _current_month(self):
+        return str(pd.Period(self.now.tz_localize(None), 'M'))
+
+    def get_intraday_month(self, ticker, month, max_age=None):
+        """
+        Fetch one month of intraday bars from Alpha Vantage.
+
+        Args:
+            ticker (str): Stock ticker symbol.
+            month (str): 'YYYY-MM'.
+            max_age (float): Oldest cached response accepted in seconds, 0
+                to bypass the client's cache.
+
+        Returns:
+            DataFrame: Bars of the month, oldest first.
+        """
+        payload = self.client.query(
+            'TIME_SERIES_INTRADAY', symbol=ticker, interval=self.interval, month=month,
+            outputsize='full', max_age=max_age)
+        data = pd.DataFrame.from_dict(
+            payload[f'Time Series ({self.interval})'], orient='index', dtype='float64')
+        data = data.rename(columns={"1. open": "open",
+                                    "2. high": "high",
+                                    "3. low": "low",
+                                    "4. close": "close",
+                                    "5. volume": "volume"})
+        data.index = pd.to_datetime(data.index)
+        data.index.name = 'timestamp'
+        return data.sort_index()
+
+    def iter_intraday_months(self, ticker, months):
+        """
+        Fetch intraday bars one month at a time.
+
+        The current month is still growing, it always bypasses the
+        client's cache.
+
+        Args:
+            ticker (str): Stock ticker symbol.
+            months (list): 'YYYY-MM' months, e.g. from `month_range`.
+
+        Yields:
+            tuple: (month, DataFrame) as soon as each month is fetched.
+        """
+        current_month = self._current_month()
+        for month in months:
+            max_age = 0 if month >= current_month else None
+            yield month, self.get_intraday_month(ticker, month, max_age=max_age)
+
+    @metrics.ticker_timer('init_seconds', dataset='intraday_stock')
+    def ingest_intraday_data(self, ticker, begin_month, end_month=None):
+        """
+        Fetch and store intraday bars from begin_month to end_month.
+
+        Each month is written as soon as it arrives, so only one month is
+        held in memory. Months stored as complete are skipped, so an
+        interrupted ingestion resumes where it stopped, and the current
+        month is fetched again on every call.
+
+        Args:
+            ticker (str): Stock ticker symbol.
+            begin_month (str): First month, 'YYYY-MM'.
+            end_month (str): Last month, defaults to the current month.
+
+        Returns:
+            list: The months that were fetched.
+        """
+        current_month = self._current_month()
+        end_month = min(str(pd.Period(end_month or current_month, 'M')), current_month)
+        complete_months = self.store.complete_months(ticker, self.interval)
+        months = [month for month in month_range(begin_month, end_month)
+                  if month not in complete_months]
+        if self.offline:
+            print(f"Offline, {len(months)} months of {ticker} not fetched.")
+            return []
+
+        fetched = []
+        for month, data in self.iter_intraday_months(ticker, months):
+            self.store.write_month(ticker, self.interval, month, data,
+                                   complete=month < current_month)
+            metrics.inc('rows_appended_total', len(data), dataset='intraday_stock')
+            fetched.append(month)
+            print(f"Data for {ticker} {month} saved, {len(data)} bars.")
+        return fetched
+
+    @metrics.ticker_timer('load_seconds', dataset='intraday_stock')
+    def load_intraday_data(self, ticker, begin_date, end_date):
+        """
+        Read stored intraday bars into one DataFrame, oldest first.
+
+        Args:
+            ticker (str): Stock ticker symbol.
+            begin_date (str): First timestamp.
+            end_date (str): Last timestamp, a date covers the whole day.
+
+        Returns:
+            DataFrame: The bars in the range.
+        """
+        return self.store.read(ticker, self.interval, begin_date, end_date)
+
+    def iter_resampled(self, ticker, rule, begin_date=None, end_date=None):
+        """
+        Resample stored bars to '5m', '15m', '1h' or 'daily' bars, month by month.
+
+        Only one month of raw bars is read at a time.
+
+        Yields:
+            DataFrame: Resampled bars, oldest first.
+        """
+        chunks = self.store.iter_months(ticker, self.interval, begin_date, end_date)
+        return resample_bars(chunks, rule)
+
+    def load_resampled(self, ticker, rule, begin_date=None, end_date=None):
+        """
+        Resampled bars in one DataFrame, see `iter_resampled`.
+        """
+        frames = list(self.iter_resampled(ticker, rule, begin_date, end_date))
+        if not frames:
+            return pd.DataFrame(columns=INTRADAY_COLUMNS,
+                                index=pd.DatetimeIndex([], name='timestamp'))
+        return pd.concat(frames)
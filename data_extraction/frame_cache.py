@@ -0,0 +1,161 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from data_extraction.env import getenv
+from data_extraction.metrics import metrics
+
+
+def file_version(*paths):
+    """
+    Signature of files on disk, changing whenever one is written, appended or removed.
+
+    Returns:
+        tuple: (path, mtime_ns, size) per path, None for a missing file.
+    """
+    version = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            version.append((path, None))
+            continue
+        version.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(version)
+
+
+def _freeze(frame):
+    # Mark the frame's arrays read-only, writes through any view then raise
+    for block in frame._mgr.blocks:
+        values = getattr(block.values, '_ndarray', block.values)
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+    index = getattr(frame.index, '_data', None)
+    values = getattr(index, '_ndarray', index)
+    if isinstance(values, np.ndarray):
+        values.flags.writeable = False
+    return frame
+
+
+def view(frame):
+    """
+    New DataFrame object sharing the cached arrays.
+
+    Adding or replacing columns only changes the view, and writing values
+    raises because the arrays are read-only.
+    """
+    return frame.iloc[:]
+
+
+class FrameCache:
+    """
+    Process-wide LRU cache of parsed DataFrames.
+
+    Entries are keyed by dataset and file, and carry the version of the
+    files they were read from (see `file_version`). An entry is served only
+    while the version is unchanged, so rewritten or appended files are read
+    again. The least recently used entries are evicted once the cached
+    frames exceed `max_bytes`.
+
+    Cached frames are full histories with read-only arrays; callers slice
+    them and get views, so a sub-range is served without copying and cannot
+    corrupt the cache.
+
+    Args:
+        max_bytes (int): Memory budget, 0 disables the cache.
+    """
+
+    def __init__(self, max_bytes=256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version):
+        """
+        The cached frame for `key` if it was read at `version`, else None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                metrics.inc('frame_cache_hits_total', dataset=key[0])
+                return entry[1]
+            if entry is not None:
+                # The files changed since the frame was read
+                self._drop(key)
+        metrics.inc('frame_cache_misses_total', dataset=key[0])
+        return None
+
+    def put(self, key, version, frame):
+        """
+        Cache a frame, evicting least recently used ones beyond the budget.
+
+        Returns:
+            DataFrame: The frame, with its arrays now read-only.
+        """
+        frame = _freeze(frame)
+        nbytes = int(frame.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return frame
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (version, frame, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                evicted = next(iter(self._entries))
+                self._drop(evicted)
+                metrics.inc('frame_cache_evictions_total', dataset=evicted[0])
+        return frame
+
+    def get_or_load(self, key, version, load):
+        """
+        The cached frame for `key`, or `load()` cached at `version`.
+
+        Args:
+            key (tuple): (dataset, ...) identifying the frame.
+            version: Version of the source files, e.g. from `file_version`.
+            load (callable): Reads the full frame from disk.
+
+        Returns:
+            DataFrame: The full frame with read-only arrays. Slice it or
+            take a `view` before handing it out.
+        """
+        if not self.enabled:
+            return load()
+        frame = self.get(key, version)
+        if frame is None:
+            frame = self.put(key, version, load())
+        return frame
+
+    def _drop(self, key):
+        _, _, nbytes = self._entries.pop(key)
+        self.nbytes -= nbytes
+
+    def invalidate(self, dataset=None):
+        """
+        Drop every entry, or those of one dataset.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if dataset is None or key[0] == dataset]:
+                self._drop(key)
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self._entries and self.nbytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+
+# Shared by every loader, sized with FIN_DATA_CACHE_MB (0 disables it)
+frame_cache = FrameCache(max_bytes=int(float(getenv('FIN_DATA_CACHE_MB', '256')) * 2 ** 20))
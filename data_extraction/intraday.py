@@ -0,0 +1,231 @@
+import glob
+import json
+import os
+
+import pandas as pd
+
+from data_extraction.metrics import metrics
+
+
+INTRADAY_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# Bar sizes accepted by `resample_bars`, other pandas offsets work as well
+RESAMPLE_RULES = {
+    '5m': '5min',
+    '15m': '15min',
+    '1h': '60min',
+    'daily': '1D',
+}
+
+_AGGREGATIONS = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+
+
+def month_range(begin_month, end_month):
+    """
+    Months from begin_month to end_month, both included, as 'YYYY-MM' strings.
+    """
+    periods = pd.period_range(pd.Period(begin_month, 'M'), pd.Period(end_month, 'M'), freq='M')
+    return [str(period) for period in periods]
+
+
+def _to_bar_frame(data):
+    """
+    Normalize intraday bars to the typed layout used by the store.
+
+    Returns:
+        DataFrame: Ascending, de-duplicated bars with float64 prices and int64 volume.
+    """
+    data = data.copy()
+    data.index = pd.to_datetime(data.index)
+    data.index.name = 'timestamp'
+    data = data[~data.index.duplicated(keep='last')].sort_index()
+    data = data.reindex(columns=INTRADAY_COLUMNS)
+    for col in INTRADAY_COLUMNS[:-1]:
+        data[col] = pd.to_numeric(data[col], errors='coerce').astype('float64')
+    data['volume'] = pd.to_numeric(data['volume'], errors='coerce').fillna(0).astype('int64')
+    return data
+
+
+class IntradayStore:
+    """
+    Intraday bars partitioned by month.
+
+    Each ticker and interval gets a directory holding one
+    `{YYYY-MM}.parquet` file per month, so a month is written as soon as it
+    is fetched and reads only open the months they cover. A `manifest.json`
+    next to the partitions lists the months that were complete when
+    written; ingestion skips them when it resumes, and refetches the months
+    that were still in progress.
+
+    Args:
+        root (str): Storage directory.
+        compression (str): Parquet compression codec.
+    """
+
+    def __init__(self, root, compression='zstd'):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ImportError(
+                'IntradayStore requires pyarrow, install it with `pip install pyarrow`') from e
+        self.root = root
+        self.compression = compression
+
+    def path(self, ticker, interval):
+        return os.path.join(self.root, interval, ticker)
+
+    def partition_path(self, ticker, interval, month):
+        return os.path.join(self.path(ticker, interval), f'{month}.parquet')
+
+    def _manifest_path(self, ticker, interval):
+        return os.path.join(self.path(ticker, interval), 'manifest.json')
+
+    def months(self, ticker, interval):
+        """
+        List the stored months for a ticker, ascending.
+        """
+        files = glob.glob(os.path.join(self.path(ticker, interval), '*.parquet'))
+        return sorted(os.path.splitext(os.path.basename(file))[0] for file in files)
+
+    def complete_months(self, ticker, interval):
+        """
+        Stored months that were over when they were written.
+        """
+        try:
+            with open(self._manifest_path(ticker, interval)) as f:
+                return set(json.load(f)['complete'])
+        except FileNotFoundError:
+            return set()
+
+    def exists(self, ticker, interval):
+        return len(self.months(ticker, interval)) > 0
+
+    def write_month(self, ticker, interval, month, data, complete=True):
+        """
+        Write one month of bars, replacing the stored month if any.
+
+        Args:
+            ticker (str): Stock ticker symbol.
+            interval (str): Bar interval, e.g. '1min'.
+            month (str): 'YYYY-MM'.
+            data (DataFrame): Bars of the month indexed by timestamp.
+            complete (bool): Whether the month is over, so it is never refetched.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        data = _to_bar_frame(data)
+        path = self.partition_path(ticker, interval, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with metrics.timer('store_write_seconds', store='intraday'):
+            table = pa.Table.from_pandas(data.reset_index(), preserve_index=False)
+            tmp_path = path + '.tmp'
+            pq.write_table(table, tmp_path, compression=self.compression)
+            os.replace(tmp_path, path)
+
+            # The manifest is updated after the partition, an interrupted
+            # write leaves the month to be fetched again
+            complete_months = self.complete_months(ticker, interval)
+            if complete:
+                complete_months.add(month)
+            else:
+                complete_months.discard(month)
+            manifest_path = self._manifest_path(ticker, interval)
+            with open(manifest_path + '.tmp', 'w') as f:
+                json.dump({'complete': sorted(complete_months)}, f)
+            os.replace(manifest_path + '.tmp', manifest_path)
+        if metrics.enabled:
+            metrics.inc('store_bytes_written_total', os.path.getsize(path), store='intraday')
+
+    def iter_months(self, ticker, interval, begin=None, end=None, columns=None):
+        """
+        Read stored bars one month at a time.
+
+        Args:
+            ticker (str): Stock ticker symbol.
+            interval (str): Bar interval, e.g. '1min'.
+            begin (str): First timestamp, None for the first stored bar.
+            end (str): Last timestamp, None for the last stored bar. A date
+                without a time covers the whole day.
+            columns (list): Columns to read, all of them if None.
+
+        Yields:
+            DataFrame: The bars of one month, ascending.
+        """
+        import pyarrow.parquet as pq
+
+        begin = pd.Timestamp(begin) if begin is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        if end is not None and end == end.normalize():
+            end = end + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')
+
+        for month in self.months(ticker, interval):
+            period = pd.Period(month, 'M')
+            if (begin is not None and period.end_time < begin) or \
+                    (end is not None and period.start_time > end):
+                continue
+            filters = []
+            if begin is not None and begin > period.start_time:
+                filters.append(('timestamp', '>=', begin))
+            if end is not None and end < period.end_time:
+                filters.append(('timestamp', '<=', end))
+
+            path = self.partition_path(ticker, interval, month)
+            read_columns = None if columns is None else ['timestamp'] + list(columns)
+            with metrics.timer('store_decode_seconds', store='intraday'):
+                table = pq.read_table(path, columns=read_columns, filters=filters or None)
+            if metrics.enabled:
+                metrics.inc('store_bytes_read_total', os.path.getsize(path), store='intraday')
+            yield table.to_pandas().set_index('timestamp')
+
+    def read(self, ticker, interval, begin=None, end=None, columns=None):
+        """
+        Read stored bars into one DataFrame. Use `iter_months` for long ranges.
+        """
+        frames = list(self.iter_months(ticker, interval, begin, end, columns))
+        if not frames:
+            return pd.DataFrame(columns=columns or INTRADAY_COLUMNS,
+                                index=pd.DatetimeIndex([], name='timestamp'))
+        return pd.concat(frames)
+
+
+def _aggregate(bars, rule):
+    # Buckets are closed and labelled on the left for every rule
+    resampler = bars.resample(rule, closed='left', label='left')
+    aggregated = resampler.agg({col: _AGGREGATIONS[col] for col in bars.columns if col in _AGGREGATIONS})
+    return aggregated[resampler.size().values > 0]
+
+
+def resample_bars(chunks, rule):
+    """
+    Resample a stream of ascending bar chunks to larger bars.
+
+    The bars of the last, possibly unfinished, bucket of a chunk are held
+    back and merged with the next chunk, so buckets spanning two chunks are
+    aggregated once and only one chunk is in memory at a time.
+
+    Args:
+        chunks (iterable): DataFrames of OHLCV bars in ascending order,
+            e.g. from `IntradayStore.iter_months`.
+        rule (str): '5m', '15m', '1h', 'daily' or a pandas offset alias.
+
+    Yields:
+        DataFrame: Resampled bars, labelled by the start of their bucket.
+            Buckets without bars (nights, weekends) are left out.
+    """
+    rule = RESAMPLE_RULES.get(rule, rule)
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk])
+        if chunk.empty:
+            continue
+        bars = _aggregate(chunk, rule)
+        # The last bucket may continue in the next chunk
+        carry = chunk[chunk.index >= bars.index[-1]]
+        if len(bars) > 1:
+            yield bars.iloc[:-1]
+
+    if carry is not None and not carry.empty:
+        yield _aggregate(carry, rule)
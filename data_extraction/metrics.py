@@ -0,0 +1,229 @@
+import functools
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+from data_extraction.env import getenv
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NULL_TIMER = nullcontext()
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram, as exported to Prometheus.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'labels', 'start')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+
+class MetricsRegistry:
+    """
+    In-process counters and latency histograms for the loaders.
+
+    Disabled, every call returns right away (timers are a shared no-op
+    context manager), so the instrumentation can stay in the hot paths.
+    Enabled, values are kept per metric name and label set, can be read
+    with `snapshot`, exported as Prometheus text, and are also passed to
+    every registered hook, e.g. to forward them to statsd.
+
+    Args:
+        enabled (bool): Start recording immediately.
+        prefix (str): Prefix of the exported metric names.
+    """
+
+    def __init__(self, enabled=False, prefix='fin_data_'):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.hooks = []
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def add_hook(self, hook):
+        """
+        Register `hook(kind, name, value, labels)`, called for every recorded value.
+
+        `kind` is 'counter' or 'histogram'.
+        """
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def inc(self, name, value=1, **labels):
+        """
+        Add `value` to a counter.
+        """
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        for hook in self.hooks:
+            hook('counter', name, value, labels)
+
+    def observe(self, name, value, **labels):
+        """
+        Record a value, usually a duration in seconds, in a histogram.
+        """
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+        for hook in self.hooks:
+            hook('histogram', name, value, labels)
+
+    def timer(self, name, **labels):
+        """
+        Context manager recording the duration of its block in seconds.
+
+        Example:
+            with metrics.timer('api_fetch_seconds', function='EARNINGS'):
+                ...
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def ticker_timer(self, name, **labels):
+        """
+        Decorator timing a loader method, labelled with its ticker.
+
+        The first argument after `self` of the decorated method is used as
+        the `ticker` label, giving a latency histogram per ticker.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(loader, ticker, *args, **kwargs):
+                if not self.enabled:
+                    return func(loader, ticker, *args, **kwargs)
+                with _Timer(self, name, dict(labels, ticker=ticker)):
+                    return func(loader, ticker, *args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def snapshot(self):
+        """
+        Current values.
+
+        Returns:
+            dict: 'counters' maps (name, labels) to totals, 'histograms'
+            maps (name, labels) to a dict of count, sum and buckets.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: {'count': histogram.count, 'sum': histogram.sum,
+                                'buckets': dict(histogram.cumulative())}
+                          for key, histogram in self._histograms.items()}
+        return {'counters': counters, 'histograms': histograms}
+
+    def to_prometheus(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+
+            lines = []
+            typed = set()
+            for (name, key), value in counters:
+                metric = self.prefix + name
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} counter')
+                    typed.add(metric)
+                lines.append(f'{metric}{_format_labels(key)} {value}')
+
+            for (name, key), histogram in histograms:
+                metric = self.prefix + name
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} histogram')
+                    typed.add(metric)
+                for bound, total in histogram.cumulative():
+                    lines.append(f'{metric}_bucket{_format_labels(key, [("le", repr(bound))])} {total}')
+                lines.append(f'{metric}_bucket{_format_labels(key, [("le", "+Inf")])} {histogram.count}')
+                lines.append(f'{metric}_sum{_format_labels(key)} {histogram.sum}')
+                lines.append(f'{metric}_count{_format_labels(key)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """
+        Write the Prometheus text to a file, e.g. for node_exporter's textfile collector.
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+# Process-wide registry used by the loaders, enabled with FIN_DATA_METRICS=1
+metrics = MetricsRegistry(enabled=getenv('FIN_DATA_METRICS', '').lower() in ('1', 'true', 'yes'))
@@ -0,0 +1,185 @@
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from data_extraction.storage import PRICE_COLUMNS
+
+
+INDEX_FILE = 'panel.json'
+
+
+def _panel_path(path):
+    return path or os.getenv('FIN_DATA_OHLCV_PANEL_PATH')
+
+
+def build_ohlcv_panel(store, path=None, tickers=None, begin_date=None, end_date=None,
+                      fields=PRICE_COLUMNS, dtype=np.float64):
+    """
+    Consolidate a daily stock store into one memory-mapped array file.
+
+    The panel is a `.npy` array of shape (tickers, trading days, fields), so
+    each ticker's history is contiguous on disk. `panel.json` next to it
+    holds the ticker, date and field indexes and the name of the data file.
+    A rebuild writes a new data file and then swaps the index, so readers
+    holding the previous panel open are not disturbed.
+
+    Args:
+        store (DailyStockStore): Store to read the daily bars from.
+        path (str): Output directory. Defaults to FIN_DATA_OHLCV_PANEL_PATH.
+        tickers (list): Tickers to include. Defaults to every ticker in the store.
+        begin_date (str): First date to include.
+        end_date (str): Last date to include.
+        fields (list): Price columns to include.
+        dtype: np.float64, or np.float32 to halve the file size.
+
+    Returns:
+        OHLCVPanel: The new panel, opened read-only.
+    """
+    path = _panel_path(path)
+    os.makedirs(path, exist_ok=True)
+    tickers = sorted(store.tickers()) if tickers is None else list(tickers)
+    fields = list(fields)
+
+    # First pass: the trading days are the union of every ticker's dates
+    dates = set()
+    for ticker in tickers:
+        dates.update(store.read(ticker, begin_date, end_date).index)
+    dates = pd.DatetimeIndex(sorted(dates), name='date')
+
+    data_file = f'ohlcv-{uuid.uuid4().hex[:12]}.npy'
+    panel = np.lib.format.open_memmap(os.path.join(path, data_file), mode='w+', dtype=dtype,
+                                      shape=(len(tickers), len(dates), len(fields)))
+    panel[:] = np.nan
+
+    # Second pass: fill one ticker at a time, so memory stays at one history
+    for i, ticker in enumerate(tickers):
+        data = store.read(ticker, begin_date, end_date)
+        rows = dates.get_indexer(data.index)
+        panel[i, rows, :] = data.reindex(columns=fields).to_numpy(dtype=dtype)
+    panel.flush()
+    del panel
+
+    index = {
+        'data_file': data_file,
+        'tickers': tickers,
+        'dates': [date.strftime('%Y-%m-%d') for date in dates],
+        'fields': fields,
+        'dtype': np.dtype(dtype).name,
+    }
+    index_path = os.path.join(path, INDEX_FILE)
+    previous = None
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            previous = json.load(f)['data_file']
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+
+    if previous and previous != data_file:
+        # Processes that still map the old file keep their view until they close it
+        os.remove(os.path.join(path, previous))
+
+    print(f'OHLCV panel of {len(tickers)} tickers x {len(dates)} days saved to {path}')
+    return OHLCVPanel.open(path)
+
+
+class OHLCVPanel:
+    """
+    Read-only, zero-copy view of a panel written by `build_ohlcv_panel`.
+
+    Opening maps the file without reading it, so many processes can open the
+    same panel at almost no cost and share the OS page cache. Every accessor
+    returns NumPy views into the mapping rather than copies.
+
+    Args:
+        data (ndarray): Array of shape (tickers, dates, fields).
+        tickers (list): Ticker of every row.
+        dates (DatetimeIndex): Date of every column, ascending.
+        fields (list): Field of every entry of the last axis.
+    """
+
+    def __init__(self, data, tickers, dates, fields):
+        self.data = data
+        self.tickers = list(tickers)
+        self.dates = pd.DatetimeIndex(dates, name='date')
+        self.fields = list(fields)
+        self._ticker_positions = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self._field_positions = {field: i for i, field in enumerate(self.fields)}
+
+    @classmethod
+    def open(cls, path=None):
+        """
+        Map a panel directory.
+
+        Args:
+            path (str): Panel directory. Defaults to FIN_DATA_OHLCV_PANEL_PATH.
+
+        Returns:
+            OHLCVPanel: The panel.
+        """
+        path = _panel_path(path)
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            index = json.load(f)
+        data = np.load(os.path.join(path, index['data_file']), mmap_mode='r')
+        return cls(data, index['tickers'], pd.to_datetime(index['dates']), index['fields'])
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def ticker_position(self, ticker):
+        try:
+            return self._ticker_positions[ticker]
+        except KeyError:
+            raise KeyError(f"Ticker '{ticker}' is not in the panel") from None
+
+    def date_slice(self, begin_date=None, end_date=None):
+        """
+        Positions of the dates between begin_date and end_date, both included.
+        """
+        start = 0 if begin_date is None else self.dates.searchsorted(pd.Timestamp(begin_date), 'left')
+        stop = len(self.dates) if end_date is None else self.dates.searchsorted(pd.Timestamp(end_date), 'right')
+        return slice(start, stop)
+
+    def field(self, name, begin_date=None, end_date=None):
+        """
+        One field for every ticker.
+
+        Returns:
+            ndarray: View of shape (tickers, dates). Use `.T` for the dates x
+            tickers layout of `compute_panel_features`.
+        """
+        return self.data[:, self.date_slice(begin_date, end_date), self._field_positions[name]]
+
+    def ticker(self, ticker, begin_date=None, end_date=None):
+        """
+        Every field of one ticker.
+
+        Returns:
+            ndarray: View of shape (dates, fields).
+        """
+        return self.data[self.ticker_position(ticker), self.date_slice(begin_date, end_date)]
+
+    def frame(self, ticker, begin_date=None, end_date=None, dropna=True):
+        """
+        One ticker as a DataFrame, laid out like `DailyStockStore.read`.
+
+        Args:
+            ticker (str): Stock ticker symbol.
+            begin_date (str): Start date.
+            end_date (str): End date.
+            dropna (bool): Drop the days the ticker has no bar.
+
+        Returns:
+            DataFrame: Ascending daily bars.
+        """
+        window = self.date_slice(begin_date, end_date)
+        data = pd.DataFrame(self.ticker(ticker, begin_date, end_date),
+                            index=self.dates[window], columns=self.fields, copy=False)
+        if dropna:
+            data = data[~data.isna().all(axis=1)]
+        return data
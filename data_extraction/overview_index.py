@@ -0,0 +1,265 @@
+import glob
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from data_extraction.schemas import OVERVIEW_SCHEMA
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class OverviewIndex:
+    """
+    All company overviews in one typed table, with secondary indexes for screening.
+
+    The table has one row per ticker and is stored as a single Parquet file.
+    Categorical fields (Sector, Exchange, ...) are indexed by value and
+    numeric and date fields (MarketCapitalization, LatestQuarter, ...) by
+    sorted order, so a screen is a few dictionary lookups and binary
+    searches over the whole universe. Indexes are built on the first query
+    of a field and dropped when a row changes.
+
+    Updates are cheap: new overviews are appended to a delta file next to
+    the table and merged into it in one batch on the next query. The table
+    is rewritten, and the delta file dropped, by `save` or once the delta
+    holds `max_delta_rows` overviews.
+
+    Args:
+        path (str): Parquet file holding the table.
+        max_delta_rows (int): Overviews kept in the delta file before the
+            table is rewritten.
+    """
+
+    def __init__(self, path, max_delta_rows=1000):
+        self.path = path
+        self.delta_path = f'{path}.delta.jsonl'
+        self.max_delta_rows = max_delta_rows
+        self.table = None
+        self._pending = {}
+        self._delta_rows = 0
+        self._indexes = {}
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            self.table = pd.read_parquet(self.path)
+        else:
+            self.table = pd.DataFrame(index=pd.Index([], name='Symbol', dtype=object))
+        if os.path.exists(self.delta_path):
+            with open(self.delta_path) as f:
+                for line in f:
+                    overview = json.loads(line)
+                    self._pending[overview['Symbol']] = overview
+                    self._delta_rows += 1
+
+    def save(self):
+        """
+        Write the whole table, including the overviews of the delta file.
+        """
+        with self._lock:
+            self._merge()
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f'{self.path}.{threading.get_ident()}.tmp'
+            self.table.to_parquet(tmp_path)
+            os.replace(tmp_path, self.path)
+            if os.path.exists(self.delta_path):
+                os.remove(self.delta_path)
+            self._delta_rows = 0
+
+    def __len__(self):
+        with self._lock:
+            self._merge()
+            return len(self.table)
+
+    def tickers(self):
+        with self._lock:
+            self._merge()
+            return list(self.table.index)
+
+    @staticmethod
+    def _typed_rows(overviews):
+        # Overviews are field-to-value mappings, one row per ticker
+        rows = pd.DataFrame.from_records(overviews)
+        rows = OVERVIEW_SCHEMA.apply(rows)
+        return rows.set_index('Symbol')
+
+    def update(self, overviews, save=True):
+        """
+        Insert or replace the rows of the given overviews.
+
+        Overviews without a 'Symbol', e.g. the empty payload Alpha Vantage
+        returns for an unknown ticker, are skipped.
+
+        Args:
+            overviews (list): Overviews as dicts or Series of field to value,
+                each with a 'Symbol'.
+            save (bool): Record the overviews in the delta file, so they are
+                kept without rewriting the table.
+        """
+        overviews = [dict(overview) for overview in overviews]
+        overviews = [overview for overview in overviews if overview.get('Symbol')]
+        if not overviews:
+            return
+        with self._lock:
+            for overview in overviews:
+                self._pending[overview['Symbol']] = overview
+            self._indexes = {}
+            if not save:
+                return
+            if self._delta_rows + len(overviews) > self.max_delta_rows:
+                self.save()
+                return
+            os.makedirs(os.path.dirname(self.delta_path) or '.', exist_ok=True)
+            with open(self.delta_path, 'a') as f:
+                for overview in overviews:
+                    f.write(json.dumps(overview, default=str) + '\n')
+            self._delta_rows += len(overviews)
+
+    def _merge(self):
+        # Pending overviews go into the table in one concat and sort
+        if not self._pending:
+            return
+        rows = self._typed_rows(list(self._pending.values()))
+        self._pending = {}
+        table = self.table[~self.table.index.isin(rows.index)]
+        table = pd.concat([table, rows]) if len(table) else rows
+        # Categories are merged so the columns stay categorical after concat
+        for col in OVERVIEW_SCHEMA.categories:
+            if col in table.columns:
+                table[col] = table[col].astype('category')
+        self.table = table.sort_index()
+        self._indexes = {}
+
+    def remove(self, tickers, save=True):
+        with self._lock:
+            self._merge()
+            self.table = self.table.drop(index=tickers, errors='ignore')
+            self._indexes = {}
+            if save:
+                self.save()
+
+    def _index(self, field):
+        # Value to row positions for labels, sort order for numbers and dates
+        index = self._indexes.get(field)
+        if index is None:
+            column = self.table[field]
+            if pd.api.types.is_datetime64_any_dtype(column):
+                values = column.to_numpy(dtype='datetime64[ns]')
+                order = np.argsort(values, kind='stable')
+                valid = order[~np.isnat(values[order])]
+                index = (values[valid], valid)
+            elif pd.api.types.is_numeric_dtype(column):
+                values = column.to_numpy(dtype=np.float64)
+                order = np.argsort(values, kind='stable')
+                valid = order[~np.isnan(values[order])]
+                index = (values[valid], valid)
+            else:
+                index = pd.Series(np.arange(len(column))).groupby(column.to_numpy()).indices
+            self._indexes[field] = index
+        return index
+
+    def _positions(self, field, condition):
+        index = self._index(field)
+        if isinstance(index, dict):
+            values = condition if isinstance(condition, (list, tuple, set)) else [condition]
+            found = [index[value] for value in values if value in index]
+            return np.concatenate(found) if found else np.array([], dtype=np.int64)
+
+        low, high = condition
+        sorted_values, order = index
+        if sorted_values.dtype.kind == 'M':
+            # Dates take strings, datetimes or Timestamps as bounds
+            low = None if low is None else np.datetime64(pd.Timestamp(low), 'ns')
+            high = None if high is None else np.datetime64(pd.Timestamp(high), 'ns')
+        left = 0 if low is None else np.searchsorted(sorted_values, low, 'left')
+        right = len(sorted_values) if high is None else np.searchsorted(sorted_values, high, 'right')
+        return order[left:right]
+
+    def screen(self, **conditions):
+        """
+        Tickers matching every condition.
+
+        A categorical or text field takes a value or a list of values. A
+        numeric or date field takes a (low, high) range, both included, with
+        None for an open end. Date bounds may be strings or Timestamps.
+        Missing values never match a range.
+
+        Example:
+            index.screen(Sector='TECHNOLOGY', Exchange=['NYSE', 'NASDAQ'],
+                         MarketCapitalization=(1e10, None), PERatio=(None, 20))
+
+        Returns:
+            list: Matching tickers, sorted.
+        """
+        with self._lock:
+            self._merge()
+            mask = np.ones(len(self.table), dtype=bool)
+            for field, condition in conditions.items():
+                if field not in self.table.columns:
+                    raise KeyError(f"Unknown overview field '{field}'")
+                selected = np.zeros(len(self.table), dtype=bool)
+                selected[self._positions(field, condition)] = True
+                mask &= selected
+            return list(self.table.index[mask])
+
+    def frame(self, tickers=None, columns=None):
+        """
+        Rows of the table, e.g. for the tickers returned by `screen`.
+        """
+        with self._lock:
+            self._merge()
+            table = self.table if tickers is None else self.table.loc[list(tickers)]
+            return table if columns is None else table[columns]
+
+
+def read_overview_file(path):
+    """
+    Read a `{ticker}.gz` overview written by `load_company_overview` as a field-to-value Series.
+    """
+    return pd.read_csv(path, index_col=0, keep_default_na=False).iloc[:, 0]
+
+
+def build_overview_index(overview_path, path=None):
+    """
+    Build the overview index from every `{ticker}.gz` overview file.
+
+    Args:
+        overview_path (str): Directory of the per-ticker overview files.
+        path (str): Index file, defaults to `default_index_path(overview_path)`.
+
+    Returns:
+        OverviewIndex: The new index, saved.
+    """
+    index = OverviewIndex(path or default_index_path(overview_path))
+    files = sorted(glob.glob(os.path.join(overview_path, '*.gz')))
+    overviews = [read_overview_file(file) for file in files]
+    overviews = [overview for overview in overviews if 'Symbol' in overview.index]
+    index.update(overviews, save=False)
+    index.save()
+    print(f'Indexed {len(overviews)} company overviews from {overview_path}')
+    return index
+
+
+def get_overview_index(path):
+    """
+    Process-wide overview index for a file, so every loader updates the same table.
+    """
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = OverviewIndex(path)
+        return _indexes[path]
+
+
+def default_index_path(overview_path):
+    """
+    Index file used by the loaders, FIN_DATA_COMPANY_OVERVIEW_INDEX_PATH or
+    `overview_index.parquet` next to the overview files.
+    """
+    return os.getenv('FIN_DATA_COMPANY_OVERVIEW_INDEX_PATH') or \
+        os.path.join(overview_path, 'overview_index.parquet')
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+
+
+def match_earnings(dates, earnings_dates, by=None, earnings_by=None, tolerance=None):
+    """
+    Match report dates to earnings fiscal dates.
+
+    A report matches the earnings row on its month end (MonthEnd(0)), or
+    else on the previous month end (MonthEnd(-1)). With a tolerance, rows
+    still unmatched take the nearest earnings date within that distance.
+
+    Args:
+        dates (DatetimeIndex): Report fiscal dates.
+        earnings_dates (DatetimeIndex): Earnings fiscal dates, unique per key.
+        by (array): Optional key per report date, e.g. the ticker.
+        earnings_by (array): Key per earnings date, required with `by`.
+        tolerance (str or Timedelta): Maximum distance of the nearest-date fallback.
+
+    Returns:
+        ndarray: Position in `earnings_dates` for every report date, -1 if unmatched.
+    """
+    dates = pd.DatetimeIndex(dates)
+    earnings_dates = pd.DatetimeIndex(earnings_dates)
+    if by is not None:
+        by = np.asarray(by, dtype=object)
+        earnings_index = pd.MultiIndex.from_arrays([np.asarray(earnings_by, dtype=object), earnings_dates])
+    else:
+        earnings_index = earnings_dates
+
+    def lookup(rows, targets):
+        if by is None:
+            return earnings_index.get_indexer(targets)
+        return earnings_index.get_indexer(pd.MultiIndex.from_arrays([by[rows], targets]))
+
+    rows = np.arange(len(dates))
+    positions = lookup(rows, dates + pd.offsets.MonthEnd(0))
+
+    missing = np.flatnonzero(positions < 0)
+    if len(missing):
+        positions[missing] = lookup(missing, dates[missing] + pd.offsets.MonthEnd(-1))
+
+    missing = np.flatnonzero((positions < 0) & ~dates.isna())
+    if tolerance is not None and len(missing) and len(earnings_dates):
+        left = pd.DataFrame({'date': dates[missing], 'row': missing})
+        right = pd.DataFrame({'date': earnings_dates, 'position': np.arange(len(earnings_dates))})
+        keys = None
+        if by is not None:
+            left['key'] = by[missing]
+            right['key'] = earnings_index.get_level_values(0)
+            keys = 'key'
+        right = right[~right['date'].isna()]
+        merged = pd.merge_asof(left.sort_values('date'), right.sort_values('date'), on='date', by=keys,
+                               direction='nearest', tolerance=pd.Timedelta(tolerance))
+        found = merged['position'].notna()
+        positions[merged.loc[found, 'row'].to_numpy()] = merged.loc[found, 'position'].to_numpy(dtype=np.int64)
+
+    return positions
+
+
+def _attach(report, earnings, positions):
+    report = report.copy()
+    matched = positions >= 0
+    take = np.where(matched, positions, 0)
+    for col in earnings.columns:
+        # Taken with the earnings dtype, unmatched rows become NaN or NaT
+        values = earnings[col].iloc[take].set_axis(report.index).where(matched)
+        if col in report.columns:
+            # Existing values are only overwritten where a match was found
+            report[col] = values.where(matched, report[col])
+        else:
+            report[col] = values
+    return report
+
+
+def merge_earnings(report, earnings, tolerance=None):
+    """
+    Attach the matching earnings row to every row of a financial report.
+
+    Args:
+        report (DataFrame): Report indexed by fiscalDateEnding.
+        earnings (DataFrame): Earnings indexed by fiscalDateEnding.
+        tolerance (str or Timedelta): Nearest-date fallback for reports
+            matching no month end, None for month-end matches only.
+
+    Returns:
+        DataFrame: The report with the earnings columns added, missing where
+        no earnings matched.
+    """
+    earnings = earnings[~earnings.index.duplicated(keep='first')]
+    if earnings.empty:
+        report = report.copy()
+        for col in earnings.columns:
+            if col not in report.columns:
+                report[col] = pd.Series(index=report.index, dtype=earnings[col].dtype)
+        return report
+
+    positions = match_earnings(report.index, earnings.index, tolerance=tolerance)
+    return _attach(report, earnings, positions)
+
+
+def point_in_time_panel(reports, earnings, tolerance=None):
+    """
+    Build one point-in-time fundamentals table for many tickers and report types.
+
+    All reports are matched against all earnings in a single vectorized
+    pass, with the same rules as `merge_earnings`.
+
+    Args:
+        reports (dict): (ticker, report_type) to report indexed by fiscalDateEnding.
+        earnings (dict): Ticker to earnings indexed by fiscalDateEnding.
+        tolerance (str or Timedelta): Nearest-date fallback, see `match_earnings`.
+
+    Returns:
+        DataFrame: Indexed by (ticker, report_type, fiscalDateEnding), with
+        the union of the report columns followed by the earnings columns.
+    """
+    if not reports:
+        return pd.DataFrame()
+
+    report_panel = pd.concat(reports, names=['ticker', 'report_type', 'fiscalDateEnding'])
+    report_tickers = report_panel.index.get_level_values('ticker')
+    report_dates = pd.DatetimeIndex(report_panel.index.get_level_values('fiscalDateEnding'))
+
+    earnings = {ticker: data[~data.index.duplicated(keep='first')]
+                for ticker, data in earnings.items() if not data.empty}
+    if not earnings:
+        return report_panel.sort_index()
+
+    earnings_panel = pd.concat(earnings, names=['ticker', 'fiscalDateEnding'])
+    positions = match_earnings(report_dates, earnings_panel.index.get_level_values('fiscalDateEnding'),
+                               by=report_tickers, earnings_by=earnings_panel.index.get_level_values('ticker'),
+                               tolerance=tolerance)
+    return _attach(report_panel, earnings_panel, positions).sort_index()
@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+
+
+# Placeholders Alpha Vantage sends for missing values
+NA_VALUES = ['None', '-', '']
+
+DATE_COLUMNS = ['fiscalDateEnding', 'reportedDate']
+CATEGORY_COLUMNS = ['reportedCurrency', 'reportTime']
+
+
+class Schema:
+    """
+    Column types of an Alpha Vantage report.
+
+    Dates are parsed to datetime64, low-cardinality labels become
+    categoricals and the listed numeric fields become floats with NaN for
+    the 'None' placeholders. Free text stays as strings. Columns the schema
+    does not list are parsed as numbers when every value is numeric, and as
+    categoricals otherwise.
+
+    Args:
+        numbers (list): Numeric fields, in Alpha Vantage's order.
+        dates (list): Date fields.
+        categories (list): Categorical fields.
+        texts (list): Free text fields.
+    """
+
+    def __init__(self, numbers, dates=DATE_COLUMNS, categories=CATEGORY_COLUMNS, texts=()):
+        self.numbers = list(numbers)
+        self.dates = list(dates)
+        self.categories = list(categories)
+        self.texts = list(texts)
+
+    def __add__(self, other):
+        # Columns of both schemas, e.g. a report merged with its earnings
+        def union(left, right):
+            return left + [col for col in right if col not in left]
+
+        return Schema(union(self.numbers, other.numbers), union(self.dates, other.dates),
+                      union(self.categories, other.categories), union(self.texts, other.texts))
+
+    def dtype(self, column, float32=False):
+        """
+        Storage dtype of a known column, None for columns the schema does not list.
+        """
+        if column in self.dates:
+            return 'datetime64[ns]'
+        if column in self.categories:
+            return 'category'
+        if column in self.texts:
+            return 'object'
+        if column in self.numbers:
+            return np.float32 if float32 else np.float64
+        return None
+
+    def apply(self, data, float32=False):
+        """
+        Parse a frame of raw payload strings into typed columns.
+
+        Args:
+            data (DataFrame): Report rows as sent by Alpha Vantage.
+            float32 (bool): Store the numeric fields as float32 to halve memory.
+
+        Returns:
+            DataFrame: The typed frame. A date index is parsed as well.
+        """
+        data = data.copy()
+        float_dtype = np.float32 if float32 else np.float64
+        for col in data.columns:
+            values = data[col].replace(NA_VALUES, np.nan) if data[col].dtype == object else data[col]
+            dtype = self.dtype(col, float32)
+            if dtype == 'datetime64[ns]':
+                data[col] = pd.to_datetime(values, errors='coerce')
+            elif dtype == 'category':
+                data[col] = values.astype('category')
+            elif dtype == 'object':
+                data[col] = values
+            elif dtype is not None:
+                data[col] = pd.to_numeric(values, errors='coerce').astype(float_dtype)
+            else:
+                numbers = pd.to_numeric(values, errors='coerce')
+                if numbers.notna().sum() == values.notna().sum():
+                    data[col] = numbers.astype(float_dtype)
+                else:
+                    data[col] = values.astype('category')
+        if data.index.name in self.dates:
+            data.index = pd.to_datetime(data.index)
+        return data
+
+    def to_float32(self, data):
+        """
+        Copy of a typed frame with its float columns as float32, e.g. after
+        writing it at full precision.
+        """
+        return data.astype({col: np.float32 for col in data.columns
+                            if pd.api.types.is_float_dtype(data[col])})
+
+    def read_csv(self, path, index_col='fiscalDateEnding', float32=False):
+        """
+        Read a report CSV straight into typed columns.
+
+        Files written before the schema existed, with 'None' placeholders,
+        are read the same way.
+
+        Args:
+            path (str): CSV path, compression is inferred from the extension.
+            index_col (str): Date column used as the index.
+            float32 (bool): Read the numeric fields as float32.
+
+        Returns:
+            DataFrame: The typed report.
+        """
+        header = pd.read_csv(path, nrows=0).columns
+        dates = [col for col in header if col in self.dates]
+        dtypes = {col: self.dtype(col, float32) for col in header
+                  if col not in self.dates and self.dtype(col, float32) is not None}
+        return pd.read_csv(path, index_col=index_col, parse_dates=dates, dtype=dtypes,
+                           na_values=NA_VALUES)
+
+
+INCOME_STATEMENT_SCHEMA = Schema([
+    'grossProfit', 'totalRevenue', 'costOfRevenue', 'costofGoodsAndServicesSold',
+    'operatingIncome', 'sellingGeneralAndAdministrative', 'researchAndDevelopment',
+    'operatingExpenses', 'investmentIncomeNet', 'netInterestIncome', 'interestIncome',
+    'interestExpense', 'nonInterestIncome', 'otherNonOperatingIncome', 'depreciation',
+    'depreciationAndAmortization', 'incomeBeforeTax', 'incomeTaxExpense',
+    'interestAndDebtExpense', 'netIncomeFromContinuingOperations',
+    'comprehensiveIncomeNetOfTax', 'ebit', 'ebitda', 'netIncome',
+])
+
+BALANCE_SHEET_SCHEMA = Schema([
+    'totalAssets', 'totalCurrentAssets', 'cashAndCashEquivalentsAtCarryingValue',
+    'cashAndShortTermInvestments', 'inventory', 'currentNetReceivables',
+    'totalNonCurrentAssets', 'propertyPlantEquipment', 'accumulatedDepreciationAmortizationPPE',
+    'intangibleAssets', 'intangibleAssetsExcludingGoodwill', 'goodwill', 'investments',
+    'longTermInvestments', 'shortTermInvestments', 'otherCurrentAssets',
+    'otherNonCurrentAssets', 'totalLiabilities', 'totalCurrentLiabilities',
+    'currentAccountsPayable', 'deferredRevenue', 'currentDebt', 'shortTermDebt',
+    'totalNonCurrentLiabilities', 'capitalLeaseObligations', 'longTermDebt',
+    'currentLongTermDebt', 'longTermDebtNoncurrent', 'shortLongTermDebtTotal',
+    'otherCurrentLiabilities', 'otherNonCurrentLiabilities', 'totalShareholderEquity',
+    'treasuryStock', 'retainedEarnings', 'commonStock', 'commonStockSharesOutstanding',
+])
+
+CASH_FLOW_SCHEMA = Schema([
+    'operatingCashflow', 'paymentsForOperatingActivities', 'proceedsFromOperatingActivities',
+    'changeInOperatingLiabilities', 'changeInOperatingAssets',
+    'depreciationDepletionAndAmortization', 'capitalExpenditures', 'changeInReceivables',
+    'changeInInventory', 'profitLoss', 'cashflowFromInvestment', 'cashflowFromFinancing',
+    'proceedsFromRepaymentsOfShortTermDebt', 'paymentsForRepurchaseOfCommonStock',
+    'paymentsForRepurchaseOfEquity', 'paymentsForRepurchaseOfPreferredStock',
+    'dividendPayout', 'dividendPayoutCommonStock', 'dividendPayoutPreferredStock',
+    'proceedsFromIssuanceOfCommonStock',
+    'proceedsFromIssuanceOfLongTermDebtAndCapitalSecuritiesNet',
+    'proceedsFromIssuanceOfPreferredStock', 'proceedsFromRepurchaseOfEquity',
+    'proceedsFromSaleOfTreasuryStock', 'changeInCashAndCashEquivalents',
+    'changeInExchangeRate', 'netIncome',
+])
+
+EARNINGS_SCHEMA = Schema(['reportedEPS', 'estimatedEPS', 'surprise', 'surprisePercentage'])
+
+OVERVIEW_SCHEMA = Schema([
+    'MarketCapitalization', 'EBITDA', 'PERatio', 'PEGRatio', 'BookValue', 'DividendPerShare',
+    'DividendYield', 'EPS', 'RevenuePerShareTTM', 'ProfitMargin', 'OperatingMarginTTM',
+    'ReturnOnAssetsTTM', 'ReturnOnEquityTTM', 'RevenueTTM', 'GrossProfitTTM', 'DilutedEPSTTM',
+    'QuarterlyEarningsGrowthYOY', 'QuarterlyRevenueGrowthYOY', 'AnalystTargetPrice',
+    'AnalystRatingStrongBuy', 'AnalystRatingBuy', 'AnalystRatingHold', 'AnalystRatingSell',
+    'AnalystRatingStrongSell', 'TrailingPE', 'ForwardPE', 'PriceToSalesRatioTTM',
+    'PriceToBookRatio', 'EVToRevenue', 'EVToEBITDA', 'Beta', '52WeekHigh', '52WeekLow',
+    '50DayMovingAverage', '200DayMovingAverage', 'SharesOutstanding',
+], dates=['LatestQuarter', 'DividendDate', 'ExDividendDate'],
+    categories=['AssetType', 'Exchange', 'Currency', 'Country', 'Sector', 'Industry', 'FiscalYearEnd'],
+    texts=['Symbol', 'Name', 'Description', 'CIK', 'Address', 'OfficialSite'])
+
+REPORT_SCHEMAS = {
+    'income_statement': INCOME_STATEMENT_SCHEMA,
+    'balance_sheet': BALANCE_SHEET_SCHEMA,
+    'cash_flow': CASH_FLOW_SCHEMA,
+}
+
+
+def report_schema(report_type, with_earnings=False):
+    """
+    Schema of a report type, optionally with the earnings columns merged into it.
+    """
+    if report_type not in REPORT_SCHEMAS:
+        raise ValueError(f"Invalid report type '{report_type}'")
+    schema = REPORT_SCHEMAS[report_type]
+    return schema + EARNINGS_SCHEMA if with_earnings else schema
@@ -0,0 +1,572 @@
+import csv
+import glob
+import gzip
+import os
+import threading
+
+import pandas as pd
+
+from data_extraction.frame_cache import file_version
+from data_extraction.metrics import metrics
+
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'adjusted_close',
+                 'volume', 'dividend', 'split_coefficient']
+
+# Per-file locks shared by every store instance of the process
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+_compactors = {}
+_compactors_lock = threading.Lock()
+
+
+def _to_price_frame(data, index_col='date'):
+    """
+    Normalize a daily price frame to the typed layout used by the stores.
+
+    Args:
+        data (DataFrame): Daily prices indexed by date.
+        index_col (str): Name given to the date index.
+
+    Returns:
+        DataFrame: Ascending, de-duplicated frame with float64 price columns.
+        When a date appears twice the last row wins.
+    """
+    data = data.copy()
+    data.index = pd.to_datetime(data.index)
+    data.index.name = index_col
+    data = data[~data.index.duplicated(keep='last')].sort_index()
+    for col in data.columns:
+        if col in PRICE_COLUMNS:
+            data[col] = pd.to_numeric(data[col], errors='coerce').astype('float64')
+    return data
+
+
+def _count_bytes(name, paths, **labels):
+    if metrics.enabled:
+        metrics.inc(name, sum(os.path.getsize(path) for path in paths if os.path.exists(path)), **labels)
+
+
+def _segments_path(path):
+    return path + '.segments'
+
+
+def pending_segments(path):
+    """
+    Number of append segments written to a gzip CSV since its last compaction.
+    """
+    try:
+        with open(_segments_path(path)) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def append_gzip_csv(path, data):
+    """
+    Append rows to a gzip CSV without re-encoding the existing content.
+
+    The rows are written as a new gzip member at the end of the file, which
+    every gzip reader (including `pd.read_csv`) decodes as one stream. The
+    columns follow the existing header; columns missing from `data` are left
+    empty.
+
+    Args:
+        path (str): Path to an existing gzip CSV.
+        data (DataFrame): Rows to append, indexed like the file.
+    """
+    with gzip.open(path, 'rt', newline='') as f:
+        header = next(csv.reader(f))
+
+    rows = data.reset_index().reindex(columns=header)
+    with open(path, 'ab') as f:
+        f.write(gzip.compress(rows.to_csv(index=False, header=False).encode()))
+
+    count = pending_segments(path) + 1
+    with open(_segments_path(path), 'w') as f:
+        f.write(str(count))
+
+
+def compact_gzip_csv(path, index_col):
+    """
+    Rewrite a gzip CSV with appended segments as one sorted, newest-first member.
+
+    Args:
+        path (str): Path to the gzip CSV.
+        index_col (str): Name of the date column.
+    """
+    data = pd.read_csv(path, index_col=index_col, parse_dates=True)
+    data = data[~data.index.duplicated(keep='last')].sort_index(ascending=False)
+
+    tmp_path = path + '.tmp'
+    data.to_csv(tmp_path, index=True, compression='gzip')
+    os.replace(tmp_path, path)
+    if os.path.exists(_segments_path(path)):
+        os.remove(_segments_path(path))
+
+
+class DailyStockStore:
+    """
+    Base class for daily stock price storage backends.
+
+    A store keeps one price history per ticker. `read` always returns the
+    rows in ascending date order; callers decide how to sort for display.
+
+    New bars go through `append`, which only writes the new rows. Appended
+    segments are merged back into the base layout by `compact`, either
+    explicitly or through a background `Compactor` (see `start_compactor`
+    and FIN_DATA_COMPACT_INTERVAL).
+    """
+
+    def lock(self, ticker):
+        """
+        Per-ticker lock serializing writes and compaction within a process.
+
+        The lock belongs to the ticker's path, so every store instance over
+        the same files, e.g. a loader's and a Compactor's, shares it.
+        """
+        with _file_locks_guard:
+            return _file_locks.setdefault(os.path.abspath(self.path(ticker)), threading.Lock())
+
+    def tickers(self):
+        raise NotImplementedError
+
+    def path(self, ticker):
+        raise NotImplementedError
+
+    def exists(self, ticker):
+        raise NotImplementedError
+
+    def read(self, ticker, begin_date=None, end_date=None):
+        raise NotImplementedError
+
+    def write(self, ticker, data):
+        raise NotImplementedError
+
+    def last_date(self, ticker):
+        raise NotImplementedError
+
+    def version(self, ticker):
+        """
+        Signature of the ticker's files, changing with every write, append or compaction.
+        """
+        raise NotImplementedError
+
+    def append(self, ticker, data):
+        raise NotImplementedError
+
+    def pending_segments(self, ticker):
+        raise NotImplementedError
+
+    def compact(self, ticker):
+        raise NotImplementedError
+
+
+class GzipCsvStore(DailyStockStore):
+    """
+    Legacy layout: one `{ticker}.gz` CSV per ticker, newest row first.
+
+    Appends add gzip members at the end of the file, so until the file is
+    compacted the newest rows are not at the top.
+    """
+
+    def __init__(self, root, index_col='date'):
+        self.root = root
+        self.index_col = index_col
+
+    def tickers(self):
+        return sorted(os.path.basename(path)[:-len('.gz')]
+                      for path in glob.glob(os.path.join(self.root, '*.gz')))
+
+    def path(self, ticker):
+        return os.path.join(self.root, f'{ticker}.gz')
+
+    def exists(self, ticker):
+        return os.path.exists(self.path(ticker))
+
+    def read(self, ticker, begin_date=None, end_date=None):
+        with metrics.timer('store_decode_seconds', store='gzip'):
+            data = pd.read_csv(self.path(ticker), index_col=self.index_col, parse_dates=True)
+        _count_bytes('store_bytes_read_total', [self.path(ticker)], store='gzip')
+        with metrics.timer('store_sort_slice_seconds', store='gzip'):
+            data = data[~data.index.duplicated(keep='last')]
+            return data.sort_index().loc[begin_date:end_date]
+
+    def write(self, ticker, data):
+        data = _to_price_frame(data, self.index_col)
+        with self.lock(ticker), metrics.timer('store_write_seconds', store='gzip'):
+            data.sort_index(ascending=False).to_csv(
+                self.path(ticker), index=True, compression='gzip')
+            if os.path.exists(_segments_path(self.path(ticker))):
+                os.remove(_segments_path(self.path(ticker)))
+        _count_bytes('store_bytes_written_total', [self.path(ticker)], store='gzip')
+
+    def last_date(self, ticker):
+        dates = pd.read_csv(
+            self.path(ticker), usecols=[self.index_col], parse_dates=[self.index_col])
+        return dates[self.index_col].max()
+
+    def version(self, ticker):
+        return file_version(self.path(ticker), _segments_path(self.path(ticker)))
+
+    def append(self, ticker, data):
+        if not self.exists(ticker):
+            return self.write(ticker, data)
+        data = _to_price_frame(data, self.index_col)
+        if data.empty:
+            return
+        size = os.path.getsize(self.path(ticker)) if metrics.enabled else 0
+        with self.lock(ticker), metrics.timer('store_write_seconds', store='gzip'):
+            append_gzip_csv(self.path(ticker), data)
+        if metrics.enabled:
+            metrics.inc('store_bytes_written_total', os.path.getsize(self.path(ticker)) - size, store='gzip')
+
+    def pending_segments(self, ticker):
+        return pending_segments(self.path(ticker))
+
+    def compact(self, ticker):
+        with self.lock(ticker):
+            compact_gzip_csv(self.path(ticker), self.index_col)
+
+
+class PartitionedStore(DailyStockStore):
+    """
+    Columnar layout partitioned by calendar year.
+
+    Each ticker gets a directory holding one `{year}.parquet` (or
+    `{year}.feather`) file. Rows inside a partition are sorted by date and,
+    for Parquet, split into small row groups so that the date filter can
+    skip row groups using their min/max statistics.
+
+    Appends are written as small `delta-{n}` files next to the partitions.
+    Reads merge them in (a later delta wins on a duplicated date) until
+    `compact` folds them into the yearly partitions.
+    """
+
+    FORMATS = ('parquet', 'feather')
+
+    def __init__(self, root, file_format='parquet', row_group_size=64):
+        if file_format not in self.FORMATS:
+            raise ValueError(
+                f"Invalid file format '{file_format}', expected one of {self.FORMATS}")
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ImportError(
+                'PartitionedStore requires pyarrow, install it with `pip install pyarrow`') from e
+        self.root = root
+        self.file_format = file_format
+        self.row_group_size = row_group_size
+
+    def tickers(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, name)))
+
+    def path(self, ticker):
+        return os.path.join(self.root, ticker)
+
+    def deltas(self, ticker):
+        """
+        List the pending delta files for the given ticker, oldest first.
+        """
+        return sorted(glob.glob(
+            os.path.join(self.path(ticker), f'delta-*.{self.file_format}')))
+
+    def partition_path(self, ticker, year):
+        return os.path.join(self.path(ticker), f'{year}.{self.file_format}')
+
+    def years(self, ticker):
+        """
+        List the years that have a partition for the given ticker, ascending.
+        """
+        files = glob.glob(os.path.join(self.path(ticker), f'*.{self.file_format}'))
+        years = []
+        for file in files:
+            name = os.path.splitext(os.path.basename(file))[0]
+            if name.isdigit():
+                years.append(int(name))
+        return sorted(years)
+
+    def exists(self, ticker):
+        return len(self.years(ticker)) > 0 or len(self.deltas(ticker)) > 0
+
+    def read(self, ticker, begin_date=None, end_date=None):
+        # Listed and read under the lock, a compaction could remove or replace
+        # the files in between
+        with self.lock(ticker):
+            return self._read(ticker, begin_date, end_date)
+
+    def _read(self, ticker, begin_date=None, end_date=None):
+        begin = pd.Timestamp(begin_date) if begin_date is not None else None
+        end = pd.Timestamp(end_date) if end_date is not None else None
+
+        years = [year for year in self.years(ticker)
+                 if (begin is None or year >= begin.year) and (end is None or year <= end.year)]
+
+        delta_paths = self.deltas(ticker)
+        with metrics.timer('store_decode_seconds', store=self.file_format):
+            frames = [self._read_file(self.partition_path(ticker, year), begin, end, year)
+                      for year in years]
+            deltas = [self._read_file(path, begin, end) for path in delta_paths]
+        _count_bytes('store_bytes_read_total',
+                     [self.partition_path(ticker, year) for year in years] + delta_paths,
+                     store=self.file_format)
+        frames = [frame for frame in frames + deltas if len(frame) > 0]
+        if not frames:
+            return pd.DataFrame(
+                columns=PRICE_COLUMNS, index=pd.DatetimeIndex([], name='date'), dtype='float64')
+        data = pd.concat(frames)
+        if deltas:
+            data = data[~data.index.duplicated(keep='last')].sort_index()
+        # Without deltas the partitions are disjoint and individually sorted,
+        # so concatenating them in year order keeps the index sorted.
+        return data
+
+    def _read_file(self, path, begin, end, year=None):
+        import pyarrow.compute as pc
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+
+        filters = []
+        if begin is not None and (year is None or begin.year == year):
+            filters.append(('date', '>=', begin))
+        if end is not None and (year is None or end.year == year):
+            filters.append(('date', '<=', end))
+
+        if self.file_format == 'parquet':
+            table = pq.read_table(path, filters=filters or None)
+        else:
+            table = feather.read_table(path, memory_map=True)
+            for column, op, value in filters:
+                scalar = pd.Timestamp(value).to_datetime64()
+                mask = pc.greater_equal(table[column], scalar) if op == '>=' \
+                    else pc.less_equal(table[column], scalar)
+                table = table.filter(mask)
+
+        return table.to_pandas().set_index('date')
+
+    def write(self, ticker, data):
+        data = _to_price_frame(data)
+        os.makedirs(self.path(ticker), exist_ok=True)
+
+        with self.lock(ticker):
+            # Drop partitions that the new history no longer covers.
+            new_years = set(data.index.year)
+            for year in self.years(ticker):
+                if year not in new_years:
+                    os.remove(self.partition_path(ticker, year))
+
+            for year, part in data.groupby(data.index.year):
+                self._write_file(self.partition_path(ticker, year), part)
+
+            # The full history supersedes any pending deltas.
+            for path in self.deltas(ticker):
+                os.remove(path)
+
+    def _write_file(self, path, data):
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+
+        with metrics.timer('store_write_seconds', store=self.file_format):
+            table = pa.Table.from_pandas(data.reset_index(), preserve_index=False)
+            tmp_path = path + '.tmp'
+            if self.file_format == 'parquet':
+                pq.write_table(table, tmp_path, row_group_size=self.row_group_size)
+            else:
+                feather.write_feather(table, tmp_path, compression='uncompressed')
+            os.replace(tmp_path, path)
+        _count_bytes('store_bytes_written_total', [path], store=self.file_format)
+
+    def last_date(self, ticker):
+        with self.lock(ticker):
+            years = self.years(ticker)
+            last_dates = [self._read_file(path, None, None).index.max()
+                          for path in self.deltas(ticker)]
+            if years:
+                last = self._read_file(self.partition_path(ticker, years[-1]), None, None)
+                last_dates.append(last.index.max())
+        last_dates = [date for date in last_dates if not pd.isna(date)]
+        return max(last_dates) if last_dates else pd.NaT
+
+    def version(self, ticker):
+        return file_version(*sorted(glob.glob(os.path.join(self.path(ticker), f'*.{self.file_format}'))))
+
+    def append(self, ticker, data):
+        if not self.exists(ticker):
+            return self.write(ticker, data)
+        data = _to_price_frame(data)
+        if data.empty:
+            return
+        with self.lock(ticker):
+            deltas = self.deltas(ticker)
+            number = int(os.path.basename(deltas[-1]).split('-')[1].split('.')[0]) + 1 \
+                if deltas else 0
+            self._write_file(os.path.join(
+                self.path(ticker), f'delta-{number:06d}.{self.file_format}'), data)
+
+    def pending_segments(self, ticker):
+        return len(self.deltas(ticker))
+
+    def compact(self, ticker):
+        with self.lock(ticker):
+            # Listed and merged under the lock, a concurrent compaction may
+            # already have folded and removed the deltas
+            deltas = self.deltas(ticker)
+            if not deltas:
+                return
+            merged = self._read(ticker)
+            touched_years = set()
+            for path in deltas:
+                touched_years.update(self._read_file(path, None, None).index.year)
+            # Only the years that received new rows are rewritten.
+            for year in sorted(touched_years):
+                part = merged[merged.index.year == year]
+                self._write_file(self.partition_path(ticker, year), part)
+            for path in deltas:
+                os.remove(path)
+
+
+class Compactor:
+    """
+    Periodically fold append segments back into a store's base layout.
+
+    Args:
+        store (DailyStockStore): Store to compact.
+        max_segments (int): Compact a ticker once it has this many segments.
+        interval (float): Seconds between background passes.
+    """
+
+    def __init__(self, store, max_segments=16, interval=3600):
+        self.store = store
+        self.max_segments = max_segments
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """
+        Compact every ticker at or above the segment threshold.
+
+        Returns:
+            list: Tickers that were compacted.
+        """
+        compacted = []
+        for ticker in self.store.tickers():
+            if self.store.pending_segments(ticker) >= self.max_segments:
+                try:
+                    self.store.compact(ticker)
+                except Exception as e:
+                    # Left for the next pass, one ticker must not stop the others
+                    print(f"Failed to compact {ticker}: {e}")
+                    continue
+                compacted.append(ticker)
+        return compacted
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def get_daily_stock_store(kind=None, root=None):
+    """
+    Build the daily stock store configured for this environment.
+
+    Args:
+        kind (str): 'gzip', 'parquet' or 'feather'. Defaults to the
+            FIN_DATA_DAILY_STOCK_STORE environment variable, then 'gzip'.
+        root (str): Storage directory. Defaults to
+            FIN_DATA_COMPRESSED_DAILY_STOCK_PATH for 'gzip' and
+            FIN_DATA_PARTITIONED_DAILY_STOCK_PATH otherwise.
+
+    Returns:
+        DailyStockStore: The configured store.
+    """
+    kind = kind or os.getenv('FIN_DATA_DAILY_STOCK_STORE', 'gzip')
+    if kind == 'gzip':
+        store = GzipCsvStore(root or os.getenv('FIN_DATA_COMPRESSED_DAILY_STOCK_PATH'))
+    elif kind in PartitionedStore.FORMATS:
+        store = PartitionedStore(
+            root or os.getenv('FIN_DATA_PARTITIONED_DAILY_STOCK_PATH'), file_format=kind)
+    else:
+        raise ValueError(f"Invalid daily stock store '{kind}'")
+
+    start_env_compactor(store)
+    return store
+
+
+def start_env_compactor(store):
+    """
+    Start the store's background Compactor if FIN_DATA_COMPACT_INTERVAL is set.
+
+    FIN_DATA_COMPACT_INTERVAL is the number of seconds between passes and
+    FIN_DATA_COMPACT_MAX_SEGMENTS (default 16) the compaction threshold.
+    `get_daily_stock_store` and the financial report store call it, so every
+    loader's appends are compacted in the background.
+
+    Returns:
+        Compactor: The running compactor, None when it is not configured.
+    """
+    interval = os.getenv('FIN_DATA_COMPACT_INTERVAL')
+    if not interval or not store.root:
+        return None
+    return start_compactor(store, max_segments=int(os.getenv('FIN_DATA_COMPACT_MAX_SEGMENTS', '16')),
+                           interval=float(interval))
+
+
+def start_compactor(store, max_segments=16, interval=3600):
+    """
+    Start the background Compactor of a store's directory, once per process.
+
+    Returns:
+        Compactor: The running compactor of the directory.
+    """
+    key = (type(store).__name__, os.path.abspath(store.root), getattr(store, 'file_format', None))
+    with _compactors_lock:
+        compactor = _compactors.get(key)
+        if compactor is None:
+            compactor = _compactors[key] = Compactor(store, max_segments=max_segments, interval=interval)
+        compactor.start()
+        return compactor
+
+
+def migrate_gzip_store(source_root, target_store, tickers=None):
+    """
+    Copy every `{ticker}.gz` daily price file into another store.
+
+    Args:
+        source_root (str): Directory holding the legacy `{ticker}.gz` files.
+        target_store (DailyStockStore): Store to write into.
+        tickers (list): Tickers to migrate. Defaults to every file found.
+
+    Returns:
+        list: Tickers that were migrated.
+    """
+    source = GzipCsvStore(source_root)
+    if tickers is None:
+        tickers = source.tickers()
+
+    migrated = []
+    for ticker in tickers:
+        if not source.exists(ticker):
+            print(f'No data file found for {ticker}, skipped.')
+            continue
+        target_store.write(ticker, source.read(ticker))
+        migrated.append(ticker)
+
+    print(f'Migrated {len(migrated)} tickers from {source_root}')
+    return migrated
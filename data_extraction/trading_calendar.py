@@ -0,0 +1,184 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+# Time after which the previous gap rule treats today's bar as published
+DATA_READY_TIME = pd.Timestamp('16:30').time()
+
+_calendars = {}
+_calendars_lock = threading.Lock()
+
+
+def _to_date(value):
+    """
+    Calendar date of a timestamp, in its own time zone, as datetime64[ns].
+    """
+    return pd.Timestamp(value).tz_localize(None).normalize().to_datetime64()
+
+
+class TradingCalendar:
+    """
+    Precomputed session index of an exchange calendar.
+
+    The `pandas_market_calendars` schedule is built once for a wide date
+    range and kept as sorted arrays of session dates and close times, so
+    every query is a binary search. With `cache_path` set, the arrays are
+    saved to `{cache_path}/{name}.npz` and reused by later processes until
+    the calendar package is upgraded or the range no longer covers the
+    query.
+
+    Args:
+        name (str): Exchange calendar name.
+        start_date (str): First date of the index.
+        end_date (str): Last date of the index, defaults to a year from now.
+        cache_path (str): Directory for the persisted index, None to keep it in memory.
+    """
+
+    def __init__(self, name='NYSE', start_date='1990-01-01', end_date=None, cache_path=None):
+        self.name = name
+        self.cache_path = cache_path
+        self.start_date = _to_date(start_date)
+        self.end_date = _to_date(end_date or pd.Timestamp.now() + pd.DateOffset(years=1))
+        self.sessions = None
+        self.closes = None
+        self._lock = threading.Lock()
+        if not self._load():
+            self._build(self.start_date, self.end_date)
+
+    @property
+    def file_path(self):
+        if self.cache_path is None:
+            return None
+        return os.path.join(self.cache_path, f'{self.name}.npz')
+
+    @staticmethod
+    def _calendar_version():
+        import pandas_market_calendars as mcal
+        return getattr(mcal, '__version__', 'unknown')
+
+    def _load(self):
+        if self.file_path is None or not os.path.exists(self.file_path):
+            return False
+        with np.load(self.file_path) as cached:
+            if str(cached['version']) != self._calendar_version():
+                return False
+            start_date, end_date = cached['range']
+            if start_date > self.start_date or end_date < self.end_date:
+                return False
+            self.sessions = cached['sessions']
+            self.closes = cached['closes']
+            self.start_date, self.end_date = start_date, end_date
+        return True
+
+    def _build(self, start_date, end_date):
+        import pandas_market_calendars as mcal
+
+        schedule = mcal.get_calendar(self.name).schedule(start_date=start_date, end_date=end_date)
+        self.sessions = schedule.index.values.astype('datetime64[ns]')
+        self.closes = schedule['market_close'].dt.tz_convert('UTC').dt.tz_localize(None).values
+        self.start_date, self.end_date = start_date, end_date
+
+        if self.file_path is not None:
+            os.makedirs(self.cache_path, exist_ok=True)
+            tmp_path = f'{self.file_path}.{os.getpid()}.tmp.npz'
+            np.savez(tmp_path, sessions=self.sessions, closes=self.closes,
+                     range=np.array([start_date, end_date]), version=self._calendar_version())
+            os.replace(tmp_path, self.file_path)
+
+    def _cover(self, start_date, end_date):
+        # Rebuild a wider index when a query falls outside the current one
+        if start_date < self.start_date or end_date > self.end_date:
+            with self._lock:
+                self._build(min(start_date, self.start_date), max(end_date, self.end_date))
+
+    def sessions_between(self, start_date, end_date):
+        """
+        Sessions from start_date to end_date, both included.
+
+        Returns:
+            DatetimeIndex: Session dates.
+        """
+        start, end = _to_date(start_date), _to_date(end_date)
+        self._cover(start, end)
+        left = np.searchsorted(self.sessions, start, 'left')
+        right = np.searchsorted(self.sessions, end, 'right')
+        return pd.DatetimeIndex(self.sessions[left:right])
+
+    def count_sessions(self, start_date, end_date):
+        """
+        Number of sessions from start_date to end_date, both included.
+
+        Same count as `len(mcal.get_calendar(name).schedule(start_date, end_date))`.
+        """
+        start, end = _to_date(start_date), _to_date(end_date)
+        self._cover(start, end)
+        count = np.searchsorted(self.sessions, end, 'right') - np.searchsorted(self.sessions, start, 'left')
+        return max(int(count), 0)
+
+    def last_completed_session(self, now=None):
+        """
+        Date of the latest session whose market close is at or before `now`.
+
+        Args:
+            now (Timestamp): Time zone aware time, defaults to the current time.
+        """
+        now = pd.Timestamp.now(tz='UTC') if now is None else pd.Timestamp(now)
+        now_utc = (now.tz_convert('UTC') if now.tzinfo else now.tz_localize('America/New_York').tz_convert('UTC'))
+        self._cover(_to_date(now_utc) - np.timedelta64(10, 'D'), _to_date(now_utc))
+        position = np.searchsorted(self.closes, now_utc.tz_localize(None).to_datetime64(), 'right') - 1
+        return pd.Timestamp(self.sessions[position]) if position >= 0 else pd.NaT
+
+    def stale_mask(self, last_dates, now):
+        """
+        Which histories are missing a published bar, for many last dates at once.
+
+        A history is up to date when fewer than two sessions span its last
+        date and today, or exactly two before 16:30 while today's bar is not
+        yet published. This is the rule `update_daily_stock_data` applied
+        with a schedule per ticker.
+
+        Args:
+            last_dates (array): Last stored date per history.
+            now (Timestamp): Current time in the exchange's time zone.
+
+        Returns:
+            ndarray: True where the history needs an update.
+        """
+        dates = pd.DatetimeIndex(pd.to_datetime(last_dates)).tz_localize(None).normalize().values
+        today = _to_date(now)
+        known = ~np.isnat(dates)
+        if known.any():
+            self._cover(dates[known].min(), today)
+        counts = np.searchsorted(self.sessions, today, 'right') - np.searchsorted(self.sessions, dates, 'left')
+        counts = np.maximum(counts, 0)
+        fresh = (counts < 2) | ((counts == 2) & (pd.Timestamp(now).time() < DATA_READY_TIME))
+        # Unknown last dates always need an update
+        return ~fresh | ~known
+
+    def is_stale(self, last_date, now):
+        """
+        Whether a history ending on `last_date` is missing a published bar.
+        """
+        return bool(self.stale_mask([last_date], now)[0])
+
+
+def get_trading_calendar(name='NYSE', cache_path=None):
+    """
+    Process-wide trading calendar, built at most once per process.
+
+    Args:
+        name (str): Exchange calendar name.
+        cache_path (str): Directory persisting the index across processes.
+            Defaults to the FIN_DATA_CALENDAR_CACHE_PATH environment variable.
+
+    Returns:
+        TradingCalendar: The shared calendar.
+    """
+    cache_path = cache_path or os.getenv('FIN_DATA_CALENDAR_CACHE_PATH')
+    with _calendars_lock:
+        if name not in _calendars:
+            _calendars[name] = TradingCalendar(name, cache_path=cache_path)
+        return _calendars[name]
@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_alpha_vantage import FakeAlphaVantage  # noqa: E402
+
+
+DATA_DIRS = {
+    'FIN_DATA_COMPRESSED_DAILY_STOCK_PATH': 'daily',
+    'FIN_DATA_PARTITIONED_DAILY_STOCK_PATH': 'partitioned',
+    'FIN_DATA_COMPRESSED_FINANCIAL_REPORTS_PATH': 'reports',
+    'FIN_DATA_COMPRESSED_COMPANY_EARNINGS_PATH': 'earnings',
+    'FIN_DATA_COMPRESSED_COMPANY_OVERVIEW_PATH': 'overview',
+    'PROCESSED_DAILY_STOCK_PATH': 'features',
+}
+
+
+@pytest.fixture
+def data_env(tmp_path, monkeypatch):
+    """
+    Empty data directories, configured through the environment like `.env` does.
+    """
+    for name, directory in DATA_DIRS.items():
+        (tmp_path / directory).mkdir()
+        monkeypatch.setenv(name, str(tmp_path / directory))
+    monkeypatch.setenv('FIN_DATA_DAILY_STOCK_STORE', 'gzip')
+    monkeypatch.setenv('FIN_DATA_REFRESH_STATE_PATH', str(tmp_path / 'refresh_state.json'))
+    monkeypatch.setenv('ALPHA_VANTAGE_KEY', 'test')
+    monkeypatch.setenv('FIN_DATA_CALLS_PER_MINUTE', '6000')
+    monkeypatch.delenv('FIN_DATA_OFFLINE', raising=False)
+    monkeypatch.delenv('FIN_DATA_API_CACHE_PATH', raising=False)
+
+    from data_extraction.frame_cache import frame_cache
+    frame_cache.invalidate()
+    return tmp_path
+
+
+@pytest.fixture
+def fake_api(data_env, monkeypatch):
+    """
+    A local fake Alpha Vantage server the loaders are pointed at.
+    """
+    server = FakeAlphaVantage(start_date='2015-01-02')
+    monkeypatch.setenv('ALPHA_VANTAGE_URL', server.start())
+    yield server
+    server.stop()
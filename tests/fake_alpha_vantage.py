@@ -0,0 +1,345 @@
+"""
+Local stand-in for the Alpha Vantage query endpoint.
+
+Serves deterministic synthetic data for the functions the loaders use and
+enforces a calls-per-minute limit the same way the real API does, by
+answering with an 'Information' message instead of data.
+
+Usage:
+    server = FakeAlphaVantage(calls_per_minute=75)
+    url = server.start()
+    os.environ['ALPHA_VANTAGE_URL'] = url
+    ...
+    server.stop()
+
+Or from the command line:
+    python tests/fake_alpha_vantage.py --port 8765 --calls-per-minute 75
+"""
+import argparse
+import json
+import threading
+import time
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+
+RATE_LIMIT_MESSAGE = ('Thank you for using Alpha Vantage! Please consider spreading out your '
+                      'free API requests more sparingly. Our rate limit is {} requests per minute.')
+
+REPORT_FIELDS = {
+    'INCOME_STATEMENT': ['grossProfit', 'totalRevenue', 'costOfRevenue', 'operatingIncome',
+                         'researchAndDevelopment', 'incomeBeforeTax', 'ebitda', 'netIncome'],
+    'BALANCE_SHEET': ['totalAssets', 'totalCurrentAssets', 'cashAndShortTermInvestments',
+                      'inventory', 'totalLiabilities', 'longTermDebt',
+                      'totalShareholderEquity', 'commonStockSharesOutstanding'],
+    'CASH_FLOW': ['operatingCashflow', 'capitalExpenditures', 'cashflowFromInvestment',
+                  'cashflowFromFinancing', 'dividendPayout', 'netIncome'],
+}
+
+SECTORS = ['TECHNOLOGY', 'FINANCE', 'HEALTHCARE', 'ENERGY', 'MANUFACTURING', 'TRADE & SERVICES']
+EXCHANGES = ['NASDAQ', 'NYSE']
+
+
+def _rng(ticker, salt=''):
+    return np.random.default_rng(zlib.crc32(f'{ticker}{salt}'.encode()))
+
+
+def synthetic_daily_prices(ticker, start_date='2000-01-03', end_date=None):
+    """
+    Generate a deterministic daily adjusted OHLCV history for a ticker.
+
+    Args:
+        ticker (str): Stock ticker symbol, used as the random seed.
+        start_date (str): First business day.
+        end_date (str): Last business day, defaults to today.
+
+    Returns:
+        DataFrame: Ascending frame in the loaders' column layout.
+    """
+    dates = pd.bdate_range(start_date, end_date or pd.Timestamp.now().normalize())
+    dates.name = 'date'
+    rng = _rng(ticker)
+    n = len(dates)
+    close = 20 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n)))
+    open_ = close * np.exp(rng.normal(0, 0.005, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+    volume = rng.integers(100_000, 10_000_000, n).astype('float64')
+    dividend = np.where(rng.random(n) < 0.016, np.round(close * 0.005, 4), 0.0)
+    return pd.DataFrame({
+        'open': np.round(open_, 4),
+        'high': np.round(high, 4),
+        'low': np.round(low, 4),
+        'close': np.round(close, 4),
+        'adjusted_close': np.round(close, 4),
+        'volume': volume,
+        'dividend': dividend,
+        'split_coefficient': np.ones(n),
+    }, index=dates)
+
+
+def _fiscal_dates(ticker, freq, start_date, end_date):
+    dates = pd.date_range(start_date, end_date, freq=freq)
+    # Some companies close their books a few days before or after month end
+    offsets = _rng(ticker, freq).integers(-3, 2, len(dates))
+    return [date + pd.Timedelta(days=int(offset)) for date, offset in zip(dates, offsets)]
+
+
+def synthetic_earnings(ticker, start_date='2005-01-01', end_date=None):
+    end_date = end_date or pd.Timestamp.now()
+    rng = _rng(ticker, 'earnings')
+    quarterly = []
+    for date in pd.date_range(start_date, end_date, freq='Q'):
+        reported = rng.normal(1, 0.5)
+        estimated = reported + rng.normal(0, 0.1)
+        quarterly.append({
+            'fiscalDateEnding': date.strftime('%Y-%m-%d'),
+            'reportedDate': (date + pd.Timedelta(days=int(rng.integers(20, 45)))).strftime('%Y-%m-%d'),
+            'reportedEPS': f'{reported:.2f}',
+            'estimatedEPS': f'{estimated:.2f}',
+            'surprise': f'{reported - estimated:.2f}',
+            'surprisePercentage': f'{(reported - estimated) / abs(estimated) * 100:.4f}',
+            'reportTime': 'post-market' if rng.random() < 0.5 else 'pre-market',
+        })
+    annual = []
+    for date in pd.date_range(start_date, end_date, freq='A'):
+        annual.append({'fiscalDateEnding': date.strftime('%Y-%m-%d'),
+                       'reportedEPS': f'{rng.normal(4, 2):.2f}'})
+    return {'symbol': ticker,
+            'annualEarnings': annual[::-1],
+            'quarterlyEarnings': quarterly[::-1]}
+
+
+def synthetic_report(function, ticker, start_date='2005-01-01', end_date=None):
+    end_date = end_date or pd.Timestamp.now()
+    rng = _rng(ticker, function)
+    reports = {}
+    for key, freq in (('annualReports', 'A'), ('quarterlyReports', 'Q')):
+        rows = []
+        for date in _fiscal_dates(ticker, freq, start_date, end_date):
+            row = {'fiscalDateEnding': date.strftime('%Y-%m-%d'), 'reportedCurrency': 'USD'}
+            for field in REPORT_FIELDS[function]:
+                # Alpha Vantage sends numbers as strings and gaps as 'None'
+                row[field] = 'None' if rng.random() < 0.05 else str(int(rng.normal(1e9, 3e8)))
+            rows.append(row)
+        reports[key] = rows[::-1]
+    return {'symbol': ticker, **reports}
+
+
+def synthetic_overview(ticker):
+    rng = _rng(ticker, 'overview')
+    return {
+        'Symbol': ticker,
+        'AssetType': 'Common Stock',
+        'Name': f'{ticker} Inc',
+        'Exchange': EXCHANGES[int(rng.integers(len(EXCHANGES)))],
+        'Currency': 'USD',
+        'Country': 'USA',
+        'Sector': SECTORS[int(rng.integers(len(SECTORS)))],
+        'Industry': 'SERVICES-PREPACKAGED SOFTWARE',
+        'FiscalYearEnd': 'December',
+        'LatestQuarter': (pd.Timestamp.now() - pd.offsets.QuarterEnd(1)).strftime('%Y-%m-%d'),
+        'MarketCapitalization': str(int(10 ** rng.uniform(8, 12))),
+        'EBITDA': str(int(10 ** rng.uniform(7, 10))),
+        'PERatio': 'None' if rng.random() < 0.1 else f'{rng.uniform(5, 60):.2f}',
+        'EPS': f'{rng.normal(4, 2):.2f}',
+        'Beta': f'{rng.uniform(0.5, 2):.3f}',
+        'DividendYield': f'{rng.uniform(0, 0.05):.4f}',
+    }
+
+
+def synthetic_intraday(ticker, month, interval='1min'):
+    minutes = int(interval.replace('min', ''))
+    days = pd.bdate_range(pd.Timestamp(month), pd.Timestamp(month) + pd.offsets.MonthEnd(0))
+    stamps = [pd.date_range(day + pd.Timedelta(hours=4), day + pd.Timedelta(hours=19, minutes=59),
+                            freq=f'{minutes}min') for day in days]
+    index = stamps[0].append(stamps[1:]) if stamps else pd.DatetimeIndex([])
+    rng = _rng(ticker, f'{month}{interval}')
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.001, len(index))))
+    spread = np.abs(rng.normal(0, 0.0005, len(index)))
+    return pd.DataFrame({
+        'open': np.round(close * (1 + rng.normal(0, 0.0003, len(index))), 4),
+        'high': np.round(close * (1 + spread), 4),
+        'low': np.round(close * (1 - spread), 4),
+        'close': np.round(close, 4),
+        'volume': rng.integers(100, 50_000, len(index)),
+    }, index=index)
+
+
+def _daily_payload(ticker, outputsize, start_date, end_date):
+    data = synthetic_daily_prices(ticker, start_date, end_date)
+    if outputsize != 'full':
+        data = data.iloc[-100:]
+    series = {}
+    for date, row in data.iloc[::-1].iterrows():
+        series[date.strftime('%Y-%m-%d')] = {
+            '1. open': f"{row['open']:.4f}",
+            '2. high': f"{row['high']:.4f}",
+            '3. low': f"{row['low']:.4f}",
+            '4. close': f"{row['close']:.4f}",
+            '5. adjusted close': f"{row['adjusted_close']:.4f}",
+            '6. volume': f"{int(row['volume'])}",
+            '7. dividend amount': f"{row['dividend']:.4f}",
+            '8. split coefficient': f"{row['split_coefficient']:.1f}",
+        }
+    return {
+        'Meta Data': {
+            '1. Information': 'Daily Time Series with Splits and Dividend Events',
+            '2. Symbol': ticker,
+            '3. Last Refreshed': data.index.max().strftime('%Y-%m-%d'),
+            '4. Output Size': 'Full size' if outputsize == 'full' else 'Compact',
+            '5. Time Zone': 'US/Eastern',
+        },
+        'Time Series (Daily)': series,
+    }
+
+
+def _intraday_payload(ticker, interval, month):
+    data = synthetic_intraday(ticker, month, interval)
+    series = {}
+    for stamp, row in data.iloc[::-1].iterrows():
+        series[stamp.strftime('%Y-%m-%d %H:%M:%S')] = {
+            '1. open': f"{row['open']:.4f}",
+            '2. high': f"{row['high']:.4f}",
+            '3. low': f"{row['low']:.4f}",
+            '4. close': f"{row['close']:.4f}",
+            '5. volume': f"{int(row['volume'])}",
+        }
+    return {
+        'Meta Data': {'1. Information': f'Intraday ({interval}) open, high, low, close prices and volume',
+                      '2. Symbol': ticker, '4. Interval': interval, '6. Time Zone': 'US/Eastern'},
+        f'Time Series ({interval})': series,
+    }
+
+
+class FakeAlphaVantage:
+    """
+    Threaded HTTP server mimicking https://www.alphavantage.co/query.
+
+    Args:
+        calls_per_minute (int): Requests allowed in any 60 second window,
+            None for no limit.
+        start_date (str): First date of the synthetic daily histories.
+        end_date (str): Last date of the synthetic daily histories.
+        fail_tickers (iterable): Tickers answered with an 'Error Message'.
+        latency (float): Seconds to sleep before answering each request.
+    """
+
+    def __init__(self, calls_per_minute=None, start_date='2000-01-03', end_date=None,
+                 fail_tickers=(), latency=0.0):
+        self.calls_per_minute = calls_per_minute
+        self.start_date = start_date
+        self.end_date = end_date
+        self.fail_tickers = set(fail_tickers)
+        self.latency = latency
+        self.calls = []
+        self.rejected = 0
+        self._window = deque()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def _allow(self):
+        if self.calls_per_minute is None:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            while self._window and now - self._window[0] >= 60:
+                self._window.popleft()
+            if len(self._window) >= self.calls_per_minute:
+                self.rejected += 1
+                return False
+            self._window.append(now)
+            return True
+
+    def respond(self, params):
+        """
+        Build the JSON payload for one query.
+
+        Args:
+            params (dict): Query parameters, one value per key.
+
+        Returns:
+            dict: Response body.
+        """
+        with self._lock:
+            self.calls.append(params)
+        if not self._allow():
+            return {'Information': RATE_LIMIT_MESSAGE.format(self.calls_per_minute)}
+
+        function = params.get('function')
+        ticker = params.get('symbol')
+        if ticker in self.fail_tickers:
+            return {'Error Message': 'Invalid API call. Please retry or visit the documentation.'}
+
+        if function == 'TIME_SERIES_DAILY_ADJUSTED':
+            return _daily_payload(ticker, params.get('outputsize', 'compact'),
+                                  self.start_date, self.end_date)
+        elif function == 'TIME_SERIES_INTRADAY':
+            month = params.get('month') or pd.Timestamp.now().strftime('%Y-%m')
+            return _intraday_payload(ticker, params.get('interval', '1min'), month)
+        elif function == 'EARNINGS':
+            return synthetic_earnings(ticker, end_date=self.end_date)
+        elif function in REPORT_FIELDS:
+            return synthetic_report(function, ticker, end_date=self.end_date)
+        elif function == 'OVERVIEW':
+            return synthetic_overview(ticker)
+        return {'Error Message': f'Invalid API call: unknown function {function}'}
+
+    def start(self, host='127.0.0.1', port=0):
+        """
+        Start serving in a background thread.
+
+        Returns:
+            str: Query URL to use as ALPHA_VANTAGE_URL.
+        """
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                params = {key: values[-1] for key, values in query.items()}
+                if fake.latency:
+                    time.sleep(fake.latency)
+                body = json.dumps(fake.respond(params)).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return f'http://{host}:{self._server.server_address[1]}/query'
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local fake Alpha Vantage server.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--calls-per-minute', type=int, default=None)
+    args = parser.parse_args()
+
+    server = FakeAlphaVantage(calls_per_minute=args.calls_per_minute)
+    print(f'Serving on {server.start(port=args.port)}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
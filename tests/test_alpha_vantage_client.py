@@ -0,0 +1,27 @@
+from data_extraction.fetch_financial_data import FundamentalDataLoader
+
+
+def calls(server, function):
+    return [call for call in server.calls if call['function'] == function]
+
+
+def test_responses_are_cached(fake_api):
+    loader = FundamentalDataLoader()
+    loader.get_earnings('AAA')
+    loader.get_earnings('AAA')
+    assert len(calls(fake_api, 'EARNINGS')) == 1
+
+
+def test_updates_bypass_the_cache(fake_api):
+    loader = FundamentalDataLoader()
+    loader.load_company_earnings('AAA', update=True)
+    loader.load_company_earnings('AAA', update=True)
+    assert len(calls(fake_api, 'EARNINGS')) == 2
+
+    loader.load_company_overview('AAA', update=True)
+    loader.load_company_overview('AAA', update=True)
+    assert len(calls(fake_api, 'OVERVIEW')) == 2
+
+    # A plain read after an update is served from the refreshed cache
+    loader.get_earnings('AAA')
+    assert len(calls(fake_api, 'EARNINGS')) == 2
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from data_extraction.bulk_loader import BulkLoader
+from data_extraction.fetch_financial_data import DailyStockDataLoader, FundamentalDataLoader
+
+
+TICKERS = ['AAA', 'BBB', 'CCC', 'DDD', 'EEE', 'FFF']
+
+
+def reject_first(server, n):
+    """
+    Answer the next `n` requests with the rate-limit message.
+    """
+    allow = server._allow
+    left = [n]
+    lock = threading.Lock()
+
+    def _allow():
+        with lock:
+            if left[0] > 0:
+                left[0] -= 1
+                server.rejected += 1
+                return False
+        return allow()
+
+    server._allow = _allow
+
+
+def test_bulk_loader_leaves_the_shared_client_alone(fake_api):
+    loader = FundamentalDataLoader()
+    client = loader.client
+    limiter = client.rate_limiter
+    rate = limiter.rate
+
+    BulkLoader(loader, max_workers=4, retries=5, backoff=0.5).load_many(['AAA'], 'get_earnings')
+    assert client.rate_limiter is limiter
+    assert limiter.rate == rate
+    # Every loader of the key shares the client and its budget
+    assert DailyStockDataLoader().client is client
+
+    # Retries were only set for the bulk loader's workers
+    reject_first(fake_api, 1)
+    with pytest.raises(ValueError, match='rate limit'):
+        loader.get_earnings('BBB')
+
+
+def test_calls_stay_within_the_key_budget(fake_api, monkeypatch):
+    # 2 calls per second, in bursts of 2
+    monkeypatch.setenv('FIN_DATA_CALLS_PER_MINUTE', '120')
+    loader = FundamentalDataLoader()
+
+    start = time.monotonic()
+    results, errors = loader.load_many(TICKERS, 'get_earnings', max_workers=6)
+    elapsed = time.monotonic() - start
+
+    assert sorted(results) == TICKERS and not errors
+    assert elapsed >= 1.8
+    assert fake_api.rejected == 0
+
+
+def test_rate_limited_calls_are_retried(fake_api):
+    reject_first(fake_api, 2)
+    loader = FundamentalDataLoader()
+    results, errors = BulkLoader(loader, max_workers=3, backoff=0.01).load_many(TICKERS, 'get_earnings')
+
+    assert sorted(results) == TICKERS and not errors
+    assert fake_api.rejected == 2
+    assert len(fake_api.calls) == len(TICKERS) + 2
+
+
+def test_failed_tickers_do_not_stop_the_others(fake_api):
+    fake_api.fail_tickers = {'BBB'}
+    done = []
+    loader = FundamentalDataLoader()
+    results, errors = BulkLoader(loader, max_workers=3, backoff=0.01).load_many(
+        TICKERS, 'load_company_earnings', callback=lambda ticker, result, error: done.append(ticker))
+
+    assert list(errors) == ['BBB']
+    assert sorted(results) == [ticker for ticker in TICKERS if ticker != 'BBB']
+    assert sorted(done) == TICKERS
+    # API errors are not retried
+    assert len([call for call in fake_api.calls if call['symbol'] == 'BBB']) == 1
+    assert loader.load_company_earnings('AAA').equals(results['AAA'])
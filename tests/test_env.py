@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def run_with_dotenv(tmp_path, dotenv, code, **environ):
+    """
+    Run `code` in a new interpreter configured by a `.env` file and `environ`.
+    """
+    (tmp_path / '.env').write_text(dotenv)
+    env = {name: value for name, value in os.environ.items() if not name.startswith('FIN_DATA_')}
+    env.update(environ)
+    env['PYTHONPATH'] = ROOT
+    result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+def test_metrics_are_enabled_from_dotenv(tmp_path):
+    code = 'from data_extraction.metrics import metrics; print(metrics.enabled)'
+    assert run_with_dotenv(tmp_path, 'FIN_DATA_METRICS=1\n', code) == 'True'
+
+
+def test_frame_cache_is_sized_from_dotenv(tmp_path):
+    code = 'from data_extraction.frame_cache import frame_cache; print(frame_cache.max_bytes)'
+    # Set in the environment, so reading it does not load .env on its own
+    assert run_with_dotenv(tmp_path, 'FIN_DATA_CACHE_MB=1\n', code, FIN_DATA_METRICS='0') == str(2 ** 20)
+
+
+def test_refresh_state_path_from_dotenv(tmp_path):
+    path = tmp_path / 'state.json'
+    code = ('from data_engineering.refresh import UniverseRefresh; '
+            'print(UniverseRefresh([], offline=True).state.path)')
+    assert run_with_dotenv(tmp_path, f'FIN_DATA_REFRESH_STATE_PATH={path}\n', code,
+                           FIN_DATA_METRICS='0', FIN_DATA_CACHE_MB='256',
+                           FIN_DATA_CALLS_PER_MINUTE='75') == str(path)
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+import ta
+
+from data_engineering.feature_engineering import FeatureEngineering
+from data_engineering.feature_registry import FeatureRegistry, commen_feature_registry
+from fake_alpha_vantage import synthetic_daily_prices
+
+
+def inline_commen_features(data):
+    # process_commen_features before the registry, one column at a time
+    data = data[::-1].copy()
+    close = data['adjusted_close']
+
+    data.loc[:, 'log_return'] = np.log(close / close.shift(1))
+    data.loc[:, 'volatility'] = data['log_return'].rolling(window=252).std() * np.sqrt(252)
+    data.loc[:, 'volatility_change'] = data['volatility'].diff()
+    data.loc[:, 'log_volume'] = np.log(data['volume'])
+    data.loc[:, 'daily_returns'] = close.diff()
+    data.loc[:, 'MA-5'] = close.rolling(window=5).mean()
+    data.loc[:, 'MA-30'] = close.rolling(window=30).mean()
+    data.loc[:, 'RSI'] = ta.momentum.RSIIndicator(close, window=14).rsi()
+    data.loc[:, '5-day_variance'] = close.rolling(window=5).var()
+    data.loc[:, 'Williams_%R'] = ta.momentum.WilliamsRIndicator(
+        high=data['high'], low=data['low'], close=close, lbp=14).williams_r()
+    data.loc[:, 'z_score'] = (close - close.rolling(window=10).mean()) / close.rolling(window=10).std()
+    data.loc[:, 'SMA10'] = close.rolling(window=10).mean()
+    data.loc[:, 'EMA12'] = close.ewm(span=12, adjust=False).mean()
+    data.loc[:, 'MACD'] = ta.trend.MACD(close=close, window_fast=12, window_slow=26).macd()
+    data.loc[:, 'RoC'] = ta.momentum.ROCIndicator(close=close, window=1).roc()
+    low_min = data['low'].rolling(window=15).min()
+    high_max = data['high'].rolling(window=15).max()
+    data.loc[:, 'K15'] = ((close - low_min) / (high_max - low_min)) * 100
+    data.loc[:, 'Bollinger_M'] = close.rolling(window=20).mean()
+    data.loc[:, 'Bollinger_U'] = data['Bollinger_M'] + 2 * close.rolling(window=20).std()
+    data.loc[:, 'Bollinger_L'] = data['Bollinger_M'] - 2 * close.rolling(window=20).std()
+    data.loc[:, 'MOM12'] = close - close.shift(12)
+
+    return data.iloc[::-1]
+
+
+@pytest.fixture(scope='module')
+def prices():
+    # Newest row first, as the pipeline reads the daily files
+    return synthetic_daily_prices('AAA', '2018-01-02', '2020-12-31').iloc[::-1]
+
+
+def test_registry_matches_the_inline_pipeline(prices):
+    result = FeatureEngineering(offline=True).process_commen_features(prices)
+    expected = inline_commen_features(prices)
+    assert list(result.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+
+def test_subset_computes_only_what_it_needs(prices):
+    result = FeatureEngineering(offline=True).process_commen_features(prices, ['Bollinger_U', 'MA-5'])
+    expected = inline_commen_features(prices)
+    assert list(result.columns) == list(prices.columns) + ['MA-5', 'Bollinger_U']
+    pd.testing.assert_frame_equal(result, expected[result.columns], check_exact=True)
+
+    plan = [feature.name for feature in commen_feature_registry.plan(['volatility_change'])]
+    assert plan == ['log_return', 'volatility', 'volatility_change']
+
+
+def test_unknown_and_circular_features_are_rejected():
+    registry = FeatureRegistry()
+    registry.register('a', inputs=['b'])(lambda ctx: ctx['b'])
+    registry.register('b', inputs=['a'])(lambda ctx: ctx['a'])
+
+    with pytest.raises(ValueError, match='Circular'):
+        registry.plan(['a'])
+    with pytest.raises(ValueError, match='Unknown'):
+        registry.plan(['c'])
+    with pytest.raises(ValueError, match='already registered'):
+        registry.register('a')(lambda ctx: ctx['x'])
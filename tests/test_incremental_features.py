@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from data_engineering.feature_engineering import FeatureEngineering
+from data_engineering.incremental_features import IncrementalFeatureEngine
+from fake_alpha_vantage import synthetic_daily_prices
+
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'adjusted_close']
+
+
+@pytest.fixture(scope='module', params=['random', 'flat'])
+def prices(request):
+    data = synthetic_daily_prices('AAA', '2018-01-02', '2020-12-31')
+    if request.param == 'flat':
+        # A halted stock, every rolling window over the stretch is constant
+        data.iloc[300:340, [data.columns.get_loc(column) for column in PRICE_COLUMNS]] = \
+            data['adjusted_close'].iloc[300]
+    return data
+
+
+def batch_features(data):
+    # The batch pipeline takes and returns the newest row first
+    return FeatureEngineering(offline=True).process_commen_features(data.iloc[::-1])
+
+
+def test_incremental_matches_batch(prices):
+    expected = batch_features(prices)
+    result = IncrementalFeatureEngine().update_frame(prices)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+
+@pytest.mark.parametrize('split', [10, 300, 320])
+def test_resumed_engine_matches_batch(prices, split, tmp_path):
+    # Split inside the first windows, after the longest one (252 bars) and
+    # inside the flat stretch
+    path = str(tmp_path / 'state.json')
+    engine = IncrementalFeatureEngine()
+    head = engine.update_frame(prices.iloc[:split])
+    engine.save(path)
+
+    engine = IncrementalFeatureEngine.load(path)
+    rows = [engine.update(date, bar) for date, bar in prices.iloc[split:split + 5].iterrows()]
+    middle = pd.DataFrame(rows, index=prices.index[split:split + 5]).iloc[::-1]
+    tail = engine.update_frame(prices.iloc[split + 5:])
+
+    result = pd.concat([tail, middle, head])
+    expected = batch_features(prices)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True, check_names=False, check_freq=False)
+
+    with pytest.raises(ValueError):
+        engine.update(prices.index[-1], prices.iloc[-1])
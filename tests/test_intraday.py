@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_extraction.fetch_financial_data import IntradayStockDataLoader
+from data_extraction.intraday import IntradayStore, resample_bars
+from fake_alpha_vantage import synthetic_intraday
+
+pytest.importorskip('pyarrow')
+
+
+MONTHS = ['2019-11', '2019-12', '2020-01', '2020-02', '2020-03']
+
+
+@pytest.fixture
+def loader(fake_api, tmp_path):
+    loader = IntradayStockDataLoader(interval='5min', store=IntradayStore(str(tmp_path / 'intraday')))
+    loader.now = pd.Timestamp('2020-03-16 12:00', tz='America/New_York')
+    return loader
+
+
+def fetched_months(fake_api):
+    return [call['month'] for call in fake_api.calls if call['function'] == 'TIME_SERIES_INTRADAY']
+
+
+def test_interrupted_ingestion_resumes(loader, fake_api, monkeypatch):
+    get_intraday_month = loader.get_intraday_month
+
+    def interrupted(ticker, month, **kwargs):
+        if month == '2020-01':
+            raise ConnectionError('connection reset')
+        return get_intraday_month(ticker, month, **kwargs)
+
+    monkeypatch.setattr(loader, 'get_intraday_month', interrupted)
+    with pytest.raises(ConnectionError):
+        loader.ingest_intraday_data('AAA', '2019-11', '2020-06')
+    assert loader.store.months('AAA', '5min') == ['2019-11', '2019-12']
+
+    monkeypatch.setattr(loader, 'get_intraday_month', get_intraday_month)
+    fake_api.calls.clear()
+    # The end month is capped at the current month, which stays incomplete
+    assert loader.ingest_intraday_data('AAA', '2019-11', '2020-06') == ['2020-01', '2020-02', '2020-03']
+    assert fetched_months(fake_api) == ['2020-01', '2020-02', '2020-03']
+    assert loader.store.complete_months('AAA', '5min') == set(MONTHS[:-1])
+
+    # The current month is fetched again, not served from the response cache
+    fake_api.calls.clear()
+    assert loader.ingest_intraday_data('AAA', '2019-11') == ['2020-03']
+    assert fetched_months(fake_api) == ['2020-03']
+
+    expected = pd.concat([synthetic_intraday('AAA', month, '5min') for month in MONTHS])
+    pd.testing.assert_frame_equal(loader.load_intraday_data('AAA', '2019-11-01', '2020-03-31'), expected,
+                                  check_names=False, check_freq=False)
+    window = loader.load_intraday_data('AAA', '2019-12-31 15:00', '2020-01-02')
+    pd.testing.assert_frame_equal(window, expected.loc['2019-12-31 15:00':'2020-01-02 23:59'],
+                                  check_names=False, check_freq=False)
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    store = IntradayStore(str(tmp_path_factory.mktemp('intraday')))
+    for month in MONTHS[:3]:
+        store.write_month('AAA', '1min', month, synthetic_intraday('AAA', month))
+    return store
+
+
+def full_resample(bars, rule):
+    resampler = bars.resample(rule, closed='left', label='left')
+    resampled = resampler.agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+    return resampled[resampler.size().values > 0]
+
+
+RULES = {'5m': '5min', '15m': '15min', '1h': '60min', 'daily': '1D', '90min': '90min'}
+
+
+@pytest.mark.parametrize('rule', RULES)
+def test_streamed_resample_matches_a_full_resample(store, rule):
+    expected = full_resample(store.read('AAA', '1min'), RULES[rule])
+    result = pd.concat(resample_bars(store.iter_months('AAA', '1min'), rule))
+    pd.testing.assert_frame_equal(result, expected, check_freq=False)
+
+    # Chunks cut in the middle of a day, and empty chunks
+    bars = store.read('AAA', '1min', '2019-11-12 10:03', '2020-01-15 11:17')
+    cuts = np.sort(np.random.default_rng(0).choice(len(bars), 12, replace=False))
+    chunks = [bars.iloc[start:stop] for start, stop in zip(np.r_[0, cuts], np.r_[cuts, len(bars)])]
+    chunks.insert(3, bars.iloc[:0])
+    result = pd.concat(resample_bars(chunks, rule))
+    pd.testing.assert_frame_equal(result, full_resample(bars, RULES[rule]), check_freq=False)
+
+
+def test_resampled_loader_reads_the_store(store, data_env):
+    loader = IntradayStockDataLoader(store=store, offline=True)
+    result = loader.load_resampled('AAA', '1h', '2019-12-02', '2019-12-06')
+    expected = full_resample(store.read('AAA', '1min', '2019-12-02', '2019-12-06'), '60min')
+    pd.testing.assert_frame_equal(result, expected, check_freq=False)
+    assert loader.load_resampled('AAA', '1h', '2021-01-01', '2021-01-31').empty
@@ -0,0 +1,84 @@
+import pytest
+
+from data_extraction.metrics import DEFAULT_BUCKETS, MetricsRegistry
+
+
+OBSERVED = [0.003, 0.2, 0.2, 100.0]
+
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry(enabled=True)
+    registry.inc('api_calls_total', function='TIME_SERIES_DAILY')
+    registry.inc('api_calls_total', 2, function='EARNINGS')
+    registry.inc('cache_hits_total')
+    for value in OBSERVED:
+        registry.observe('fetch_seconds', value, dataset='daily_stock', ticker='NVDA')
+    registry.observe('fetch_seconds', 0.5, dataset='daily_stock', ticker='BRK"B\\\n')
+    return registry
+
+
+def test_prometheus_text(registry):
+    buckets = [f'fin_data_fetch_seconds_bucket{{dataset="daily_stock",ticker="NVDA",le="{bound!r}"}} '
+               f'{sum(value <= bound for value in OBSERVED)}' for bound in DEFAULT_BUCKETS]
+    escaped = [f'fin_data_fetch_seconds_bucket{{dataset="daily_stock",ticker="BRK\\"B\\\\\\n",le="{bound!r}"}} '
+               f'{int(0.5 <= bound)}' for bound in DEFAULT_BUCKETS]
+    expected = [
+        '# TYPE fin_data_api_calls_total counter',
+        'fin_data_api_calls_total{function="EARNINGS"} 2',
+        'fin_data_api_calls_total{function="TIME_SERIES_DAILY"} 1',
+        '# TYPE fin_data_cache_hits_total counter',
+        'fin_data_cache_hits_total 1',
+        '# TYPE fin_data_fetch_seconds histogram',
+        *escaped,
+        'fin_data_fetch_seconds_bucket{dataset="daily_stock",ticker="BRK\\"B\\\\\\n",le="+Inf"} 1',
+        'fin_data_fetch_seconds_sum{dataset="daily_stock",ticker="BRK\\"B\\\\\\n"} 0.5',
+        'fin_data_fetch_seconds_count{dataset="daily_stock",ticker="BRK\\"B\\\\\\n"} 1',
+        *buckets,
+        'fin_data_fetch_seconds_bucket{dataset="daily_stock",ticker="NVDA",le="+Inf"} 4',
+        f'fin_data_fetch_seconds_sum{{dataset="daily_stock",ticker="NVDA"}} {sum(OBSERVED)!r}',
+        'fin_data_fetch_seconds_count{dataset="daily_stock",ticker="NVDA"} 4',
+    ]
+    assert registry.to_prometheus() == '\n'.join(expected) + '\n'
+
+
+def test_prometheus_client_parses_the_text(registry):
+    parser = pytest.importorskip('prometheus_client.parser')
+    families = {family.name: family for family in parser.text_string_to_metric_families(registry.to_prometheus())}
+
+    samples = {(sample.name, tuple(sorted(sample.labels.items()))): sample.value
+               for family in families.values() for sample in family.samples}
+    assert samples[('fin_data_api_calls_total', (('function', 'EARNINGS'),))] == 2
+    assert samples[('fin_data_fetch_seconds_count', (('dataset', 'daily_stock'), ('ticker', 'NVDA')))] == 4
+    assert samples[('fin_data_fetch_seconds_count', (('dataset', 'daily_stock'), ('ticker', 'BRK"B\\\n')))] == 1
+
+
+def test_snapshot_and_hooks(registry):
+    seen = []
+    registry.add_hook(lambda *args: seen.append(args))
+    registry.inc('cache_hits_total')
+    with registry.timer('decode_seconds', store='gzip'):
+        pass
+
+    snapshot = registry.snapshot()
+    assert snapshot['counters'][('cache_hits_total', ())] == 2
+    histogram = snapshot['histograms'][('fetch_seconds', (('dataset', 'daily_stock'), ('ticker', 'NVDA')))]
+    assert histogram['count'] == 4 and histogram['buckets'][0.25] == 3 and histogram['buckets'][60.0] == 3
+    assert [args[:2] for args in seen] == [('counter', 'cache_hits_total'), ('histogram', 'decode_seconds')]
+    assert seen[1][3] == {'store': 'gzip'}
+
+
+def test_disabled_registry_records_nothing(tmp_path):
+    registry = MetricsRegistry()
+    registry.inc('api_calls_total')
+    registry.observe('fetch_seconds', 1.0)
+    with registry.timer('decode_seconds'):
+        pass
+    assert registry.snapshot() == {'counters': {}, 'histograms': {}}
+
+    path = str(tmp_path / 'fin_data.prom')
+    registry.enable()
+    registry.inc('api_calls_total')
+    registry.write_prometheus(path)
+    assert open(path).read() == registry.to_prometheus()
+    assert list(tmp_path.iterdir()) == [tmp_path / 'fin_data.prom']
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_extraction.fetch_financial_data import DailyStockDataLoader
+from data_extraction.ohlcv_panel import OHLCVPanel, build_ohlcv_panel
+from fake_alpha_vantage import synthetic_daily_prices
+
+
+LISTINGS = {'AAA': '2018-01-02', 'BBB': '2018-01-02', 'CCC': '2019-07-01'}
+
+
+@pytest.fixture
+def loader(data_env):
+    loader = DailyStockDataLoader(offline=True)
+    for ticker, start in LISTINGS.items():
+        loader.store.write(ticker, synthetic_daily_prices(ticker, start, '2020-06-30'))
+    return loader
+
+
+def test_panel_matches_the_loader(loader, tmp_path):
+    panel = build_ohlcv_panel(loader.store, path=str(tmp_path / 'panel'))
+    assert panel.tickers == sorted(LISTINGS)
+
+    for ticker in LISTINGS:
+        expected = loader.load_daily_stock_data(ticker, '2018-01-01', '2020-06-30').iloc[::-1]
+        pd.testing.assert_frame_equal(panel.frame(ticker)[expected.columns], expected,
+                                      check_freq=False, check_names=False)
+
+        window = loader.load_daily_stock_data(ticker, '2019-06-01', '2019-12-31').iloc[::-1]
+        pd.testing.assert_frame_equal(panel.frame(ticker, '2019-06-01', '2019-12-31')[window.columns],
+                                      window, check_freq=False, check_names=False)
+
+    # The late listing has no bars before its first date
+    late = panel.ticker('CCC', end_date='2019-06-28')
+    assert len(late) > 0 and np.isnan(late).all()
+    close = panel.field('adjusted_close')
+    assert close.shape == (3, len(panel.dates))
+    assert np.isnan(close[panel.ticker_position('CCC'), 0])
+
+
+def test_rebuild_swaps_the_data_file(loader, tmp_path):
+    path = str(tmp_path / 'panel')
+    first = build_ohlcv_panel(loader.store, path=path, tickers=['AAA'])
+    assert first.tickers == ['AAA']
+
+    second = build_ohlcv_panel(loader.store, path=path, dtype=np.float32)
+    assert second.data.dtype == np.float32
+    assert OHLCVPanel.open(path).tickers == sorted(LISTINGS)
+    np.testing.assert_array_equal(second.frame('AAA')['close'].to_numpy(),
+                                  first.frame('AAA')['close'].to_numpy(np.float32))
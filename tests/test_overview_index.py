@@ -0,0 +1,57 @@
+import os
+
+import pandas as pd
+
+from data_extraction.overview_index import OverviewIndex
+from fake_alpha_vantage import synthetic_overview
+
+
+def overviews(n):
+    rows = [synthetic_overview(f'T{i:03d}') for i in range(n)]
+    for i, row in enumerate(rows):
+        row['LatestQuarter'] = (pd.Timestamp('2023-03-31') + pd.offsets.QuarterEnd(i % 6)).strftime('%Y-%m-%d')
+    return rows
+
+
+def test_screen_matches_a_pandas_filter(tmp_path):
+    index = OverviewIndex(str(tmp_path / 'index.parquet'))
+    index.update(overviews(60))
+    table = index.frame()
+
+    found = index.screen(Sector='TECHNOLOGY', MarketCapitalization=(1e10, None))
+    expected = table[(table['Sector'] == 'TECHNOLOGY') & (table['MarketCapitalization'] >= 1e10)]
+    assert found == sorted(expected.index)
+
+
+def test_screen_date_fields(tmp_path):
+    index = OverviewIndex(str(tmp_path / 'index.parquet'))
+    index.update(overviews(60))
+    table = index.frame()
+
+    expected = sorted(table.index[table['LatestQuarter'] >= '2024-01-01'])
+    assert expected
+    assert index.screen(LatestQuarter=('2024-01-01', None)) == expected
+    assert index.screen(LatestQuarter=(pd.Timestamp('2024-01-01'), None)) == expected
+
+
+def test_overviews_without_symbol_are_skipped(tmp_path):
+    index = OverviewIndex(str(tmp_path / 'index.parquet'))
+    index.update([{}])
+    index.update([{'Information': 'Invalid API call.'}] + overviews(1))
+    assert index.tickers() == ['T000']
+
+
+def test_updates_are_kept_in_the_delta_file(tmp_path):
+    path = str(tmp_path / 'index.parquet')
+    index = OverviewIndex(path, max_delta_rows=25)
+    for overview in overviews(40):
+        index.update([overview])
+    # The table was rewritten once the delta held 25 overviews
+    assert os.path.exists(path)
+
+    reloaded = OverviewIndex(path)
+    pd.testing.assert_frame_equal(reloaded.frame(), index.frame())
+
+    index.save()
+    assert not os.path.exists(index.delta_path)
+    pd.testing.assert_frame_equal(OverviewIndex(path).frame(), index.frame())
@@ -0,0 +1,64 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_engineering.feature_engineering import FeatureEngineering
+from data_engineering.panel_features import PANEL_FEATURES, align_panel, compute_panel_features
+from fake_alpha_vantage import synthetic_daily_prices
+
+
+# Tickers listed on different dates, the later ones have leading NaNs in the panel
+LISTINGS = {'AAA': '2016-01-04', 'BBB': '2017-03-15', 'CCC': '2019-06-03'}
+
+
+@pytest.fixture(scope='module')
+def frames():
+    return {ticker: synthetic_daily_prices(ticker, start, '2020-12-31') for ticker, start in LISTINGS.items()}
+
+
+@pytest.fixture(scope='module')
+def panel(frames):
+    return align_panel(frames)
+
+
+@pytest.mark.parametrize('block_size', [1, 256])
+def test_panel_matches_per_ticker_features(frames, panel, block_size):
+    dates, tickers, arrays = panel
+    features = compute_panel_features(
+        arrays['adjusted_close'], arrays['high'], arrays['low'], arrays['volume'], block_size=block_size)
+    engineering = FeatureEngineering(offline=True)
+
+    for j, ticker in enumerate(tickers):
+        expected = engineering.process_commen_features(frames[ticker].iloc[::-1]).iloc[::-1]
+        listed = dates.isin(expected.index)
+        assert np.isnan(features['log_return'][~listed, j]).all()
+        for name in PANEL_FEATURES:
+            np.testing.assert_allclose(features[name][listed, j], expected[name].to_numpy(),
+                                       rtol=1e-7, atol=1e-9, err_msg=f'{ticker} {name}')
+
+
+def test_float32_rounds_the_float64_features(panel):
+    _, _, arrays = panel
+    inputs = [arrays[field] for field in ('adjusted_close', 'high', 'low', 'volume')]
+    features = compute_panel_features(*inputs)
+    features32 = compute_panel_features(*inputs, dtype=np.float32)
+    for name in PANEL_FEATURES:
+        assert features32[name].dtype == np.float32
+        np.testing.assert_array_equal(features32[name], features[name].astype(np.float32))
+
+
+def test_float32_halves_the_peak_memory():
+    rng = np.random.default_rng(0)
+    close = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, (100, 1024)), axis=0)).astype(np.float32)
+    volume = rng.integers(1000, 100000, close.shape).astype(np.float32)
+
+    peaks = {}
+    for dtype in (np.float64, np.float32):
+        tracemalloc.start()
+        # Small blocks, so the outputs dominate the peak
+        compute_panel_features(close, close * 1.01, close * 0.99, volume, dtype=dtype, block_size=32)
+        peaks[dtype] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    assert peaks[np.float32] < 0.6 * peaks[np.float64]
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_extraction.point_in_time import merge_earnings, point_in_time_panel
+
+
+def make_earnings(dates, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.DatetimeIndex(dates, name='fiscalDateEnding')
+    return pd.DataFrame({
+        'reportedDate': dates + pd.Timedelta(days=30),
+        'reportedEPS': rng.normal(1, 0.5, len(dates)).round(2),
+        'estimatedEPS': rng.normal(1, 0.5, len(dates)).round(2),
+    }, index=dates)
+
+
+def make_report(dates, seed=1):
+    rng = np.random.default_rng(seed)
+    dates = pd.DatetimeIndex(dates, name='fiscalDateEnding')
+    return pd.DataFrame({
+        'reportedCurrency': 'USD',
+        'totalRevenue': rng.integers(10**6, 10**9, len(dates)).astype(float),
+    }, index=dates)
+
+
+def loop_merge(report, earnings):
+    # init_financial_reports before the vectorized merge
+    report = report.copy()
+    for col in earnings.columns:
+        if col not in report.columns:
+            report[col] = None
+
+    for index, row in report.iterrows():
+        rounded_index = index + pd.offsets.MonthEnd(0)
+        if rounded_index in earnings.index:
+            report.loc[index, earnings.columns] = earnings.loc[rounded_index].values
+        else:
+            rounded_index = index + pd.offsets.MonthEnd(-1)
+            if rounded_index in earnings.index:
+                report.loc[index, earnings.columns] = earnings.loc[rounded_index].values
+    return report
+
+
+def nearest_merge(report, earnings, tolerance):
+    # The loop, then every unmatched row takes the nearest earnings date
+    merged = loop_merge(report, earnings)
+    tolerance = pd.Timedelta(tolerance)
+    for index in merged.index[merged['reportedEPS'].isna()]:
+        distance = abs(earnings.index - index)
+        if distance.min() <= tolerance:
+            merged.loc[index, earnings.columns] = earnings.iloc[distance.argmin()].values
+    return merged
+
+
+def assert_same_values(result, expected):
+    # The loop filled object columns, the merge keeps the earnings dtypes
+    pd.testing.assert_frame_equal(result, expected.astype(result.dtypes.to_dict()), check_exact=True)
+
+
+QUARTER_ENDS = pd.date_range('2015-03-31', '2020-12-31', freq='Q')
+
+
+@pytest.mark.parametrize('report_dates', [
+    QUARTER_ENDS,
+    # Fiscal dates a few days before or after the month end
+    QUARTER_ENDS - pd.Timedelta(days=3),
+    QUARTER_ENDS + pd.Timedelta(days=2),
+    # Reports without earnings, at the start and in the middle
+    pd.date_range('2014-03-31', '2020-12-31', freq='Q').delete([10]),
+])
+def test_merge_matches_the_row_loop(report_dates):
+    earnings = make_earnings(QUARTER_ENDS.delete([12]))
+    report = make_report(report_dates)
+
+    result = merge_earnings(report, earnings)
+    assert_same_values(result, loop_merge(report, earnings))
+    assert result['reportedEPS'].dtype == np.float64
+    assert result['reportedDate'].dtype == 'datetime64[ns]'
+
+
+def test_tolerance_fallback_takes_the_nearest_date():
+    # 52-53 week fiscal years end on the last Saturday of the quarter
+    earnings = make_earnings(pd.DatetimeIndex(['2019-03-30', '2019-06-29', '2019-09-28', '2019-12-28']))
+    report = make_report(pd.DatetimeIndex(['2019-03-30', '2019-07-04', '2019-09-28', '2019-12-10', '2020-01-05']))
+
+    # Month ends only: nothing matches
+    assert merge_earnings(report, earnings)['reportedEPS'].isna().all()
+
+    result = merge_earnings(report, earnings, tolerance='10D')
+    assert_same_values(result, nearest_merge(report, earnings, '10D'))
+    # 2019-12-10 is 18 days from the nearest fiscal date
+    assert result['reportedEPS'].isna().tolist() == [False, False, False, True, False]
+
+
+def test_month_end_match_wins_over_a_nearer_date():
+    earnings = make_earnings(pd.DatetimeIndex(['2019-06-25', '2019-06-30']))
+    report = make_report(pd.DatetimeIndex(['2019-06-24']))
+    result = merge_earnings(report, earnings, tolerance='10D')
+    assert result['reportedEPS'].iloc[0] == earnings.loc['2019-06-30', 'reportedEPS']
+
+
+def test_panel_matches_merge_per_ticker():
+    earnings = {'AAA': make_earnings(QUARTER_ENDS, seed=2),
+                'BBB': make_earnings(QUARTER_ENDS - pd.Timedelta(days=4), seed=3),
+                'CCC': make_earnings([])}
+    reports = {}
+    for i, ticker in enumerate(earnings):
+        reports[(ticker, 'BALANCE_SHEET')] = make_report(QUARTER_ENDS - pd.Timedelta(days=4), seed=10 + i)
+        reports[(ticker, 'CASH_FLOW')] = make_report(QUARTER_ENDS[4:], seed=20 + i)
+
+    panel = point_in_time_panel(reports, earnings, tolerance='10D')
+    for (ticker, report_type), report in reports.items():
+        expected = merge_earnings(report, earnings[ticker], tolerance='10D')
+        pd.testing.assert_frame_equal(panel.loc[(ticker, report_type)], expected,
+                                      check_names=False, check_freq=False)
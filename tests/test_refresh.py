@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from data_engineering.feature_engineering import FeatureEngineering
+from data_engineering.refresh import API_STAGES, UniverseRefresh
+
+
+TICKERS = ['AAA', 'BBB', 'CCC', 'DDD', 'EEE']
+
+
+def test_budget_admits_tickers_by_priority(fake_api):
+    # A new ticker costs one call per API stage, 12 calls admit two tickers
+    refresh = UniverseRefresh(TICKERS, priorities={'CCC': 5}, max_calls=12, max_workers=2)
+    state = refresh.run()
+
+    assert state.status == 'partial'
+    for stage in API_STAGES:
+        assert state.plan[stage] == ['CCC', 'AAA']
+        assert state.deferred[stage] == ['BBB', 'DDD', 'EEE']
+    assert state.plan['features'] == ['CCC', 'AAA']
+    assert len(fake_api.calls) == 2 * len(API_STAGES)
+
+
+def test_interrupted_run_resumes_without_api_calls(fake_api, data_env, monkeypatch):
+    refresh_features = FeatureEngineering.refresh_commen_features
+    refreshed = []
+
+    def interrupted(self, ticker):
+        if len(refreshed) == 2:
+            raise KeyboardInterrupt
+        refreshed.append(ticker)
+        return refresh_features(self, ticker)
+
+    monkeypatch.setattr(FeatureEngineering, 'refresh_commen_features', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        UniverseRefresh(TICKERS, max_workers=2).run()
+    monkeypatch.setattr(FeatureEngineering, 'refresh_commen_features', refresh_features)
+
+    with open(data_env / 'refresh_state.json') as f:
+        saved = json.load(f)
+    assert saved['status'] == 'running'
+    assert saved['done']['features'] == sorted(refreshed)
+    calls = len(fake_api.calls)
+    assert calls == len(TICKERS) * len(API_STAGES)
+
+    # The prices and reports are done, only the remaining features are computed
+    state = UniverseRefresh(TICKERS, max_workers=2).run()
+    assert state.status == 'complete'
+    assert state.done['features'] == set(TICKERS)
+    assert len(fake_api.calls) == calls
+
+    # Everything is fresh, a new run plans nothing
+    state = UniverseRefresh(TICKERS).run()
+    assert state.status == 'complete'
+    assert not any(state.plan.values())
+    assert len(fake_api.calls) == calls
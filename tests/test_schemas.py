@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import fake_alpha_vantage
+from data_extraction.fetch_financial_data import FundamentalDataLoader
+from data_extraction.schemas import EARNINGS_SCHEMA
+from fake_alpha_vantage import synthetic_earnings
+
+
+def test_float32_earnings_are_stored_at_full_precision(fake_api, data_env, monkeypatch):
+    def precise_earnings(ticker, **kwargs):
+        payload = synthetic_earnings(ticker, **kwargs)
+        for i, row in enumerate(payload['quarterlyEarnings']):
+            # More significant digits than float32 holds
+            row['surprisePercentage'] = f'{1234.56789012 + i:.8f}'
+        return payload
+
+    monkeypatch.setattr(fake_alpha_vantage, 'synthetic_earnings', precise_earnings)
+    loader = FundamentalDataLoader()
+    earnings = loader.load_company_earnings('AAA', update=True, float32=True)
+    assert earnings['surprisePercentage'].dtype == np.float32
+
+    path = os.path.join(str(data_env / 'earnings'), 'AAA_quarterly_earnings.gz')
+    stored = pd.read_csv(path, index_col='fiscalDateEnding')['surprisePercentage']
+    expected = [1234.56789012 + i for i in range(len(stored))]
+    np.testing.assert_allclose(stored.to_numpy(), expected, rtol=0, atol=1e-8)
+
+
+def test_read_csv_matches_apply(tmp_path):
+    raw = pd.DataFrame(synthetic_earnings('AAA')['quarterlyEarnings'])
+    raw.loc[0, 'estimatedEPS'] = 'None'
+    typed = EARNINGS_SCHEMA.apply(raw).set_index('fiscalDateEnding')
+    path = str(tmp_path / 'earnings.gz')
+    typed.to_csv(path, compression='gzip')
+
+    pd.testing.assert_frame_equal(EARNINGS_SCHEMA.read_csv(path), typed, check_categorical=False)
+    assert np.isnan(typed['estimatedEPS'].iloc[0])
@@ -0,0 +1,138 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from data_extraction import storage
+from data_extraction.storage import Compactor, GzipCsvStore, PartitionedStore, get_daily_stock_store
+from fake_alpha_vantage import synthetic_daily_prices
+
+pytest.importorskip('pyarrow')
+
+
+def stores(tmp_path):
+    return [GzipCsvStore(str(tmp_path / 'gzip')), PartitionedStore(str(tmp_path / 'parquet'))]
+
+
+@pytest.mark.parametrize('number', [0, 1])
+def test_append_then_compact_keeps_the_history(tmp_path, number):
+    (tmp_path / 'gzip').mkdir()
+    store = stores(tmp_path)[number]
+    history = synthetic_daily_prices('AAA', '2018-01-02', '2021-06-30')
+    store.write('AAA', history.iloc[:-30])
+    for start in range(-30, 0, 10):
+        store.append('AAA', history.iloc[start:start + 10 or None])
+    assert store.pending_segments('AAA') == 3
+
+    pd.testing.assert_frame_equal(store.read('AAA'), history, check_freq=False)
+    store.compact('AAA')
+    assert store.pending_segments('AAA') == 0
+    pd.testing.assert_frame_equal(store.read('AAA'), history, check_freq=False)
+
+
+def test_concurrent_compactions(tmp_path):
+    root = str(tmp_path / 'parquet')
+    history = synthetic_daily_prices('AAA', '2018-01-02', '2021-06-30')
+    PartitionedStore(root).write('AAA', history.iloc[:-20])
+    for day in range(-20, 0):
+        PartitionedStore(root).append('AAA', history.iloc[[day]])
+
+    # A Compactor and an explicit call, each with its own store instance
+    errors = []
+    compactor = Compactor(PartitionedStore(root), max_segments=1)
+
+    def run(compact):
+        try:
+            compact()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(compactor.run_once,)),
+               threading.Thread(target=run, args=(lambda: PartitionedStore(root).compact('AAA'),))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    pd.testing.assert_frame_equal(PartitionedStore(root).read('AAA'), history, check_freq=False)
+
+
+def test_compactor_is_started_from_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv('FIN_DATA_COMPACT_INTERVAL', '3600')
+    monkeypatch.setattr(storage, '_compactors', {})
+    store = get_daily_stock_store('parquet', root=str(tmp_path))
+    again = get_daily_stock_store('parquet', root=str(tmp_path))
+
+    assert len(storage._compactors) == 1
+    compactor = next(iter(storage._compactors.values()))
+    assert compactor._thread.is_alive()
+    assert compactor.store.root == store.root == again.root
+    compactor.stop()
+
+
+def test_reads_during_compaction(tmp_path):
+    root = str(tmp_path / 'parquet')
+    history = synthetic_daily_prices('AAA', '2018-01-02', '2021-06-30')
+    errors = []
+
+    for _ in range(3):
+        PartitionedStore(root).write('AAA', history.iloc[:-20])
+        for day in range(-20, 0):
+            PartitionedStore(root).append('AAA', history.iloc[[day]])
+        compacted = threading.Event()
+
+        def read():
+            store = PartitionedStore(root)
+            while not compacted.is_set():
+                try:
+                    assert len(store.read('AAA')) == len(history)
+                    store.last_date('AAA')
+                except Exception as e:
+                    errors.append(e)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        PartitionedStore(root).compact('AAA')
+        compacted.set()
+        for reader in readers:
+            reader.join()
+
+    assert errors == []
+
+
+@pytest.mark.parametrize('number', [0, 1])
+def test_empty_append_writes_nothing(tmp_path, number):
+    (tmp_path / 'gzip').mkdir()
+    store = stores(tmp_path)[number]
+    history = synthetic_daily_prices('AAA', '2018-01-02', '2021-06-30')
+    store.write('AAA', history)
+    version = store.version('AAA')
+
+    store.append('AAA', history.iloc[:0])
+    assert store.pending_segments('AAA') == 0
+    assert store.version('AAA') == version
+
+
+def test_report_init_goes_through_the_store(fake_api, monkeypatch):
+    from data_extraction.fetch_financial_data import FundamentalDataLoader
+
+    monkeypatch.setenv('FIN_DATA_COMPACT_INTERVAL', '3600')
+    monkeypatch.setattr(storage, '_compactors', {})
+    loader = FundamentalDataLoader()
+    store = loader.report_store
+    compactor = next(iter(storage._compactors.values()))
+    assert compactor.store is store
+    compactor.stop()
+
+    name = 'AAA_quarterly_income_statement'
+    loader.init_financial_reports('AAA', 'quarterly', 'income_statement')
+    report = store.read(name)
+    store.append(name, report.iloc[-1:])
+    assert store.pending_segments(name) == 1
+
+    # A new init rewrites the whole file, the old segment count goes with it
+    loader.init_financial_reports('AAA', 'quarterly', 'income_statement')
+    assert store.pending_segments(name) == 0
+    pd.testing.assert_frame_equal(store.read(name), report)
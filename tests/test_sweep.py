@@ -0,0 +1,76 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from backtest.sweep import (SharedArrays, parameter_grid, run_sweep, sma_cross_strategy, walk_forward,
+                            walk_forward_splits)
+from backtest.vectorized import run_backtest
+from fake_alpha_vantage import synthetic_daily_prices
+
+
+TICKERS = ['AAA', 'BBB', 'CCC']
+
+
+@pytest.fixture(scope='module')
+def arrays():
+    frames = [synthetic_daily_prices(ticker, '2016-01-04', '2019-12-31') for ticker in TICKERS]
+    return {field: np.column_stack([frame[field].to_numpy() for frame in frames])
+            for field in ('open', 'close')}
+
+
+GRID = parameter_grid(period=[10, 20, 30], stake=[50, 100])
+
+
+def assert_same_stats(left, right):
+    assert left.keys() == right.keys()
+    for name in left:
+        np.testing.assert_array_equal(left[name], right[name], err_msg=name)
+
+
+def by_task(records):
+    return sorted(records, key=lambda record: record['task'])
+
+
+def test_pool_matches_inline(arrays):
+    windows = [train for train, _ in walk_forward_splits(len(arrays['close']), 250, 60, step=200)]
+    inline = list(run_sweep(sma_cross_strategy, arrays, GRID, windows, processes=1))
+    pooled = by_task(run_sweep(sma_cross_strategy, arrays, GRID, windows, processes=2, chunksize=2))
+
+    assert [record['task'] for record in pooled] == list(range(len(GRID) * len(windows)))
+    for left, right in zip(inline, pooled):
+        assert (left['params'], left['window']) == (right['params'], right['window'])
+        assert_same_stats(left['stats'], right['stats'])
+
+
+def test_sweep_matches_a_direct_backtest(arrays):
+    records = by_task(run_sweep(sma_cross_strategy, arrays, GRID, processes=2, commission=0.002))
+    for record, params in zip(records, GRID):
+        positions = sma_cross_strategy(arrays, **params)
+        expected = run_backtest(arrays['open'], arrays['close'], positions, commission=0.002)
+        assert record['params'] == params
+        assert_same_stats(record['stats'], expected.stats)
+
+
+def test_walk_forward_pool_matches_inline(arrays):
+    splits = walk_forward_splits(len(arrays['close']), 250, 60, step=120)
+    inline = walk_forward(sma_cross_strategy, arrays, GRID, splits, processes=1)
+    pooled = walk_forward(sma_cross_strategy, arrays, GRID, splits, processes=2)
+
+    assert len(inline) == len(pooled) == len(splits)
+    for left, right in zip(inline, pooled):
+        assert (left['train'], left['test'], left['params']) == (right['train'], right['test'], right['params'])
+        assert_same_stats(left['test_stats'], right['test_stats'])
+
+
+def test_shared_arrays_are_released(arrays):
+    with SharedArrays(arrays) as shared:
+        names = [block.name for block in shared.blocks.values()]
+        attached, blocks = SharedArrays.attach(shared.spec)
+        np.testing.assert_array_equal(attached['close'], arrays['close'])
+        for block in blocks.values():
+            block.close()
+
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_extraction.trading_calendar import TradingCalendar
+
+mcal = pytest.importorskip('pandas_market_calendars')
+
+
+START, END = '2019-01-01', '2021-12-31'
+
+
+@pytest.fixture(scope='module')
+def schedule():
+    return mcal.get_calendar('NYSE').schedule(start_date=START, end_date=END)
+
+
+@pytest.fixture(scope='module')
+def calendar():
+    return TradingCalendar('NYSE', START, END)
+
+
+RANGES = [('2019-01-01', '2019-01-31'), ('2019-12-20', '2020-01-06'), ('2020-03-07', '2020-03-08'),
+          ('2020-11-25', '2020-11-30'), ('2021-07-02', '2021-07-06'), (START, END)]
+
+
+@pytest.mark.parametrize('start, end', RANGES)
+def test_sessions_between(calendar, start, end):
+    expected = mcal.get_calendar('NYSE').schedule(start_date=start, end_date=end)
+    assert list(calendar.sessions_between(start, end)) == list(expected.index)
+    assert calendar.count_sessions(start, end) == len(expected)
+
+
+def last_completed(schedule, now):
+    closed = schedule[schedule['market_close'] <= now]
+    return closed.index[-1] if len(closed) else pd.NaT
+
+
+@pytest.mark.parametrize('now', [
+    '2020-03-09 15:59', '2020-03-09 16:00', '2020-03-09 16:01',
+    '2020-03-07 12:00',                    # Saturday
+    '2019-11-29 12:59', '2019-11-29 13:00',  # Early close after Thanksgiving
+    '2020-12-25 10:00',                    # Holiday
+    '2021-01-04 09:30',
+])
+def test_last_completed_session(calendar, schedule, now):
+    now = pd.Timestamp(now, tz='America/New_York')
+    assert calendar.last_completed_session(now) == last_completed(schedule, now)
+    assert calendar.last_completed_session(now.tz_convert('UTC')) == last_completed(schedule, now)
+
+
+def is_stale(schedule, last_date, now):
+    # The rule update_daily_stock_data applied with a schedule per ticker
+    count = len(schedule.loc[last_date:now.normalize().tz_localize(None)])
+    return count > 2 or (count == 2 and now.time() >= pd.Timestamp('16:30').time())
+
+
+@pytest.mark.parametrize('now', ['2020-03-10 09:00', '2020-03-10 17:00', '2020-03-14 12:00',
+                                 '2020-12-28 16:29', '2020-12-28 16:31'])
+def test_stale_mask(calendar, schedule, now):
+    now = pd.Timestamp(now, tz='America/New_York')
+    last_dates = pd.bdate_range(now.normalize().tz_localize(None) - pd.Timedelta(days=10),
+                                now.normalize().tz_localize(None))
+    expected = [is_stale(schedule, date, now) for date in last_dates]
+    assert list(calendar.stale_mask(last_dates, now)) == expected
+    assert [calendar.is_stale(date, now) for date in last_dates] == expected
+    assert calendar.stale_mask([pd.NaT], now).tolist() == [True]
+
+
+def test_index_is_cached_on_disk(tmp_path, monkeypatch):
+    built = TradingCalendar('NYSE', START, END, cache_path=str(tmp_path))
+    assert (tmp_path / 'NYSE.npz').exists()
+
+    def no_schedule(name):
+        raise AssertionError('the cached index should be used')
+
+    monkeypatch.setattr(mcal, 'get_calendar', no_schedule)
+    cached = TradingCalendar('NYSE', '2020-01-01', '2020-12-31', cache_path=str(tmp_path))
+    np.testing.assert_array_equal(cached.sessions, built.sessions)
+    np.testing.assert_array_equal(cached.closes, built.closes)
+
+    # Rebuilt when the cached range does not cover the request, or after an upgrade
+    with pytest.raises(AssertionError):
+        TradingCalendar('NYSE', START, '2022-06-30', cache_path=str(tmp_path))
+    monkeypatch.setattr(TradingCalendar, '_calendar_version', staticmethod(lambda: 'upgraded'))
+    with pytest.raises(AssertionError):
+        TradingCalendar('NYSE', START, END, cache_path=str(tmp_path))
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.vectorized import _round, backtest_frame, run_backtest, sma_cross_positions
+from fake_alpha_vantage import synthetic_daily_prices
+
+bt = pytest.importorskip('backtrader')
+
+
+@pytest.fixture
+def daily():
+    data = synthetic_daily_prices('NVDA', '2015-01-02', '2019-12-31')
+    # Dividends make the adjustment factor drift, so adjusted prices differ from raw ones
+    factor = np.exp(np.linspace(-0.3, 0.0, len(data)))
+    data['adjusted_close'] = (data['close'] * factor).round(4)
+    return data
+
+
+def backtrader_values(data, path, round_prices):
+    """
+    Broker value per bar of the notebook strategy in tests/backtrader_test.ipynb.
+    """
+    yahoo = pd.DataFrame({
+        'Date': data.index.strftime('%Y-%m-%d'), 'Open': data['open'], 'High': data['high'],
+        'Low': data['low'], 'Close': data['close'], 'Adj Close': data['adjusted_close'],
+        'Volume': data['volume']})
+    yahoo.iloc[::-1].to_csv(path, index=False)
+
+    class SmaStrategy(bt.Strategy):
+        def __init__(self):
+            # The notebook uses bt.talib.SMA, which needs TA-Lib, the values are the same
+            self.sma = bt.indicators.SMA(self.data.close, period=25)
+            self.order = None
+            self.values = []
+
+        def notify_order(self, order):
+            if order.status not in [order.Submitted, order.Accepted]:
+                self.order = None
+
+        def prenext(self):
+            self.values.append(self.broker.getvalue())
+
+        def next(self):
+            self.values.append(self.broker.getvalue())
+            if self.order:
+                return
+            if not self.position:
+                if self.data.close[0] > self.sma[0]:
+                    self.order = self.buy()
+            elif self.data.close[0] < self.sma[0]:
+                self.order = self.sell()
+
+    cerebro = bt.Cerebro()
+    cerebro.adddata(bt.feeds.YahooFinanceCSVData(dataname=str(path), reverse=True, round=round_prices))
+    cerebro.addstrategy(SmaStrategy)
+    cerebro.broker.setcash(100000.0)
+    cerebro.addsizer(bt.sizers.FixedSize, stake=50)
+    cerebro.broker.setcommission(commission=0.001)
+    strategy = cerebro.run(maxcpus=1)[0]
+    return np.array(strategy.values)
+
+
+@pytest.mark.parametrize('round_prices, decimals', [(True, 2), (False, None)])
+def test_backtest_frame_matches_backtrader(daily, tmp_path, round_prices, decimals):
+    expected = backtrader_values(daily, tmp_path / 'NVDA.csv', round_prices)
+
+    result = backtest_frame(daily.iloc[::-1], sma_cross_positions, decimals=decimals)
+
+    assert len(result.equity) == len(expected)
+    np.testing.assert_allclose(result.equity, expected, rtol=0, atol=1e-6)
+
+
+def test_rounding_changes_the_result(daily):
+    rounded = backtest_frame(daily, sma_cross_positions)
+    exact = backtest_frame(daily, sma_cross_positions, decimals=None)
+    assert rounded.stats['final_value'] != exact.stats['final_value']
+
+
+def test_run_backtest_fills_at_next_open():
+    open_prices = np.array([10., 11., 12., 13.])
+    close = np.array([10.5, 11.5, 12.5, 13.5])
+    positions = np.array([1., 1., 0., 0.])
+
+    result = run_backtest(open_prices, close, positions, cash=100., commission=0.)
+
+    np.testing.assert_array_equal(result.positions[:, 0], [0., 1., 1., 0.])
+    np.testing.assert_allclose(result.equity, [100., 100.5, 101.5, 102.])
+    np.testing.assert_allclose(result.trade_pnls, [2.])
+
+
+@pytest.mark.parametrize('decimals', [0, 2, 4])
+def test_round_matches_python_round(decimals):
+    rng = np.random.default_rng(0)
+    values = np.concatenate([
+        np.round(rng.lognormal(3, 2, 5000), 6),
+        # Halves at the rounding position, most of them just off a half in binary
+        (rng.integers(-10**6, 10**6, 5000) + 0.5) / 10 ** rng.integers(0, 6, 5000),
+        [0.225, 48.535, 1.005, 0.125, -0.125, 2.5, -0.001, 0.0, np.nan, np.inf, 1e300, 2.0 ** 53],
+    ])
+    values = np.concatenate([values, np.nextafter(values, np.inf), np.nextafter(values, -np.inf)])
+
+    expected = np.array([round(value, decimals) for value in values.tolist()])
+    result = _round(values, decimals)
+    np.testing.assert_array_equal(result, expected)
+    np.testing.assert_array_equal(np.signbit(result), np.signbit(expected))
@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_engineering.windowed_dataset import WindowedDataset
+
+
+COLUMNS = ['a', 'b', 'target']
+
+
+@pytest.fixture
+def arrays():
+    rng = np.random.default_rng(0)
+    arrays = {'AAA': rng.normal(size=(60, 3)), 'BBB': rng.normal(size=(45, 3)), 'CCC': rng.normal(size=(4, 3))}
+    arrays['AAA'][:7, 0] = np.nan  # warm-up rows
+    arrays['AAA'][30, 1] = np.nan
+    arrays['BBB'][20, 2] = np.nan  # missing target
+    return arrays
+
+
+def naive_samples(arrays, lookback, horizon, stride):
+    samples = []
+    for ticker, values in arrays.items():
+        for end in range(lookback - 1, len(values) - horizon, stride):
+            window = values[end - lookback + 1:end + 1]
+            target = values[end + horizon, 2]
+            if not np.isnan(window).any() and not np.isnan(target):
+                samples.append((ticker, end, window[:, :2].copy(), target))
+    return samples
+
+
+@pytest.mark.parametrize('lookback, horizon, stride', [(5, 1, 1), (10, 3, 2)])
+def test_windows_and_targets_match_a_naive_copy(arrays, lookback, horizon, stride):
+    dataset = WindowedDataset(arrays, COLUMNS, lookback, horizon=horizon, target='target',
+                              normalize=None, stride=stride, dtype=np.float64)
+    expected = naive_samples(arrays, lookback, horizon, stride)
+
+    assert len(dataset) == len(expected)
+    x, y = dataset.batch(np.arange(len(dataset)))
+    for i, (ticker, end, window, target) in enumerate(expected):
+        assert dataset.sample(i) == (ticker, end)
+        np.testing.assert_array_equal(dataset.window(i), window)
+        np.testing.assert_array_equal(x[i], window)
+        assert y[i] == target
+
+
+def test_batches_cover_every_sample_once(arrays):
+    dataset = WindowedDataset(arrays, COLUMNS, 5, target='target', normalize=None, dtype=np.float64)
+    x, y = dataset.batch(np.arange(len(dataset)))
+
+    seen = []
+    sizes = []
+    for batch_x, batch_y in dataset.batches(batch_size=7, seed=0):
+        sizes.append(len(batch_y))
+        seen.extend(sample.tobytes() + target.tobytes() for sample, target in zip(batch_x, batch_y))
+    assert sorted(seen) == sorted(sample.tobytes() + target.tobytes() for sample, target in zip(x, y))
+    assert sizes[:-1] == [7] * (len(sizes) - 1)
+
+    assert sum(len(batch_y) for _, batch_y in dataset.batches(batch_size=7, drop_last=True)) == \
+        len(dataset) - len(dataset) % 7
+
+
+def test_feature_files_cache_is_rebuilt_when_the_csv_changes(tmp_path):
+    dates = pd.bdate_range('2020-01-01', periods=30, name='date')
+    frame = pd.DataFrame({'RSI': np.arange(30.0), 'MACD': np.arange(30.0) / 10}, index=dates)
+    csv_path = tmp_path / 'features_AAA.csv'
+    frame.iloc[:20].iloc[::-1].to_csv(csv_path)
+
+    dataset = WindowedDataset.from_feature_files(['AAA'], 5, path=str(tmp_path), normalize=None)
+    assert len(dataset) == 16
+
+    # Appended within the same mtime tick, like the daily feature update
+    mtime = os.stat(csv_path).st_mtime_ns
+    frame.iloc[20:].iloc[::-1].to_csv(csv_path, mode='a', header=False)
+    os.utime(csv_path, ns=(mtime, mtime))
+
+    dataset = WindowedDataset.from_feature_files(['AAA'], 5, path=str(tmp_path), normalize=None)
+    assert len(dataset) == 26
+    np.testing.assert_array_equal(dataset.window(len(dataset) - 1), frame.iloc[-5:].to_numpy(np.float32))